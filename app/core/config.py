@@ -33,6 +33,25 @@ class Settings(BaseSettings):
     NEO4J_USER: str
     NEO4J_PASSWORD: str
 
+    # Per-worker cache of serialized trees, keyed by chart data version
+    TREE_CACHE_MAX_CHARTS: int = 128
+    # Versions of tree changes kept per chart for GET /tree/changes (older -> full snapshot)
+    TREE_CHANGE_LOG_SIZE: int = 1000
+
+    # In-process projection of each chart's Person graph (see services/projection_service.py).
+    # When enabled, tree / person detail / events / cycle checks are served from memory. Search,
+    # typeahead, layout, kinship and the bulk write endpoints always use it (see the module docstring).
+    GRAPH_PROJECTION_ENABLED: bool = False
+    GRAPH_PROJECTION_MAX_MB: int = 256
+
+    # personIds each worker reserves from a chart's PERSON counter at a time (hi/lo allocation).
+    # Ids left unused when a worker exits are skipped, so keep this small.
+    PERSON_ID_BLOCK_SIZE: int = 16
+
+    # File imports (GEDCOM): rows written per UNWIND transaction, and the upload size limit
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_MAX_MB: int = 100
+
     # Email via Resend HTTPS API
     RESEND_API_KEY: str = ""
     EMAIL_FROM: str = ""
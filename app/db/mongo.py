@@ -25,6 +25,8 @@ async def connect_to_mongo():
     await db.news.create_index([("public", 1), ("publishedAt", -1), ("_id", -1)])
     await db.news.create_index([("chartId", 1), ("createdAt", -1)])
     await db.news.create_index("tags")
+    # Background jobs (imports, scans) - polled by id, listed per chart
+    await db.jobs.create_index([("chartId", 1), ("createdAt", -1)])
     return mongo.client
 
 async def close_mongo():
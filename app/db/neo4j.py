@@ -19,6 +19,18 @@ async def connect_to_neo4j():
         await session.run(
             "CREATE CONSTRAINT person_chart_unique IF NOT EXISTS FOR (p:Person) REQUIRE (p.chartId, p.personId) IS UNIQUE"
         )
+        # Counters (personId sequence, data version) are looked up by (chartId, type) on every write
+        await session.run(
+            "CREATE CONSTRAINT counter_chart_type_unique IF NOT EXISTS FOR (c:Counter) REQUIRE (c.chartId, c.type) IS UNIQUE"
+        )
+        # Tree change log, read by version range per chart
+        await session.run(
+            "CREATE INDEX tree_change_chart_version IF NOT EXISTS FOR (t:TreeChange) ON (t.chartId, t.version)"
+        )
+        # Person listing pages through a chart in (level, name, personId) order
+        await session.run(
+            "CREATE INDEX person_chart_level_name IF NOT EXISTS FOR (p:Person) ON (p.chartId, p.level, p.name)"
+        )
     return neo4j.driver
 
 async def close_neo4j():
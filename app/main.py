@@ -4,7 +4,7 @@ from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.db.mongo import connect_to_mongo, close_mongo
 from app.db.neo4j import connect_to_neo4j, close_neo4j
-from app.routers import auth, charts, persons, relationships, tree, events, calendar, news
+from app.routers import auth, charts, persons, relationships, tree, kinship, events, calendar, news, imports, exports, jobs
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -25,6 +25,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Tree responses are versioned; let browser clients read the version for /tree/changes
+    expose_headers=["ETag", "X-Chart-Version"],
 )
 
 # Routers
@@ -33,9 +35,13 @@ app.include_router(charts.router)
 app.include_router(persons.router)
 app.include_router(relationships.router)
 app.include_router(tree.router)
+app.include_router(kinship.router)
 app.include_router(events.router)
 app.include_router(calendar.router)
 app.include_router(news.router)
+app.include_router(imports.router)
+app.include_router(exports.router)
+app.include_router(jobs.router)
 
 @app.get("/healthz")
 async def healthz():
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+from datetime import datetime
+
+
+class JobOut(BaseModel):
+    jobId: str
+    chartId: str
+    type: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    progress: dict = {}
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    createdAt: datetime
+    updatedAt: datetime
@@ -37,6 +37,12 @@ class PersonUpdate(BaseModel):
     description: Optional[str] = None
     photoUrl: Optional[str] = None
 
+class PersonBulkPatch(PersonUpdate):
+    personId: int
+
+class PersonBulkUpdateIn(BaseModel):
+    patches: List[PersonBulkPatch] = Field(min_length=1, max_length=1000)
+
 class PersonOut(BaseModel):
     personId: int
     ownerId: str
@@ -53,6 +59,60 @@ class PersonOut(BaseModel):
     lunarDeathYear: Optional[int] = None
     lunarIsLeap: Optional[bool] = None
 
+class PersonBulkUpdateOut(BaseModel):
+    data: List[PersonOut]
+    # Patched ids that do not exist in the chart
+    missing: List[int] = []
+
+class PersonImportRow(PersonCreate):
+    """One spreadsheet row; father / mother / spouse reference another row (or "#<personId>")."""
+    father: Optional[str] = None
+    mother: Optional[str] = None
+    spouse: Optional[str] = None
+    childOrder: Optional[int] = Field(default=None, ge=1, description="Birth order of child among siblings")
+    spouseOrder: Optional[int] = Field(default=None, ge=1, description="Marriage order")
+
+class PersonImportOut(BaseModel):
+    created: int
+    relationships: int
+    version: int
+    # personId created for each data row, in file order
+    personIds: List[int]
+
+class LevelRecomputeIn(BaseModel):
+    personId: Optional[int] = Field(default=None, description="Recompute this person's descendants only (their own level is kept); whole chart if omitted")
+    dryRun: bool = False
+
+class LevelChangeOut(BaseModel):
+    personId: int
+    name: Optional[str] = None
+    oldLevel: Optional[int] = None
+    newLevel: int
+
+class LevelRecomputeOut(BaseModel):
+    changed: List[LevelChangeOut]
+    version: int
+    dryRun: bool
+
+class PersonMoveIn(BaseModel):
+    fatherId: Optional[int] = None
+    motherId: Optional[int] = None
+    childOrder: Optional[int] = Field(default=None, ge=1, description="Birth order of child among siblings")
+
+    @model_validator(mode="after")
+    def check_at_least_one_parent(self):
+        if self.fatherId is None and self.motherId is None:
+            raise ValueError("At least one of fatherId or motherId must be provided")
+        return self
+
+class PersonMoveOut(BaseModel):
+    personId: int
+    fatherId: Optional[int] = None
+    motherId: Optional[int] = None
+    version: int
+    # Persons whose level shifted with the move
+    changed: List[LevelChangeOut]
+
 
 # --- Relationship request models ---
 
@@ -71,6 +131,32 @@ class SpouseOfIn(BaseModel):
     person2Id: int
     spouseOrder: Optional[int] = Field(default=None, ge=1, description="Marriage order")
 
+class RelationshipBatchItem(BaseModel):
+    type: Literal["FATHER_OF", "MOTHER_OF", "SPOUSE_OF"]
+    # father / mother / person1 -> child / child / person2
+    sourceId: int
+    targetId: int
+    order: Optional[int] = Field(default=None, ge=1, description="childOrder, or spouseOrder for SPOUSE_OF")
+
+class RelationshipBatchIn(BaseModel):
+    edges: List[RelationshipBatchItem] = Field(min_length=1, max_length=5000)
+
+class RelationshipBatchError(BaseModel):
+    index: int
+    detail: str
+
+class RelationshipBatchOut(BaseModel):
+    created: int
+    version: int
+    errors: List[RelationshipBatchError] = []
+
+
+class PersonSuggestionOut(BaseModel):
+    personId: int
+    name: str
+    gender: Gender
+    level: int
+
 
 # --- Person Detail response models ---
 
@@ -97,6 +183,14 @@ class PersonDetailOut(PersonOut):
     spouses: List[SpouseOfNodeOut] = []
     children: List[ChildOfNodeOut] = []
 
+class PersonDetailsIn(BaseModel):
+    personIds: List[int] = Field(min_length=1, max_length=200)
+
+class PersonDetailsOut(BaseModel):
+    data: List[PersonDetailOut]
+    # Requested ids that do not exist in the chart
+    missing: List[int] = []
+
 
 # --- Tree response model ---
 
@@ -115,3 +209,54 @@ class TreeLink(BaseModel):
 class TreeOut(BaseModel):
     nodes: list[TreeNode]
     links: list[TreeLink]
+
+
+class TreeWindowNode(TreeNode):
+    # True when the person has parents / children outside the returned fragment
+    hasMoreParents: bool = False
+    hasMoreChildren: bool = False
+
+class TreeWindowOut(BaseModel):
+    focus: int
+    nodes: list[TreeWindowNode]
+    links: list[TreeLink]
+
+class TreeExpandOut(BaseModel):
+    direction: Literal["children", "parents"]
+    nodes: list[TreeWindowNode]
+    links: list[TreeLink]
+
+class TreeChangesOut(BaseModel):
+    fromVersion: int
+    version: int
+    # True when the log could not cover the range: nodes/links are then the full tree
+    full: bool
+    nodes: list[TreeNode]
+    links: list[TreeLink]
+    removedNodes: list[int] = []
+    removedLinks: list[TreeLink] = []
+
+class TreeLayoutNode(TreeNode):
+    # x in node-width slots from the left edge; y is the generation (level)
+    x: float
+    y: int
+
+class TreeLayoutOut(BaseModel):
+    version: int
+    width: float
+    nodes: list[TreeLayoutNode]
+    links: list[TreeLink]
+
+class KinshipOut(BaseModel):
+    a: int
+    b: int
+    related: bool
+    # What a is to b ("A là <term> của B"), e.g. "chú", "bà ngoại", "anh họ", "con dâu"
+    term: Optional[str] = None
+    commonAncestor: Optional[int] = None
+    generationsFromA: Optional[int] = None
+    generationsFromB: Optional[int] = None
+    # Spouse the relation goes through, when it is one by marriage
+    via: Optional[int] = None
+    # personIds from a to b along the relation
+    path: list[int] = []
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.utils.deps import get_current_user, get_chart_or_404, can_read
+from app.services.export_service import stream_gedcom
+
+router = APIRouter(prefix="/api/v1/charts/{chartId}/export", tags=["Export"])
+
+@router.get("/gedcom")
+async def export_gedcom_route(chartId: str, user=Depends(get_current_user)):
+    """The whole chart as a GEDCOM 5.5.1 file, streamed from Neo4j."""
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    version, chunks = await stream_gedcom(chartId, chart.get("name"))
+    return StreamingResponse(
+        chunks,
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="{chartId}.ged"',
+            "X-Chart-Version": str(version),
+        },
+    )
@@ -0,0 +1,51 @@
+import os
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.models.job_model import JobOut
+from app.models.person_model import PersonImportOut
+from app.utils.deps import get_current_user, get_chart_or_404, can_write
+from app.services.import_service import import_gedcom, save_upload
+from app.services.job_service import start_job
+from app.services.sheet_import_service import import_sheet
+
+router = APIRouter(prefix="/api/v1/charts/{chartId}/import", tags=["Import"])
+
+_SHEET_MEDIA_TYPES = {
+    "text/csv": "csv",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+}
+
+@router.post("/gedcom", response_model=JobOut, status_code=202)
+async def import_gedcom_route(chartId: str, request: Request,
+                              baseLevel: int = Query(0, ge=0, description="Level given to the oldest generation"),
+                              user=Depends(get_current_user)):
+    """Import a GEDCOM file sent as the raw request body. Returns a job to poll at
+    GET /charts/{chartId}/jobs/{jobId}; its result lists the records that were skipped."""
+    chart = await get_chart_or_404(chartId)
+    if not can_write(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    path = await save_upload(request.stream())
+    try:
+        return await start_job(
+            chartId, "gedcom_import", user["_id"],
+            lambda report: import_gedcom(chartId, chart["ownerId"], path, baseLevel, report),
+        )
+    except BaseException:
+        # The job deletes the file once it runs; it never will
+        os.unlink(path)
+        raise
+
+@router.post("/persons", response_model=PersonImportOut)
+async def import_persons_route(chartId: str, request: Request,
+                               format: Optional[Literal["csv", "xlsx"]] = Query(None, description="Defaults to the Content-Type"),
+                               user=Depends(get_current_user)):
+    """Create persons and their relationships from a CSV / XLSX sheet sent as the raw request body.
+    Nothing is written unless every row is valid; otherwise 422 lists the problems per row."""
+    chart = await get_chart_or_404(chartId)
+    if not can_write(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    fmt = format or _SHEET_MEDIA_TYPES.get(request.headers.get("content-type", "").split(";")[0].strip())
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Unknown file format, pass ?format=csv or ?format=xlsx")
+    path = await save_upload(request.stream(), f".{fmt}")
+    return await import_sheet(chartId, chart["ownerId"], path, fmt)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.models.job_model import JobOut
+from app.utils.deps import get_current_user, get_chart_or_404, can_read
+from app.services.job_service import get_job
+
+router = APIRouter(prefix="/api/v1/charts/{chartId}/jobs", tags=["Jobs"])
+
+@router.get("/{jobId}", response_model=JobOut)
+async def get_job_route(chartId: str, jobId: str, user=Depends(get_current_user)):
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await get_job(chartId, jobId)
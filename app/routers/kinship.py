@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.utils.deps import get_current_user, get_chart_or_404, can_read
+from app.models.person_model import KinshipOut
+from app.services.kinship_service import get_kinship
+
+router = APIRouter(prefix="/api/v1/charts/{chartId}/kinship", tags=["Kinship"])
+
+@router.get("", response_model=KinshipOut)
+async def kinship_route(
+    chartId: str,
+    a: int = Query(..., description="personId of A"),
+    b: int = Query(..., description="personId of B; the term says what A is to B"),
+    user=Depends(get_current_user),
+):
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await get_kinship(chartId, a, b)
@@ -1,9 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Optional
-from app.models.person_model import PersonCreate, PersonCreateWithParent, PersonCreateWithSpouse, PersonUpdate, PersonOut, PersonDetailOut
+from typing import List, Optional
+from app.models.person_model import (
+    Gender, PersonCreate, PersonCreateWithParent, PersonCreateWithSpouse, PersonUpdate, PersonOut, PersonDetailOut,
+    PersonSuggestionOut, PersonDetailsIn, PersonDetailsOut, PersonBulkUpdateIn, PersonBulkUpdateOut,
+    LevelRecomputeIn, LevelRecomputeOut, PersonMoveIn, PersonMoveOut,
+)
 from app.utils.deps import get_current_user, get_chart_or_404, can_write, can_read
-from app.services.person_service import create_person, update_person, delete_person, get_person_detail, list_persons as list_persons_service
-from app.services.relationship_service import add_father_of, add_mother_of, add_spouse_of, check_spouse_couple
+from app.services.person_service import (
+    create_person, create_child_person, create_spouse_person, update_person, update_persons, delete_person,
+    get_person_detail, list_persons as list_persons_service, parse_list_fields, suggest_persons,
+    get_person_details,
+)
+from app.services.level_service import recompute_levels
+from app.services.relationship_service import move_person
+from app.services.dedup_service import scan_duplicates
+from app.services.job_service import start_job
+from app.models.job_model import JobOut
 
 router = APIRouter(prefix="/api/v1/charts/{chartId}/persons", tags=["Persons"])
 
@@ -21,34 +33,13 @@ async def add_child_person_route(chartId: str, body: PersonCreateWithParent, use
     if not can_write(chart, user["_id"]):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    # If both fatherId and motherId provided, validate they are a SPOUSE_OF couple
-    if body.fatherId is not None and body.motherId is not None:
-        is_couple = await check_spouse_couple(chartId, body.fatherId, body.motherId)
-        if not is_couple:
-            raise HTTPException(
-                status_code=400,
-                detail="Father and mother must be a married couple (SPOUSE_OF relationship required)"
-            )
-
-    # Create the child person
-    node = await create_person(
+    # Person and parent edges are created in one transaction; if both fatherId and motherId are
+    # provided they must be a SPOUSE_OF couple
+    node = await create_child_person(
         chartId, chart["ownerId"], body.name, body.gender, body.level,
-        body.dob, body.dod, body.description, body.photoUrl
+        body.dob, body.dod, body.description, body.photoUrl,
+        father_id=body.fatherId, mother_id=body.motherId, child_order=body.childOrder,
     )
-
-    try:
-        # Create FATHER_OF relationship if fatherId provided
-        if body.fatherId is not None:
-            await add_father_of(chartId, body.fatherId, node["personId"], body.childOrder)
-
-        # Create MOTHER_OF relationship if motherId provided
-        if body.motherId is not None:
-            await add_mother_of(chartId, body.motherId, node["personId"], body.childOrder)
-    except HTTPException:
-        # Rollback: delete the orphan person node
-        await delete_person(chartId, node["personId"])
-        raise
-
     return node
 
 @router.post("/add-spouse", response_model=PersonOut)
@@ -57,19 +48,62 @@ async def add_spouse_person_route(chartId: str, body: PersonCreateWithSpouse, us
     if not can_write(chart, user["_id"]):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    node = await create_person(
+    node = await create_spouse_person(
         chartId, chart["ownerId"], body.name, body.gender, body.level,
-        body.dob, body.dod, body.description, body.photoUrl
+        body.dob, body.dod, body.description, body.photoUrl,
+        spouse_id=body.spouseId, spouse_order=body.spouseOrder,
     )
+    return node
+
+@router.post("/recompute-levels", response_model=LevelRecomputeOut)
+async def recompute_levels_route(chartId: str, body: LevelRecomputeIn, user=Depends(get_current_user)):
+    """Re-derive generation levels from the parent edges, for the whole chart or one person's
+    descendants, and write the changes in one transaction (or only report them with dryRun)."""
+    chart = await get_chart_or_404(chartId)
+    if not can_write(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await recompute_levels(chartId, body.personId, body.dryRun)
+
+@router.post("/duplicates", response_model=JobOut, status_code=202)
+async def scan_duplicates_route(chartId: str,
+                                minScore: float = Query(1.0, description="Lowest pair score to suggest"),
+                                limit: int = Query(100, ge=1, le=1000),
+                                user=Depends(get_current_user)):
+    """Start a duplicate-person scan. Poll GET /charts/{chartId}/jobs/{jobId}; the job result
+    holds merge suggestions (pairs of persons with a score and its reasons), best first."""
+    chart = await get_chart_or_404(chartId)
+    if not can_write(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await start_job(chartId, "duplicate_scan", user["_id"],
+                           lambda report: scan_duplicates(chartId, minScore, limit, report))
+
+@router.get("/suggest", response_model=List[PersonSuggestionOut])
+async def suggest_persons_route(chartId: str,
+                                prefix: str = Query(..., min_length=1, description="Typed text, diacritic-insensitive"),
+                                limit: int = Query(10, ge=1, le=50),
+                                gender: Optional[Gender] = None,
+                                user=Depends(get_current_user)):
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await suggest_persons(chartId, prefix, limit, gender)
 
-    try:
-        await add_spouse_of(chartId, body.spouseId, node["personId"], body.spouseOrder)
-    except HTTPException:
-        # Rollback: delete the orphan person node
-        await delete_person(chartId, node["personId"])
-        raise
+@router.post("/details", response_model=PersonDetailsOut)
+async def get_person_details_route(chartId: str, body: PersonDetailsIn, user=Depends(get_current_user)):
+    """Details of several persons (e.g. a whole family unit) in one request."""
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    details, missing = await get_person_details(chartId, body.personIds)
+    return {"data": details, "missing": missing}
 
-    return node
+@router.post("/{personId}/move", response_model=PersonMoveOut)
+async def move_person_route(chartId: str, personId: int, body: PersonMoveIn, user=Depends(get_current_user)):
+    """Reattach a person (with their whole branch) to new parents in one transaction."""
+    chart = await get_chart_or_404(chartId)
+    if not can_write(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await move_person(chartId, personId, body.fatherId, body.motherId, body.childOrder)
 
 @router.get("/{personId}", response_model=PersonDetailOut)
 async def get_person_detail_route(chartId: str, personId: int, user=Depends(get_current_user)):
@@ -80,13 +114,29 @@ async def get_person_detail_route(chartId: str, personId: int, user=Depends(get_
     return detail
 
 @router.get("")
-async def list_persons_route(chartId: str, q: Optional[str] = Query(None), gender: Optional[str] = None, level: Optional[int] = None,
+async def list_persons_route(chartId: str, q: Optional[str] = Query(None, description="Name search, diacritic-insensitive; results ranked by match"),
+                             gender: Optional[str] = None, level: Optional[int] = None,
+                             limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (search defaults to 50)"),
+                             cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+                             fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. personId,name,level"),
                              user=Depends(get_current_user)):
     chart = await get_chart_or_404(chartId)
     if not can_read(chart, user["_id"]):
         raise HTTPException(status_code=403, detail="Forbidden")
-    nodes = await list_persons_service(chartId, q=q, gender=gender, level=level)
-    return {"data": nodes}
+    nodes, next_cursor = await list_persons_service(
+        chartId, q=q, gender=gender, level=level,
+        limit=limit, cursor=cursor, fields=parse_list_fields(fields),
+    )
+    return {"data": nodes, "nextCursor": next_cursor}
+
+@router.patch("", response_model=PersonBulkUpdateOut)
+async def update_persons_route(chartId: str, body: PersonBulkUpdateIn, user=Depends(get_current_user)):
+    """Apply many person patches in one transaction; unknown personIds are reported as missing."""
+    chart = await get_chart_or_404(chartId)
+    if not can_write(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    persons, missing = await update_persons(chartId, [p.model_dump(exclude_unset=True) for p in body.patches])
+    return {"data": persons, "missing": missing}
 
 @router.patch("/{personId}", response_model=PersonOut)
 async def update_person_route(chartId: str, personId: int, body: PersonUpdate, user=Depends(get_current_user)):
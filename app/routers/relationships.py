@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.utils.deps import get_current_user, get_chart_or_404, can_write
-from app.models.person_model import FatherOfIn, MotherOfIn, SpouseOfIn
+from app.models.person_model import (
+    FatherOfIn, MotherOfIn, SpouseOfIn, RelationshipBatchIn, RelationshipBatchOut,
+)
 from app.services.relationship_service import (
     add_father_of, remove_father_of,
     add_mother_of, remove_mother_of,
     add_spouse_of, remove_spouse_of,
+    add_relationships_batch,
 )
 
 router = APIRouter(prefix="/api/v1/charts/{chartId}/relationships", tags=["Relationships"])
@@ -56,3 +59,11 @@ async def delete_spouse_of(chartId: str, body: SpouseOfIn, user=Depends(get_curr
         raise HTTPException(status_code=403, detail="Forbidden")
     await remove_spouse_of(chartId, body.person1Id, body.person2Id)
     return {"message": "SPOUSE_OF relationship removed"}
+
+@router.post("/batch", response_model=RelationshipBatchOut)
+async def create_relationships_batch(chartId: str, body: RelationshipBatchIn, user=Depends(get_current_user)):
+    """Create many relationships in one transaction; invalid edges are skipped and reported by index."""
+    chart = await get_chart_or_404(chartId)
+    if not can_write(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await add_relationships_batch(chartId, [e.model_dump() for e in body.edges])
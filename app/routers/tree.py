@@ -1,28 +1,227 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from app.utils.deps import get_current_user, get_chart_or_404, can_read
-from app.services.tree_service import get_tree
-from app.models.person_model import TreeOut
+from app.services.tree_service import (
+    TREE_ENCODINGS, compressed_tree, encode_tree, expand_tree, get_tree_cached, get_tree_changes,
+    get_tree_window, stream_tree,
+)
+from app.services.layout_service import get_tree_layout
+from app.services.version_service import get_chart_version
+from app.models.person_model import TreeChangesOut, TreeExpandOut, TreeLayoutOut, TreeOut, TreeWindowOut
 
 router = APIRouter(prefix="/api/v1/charts/{chartId}/tree", tags=["Tree"])
 
-@router.get("", response_model=TreeOut)
+
+# Representations of the full tree: ?format= value / Accept media type -> response media type
+_MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/x-tree-columnar",
+    "columnar-msgpack": "application/x-tree-columnar+msgpack",
+}
+
+
+def _etag(version: int, fmt: str = "json") -> str:
+    suffix = "" if fmt == "json" else f"-{fmt}"
+    return f'W/"v{version}{suffix}"'
+
+
+def _negotiate_format(request: Request, fmt: Optional[str]) -> str:
+    """Pick the tree representation from ?format= or, failing that, the Accept header."""
+    if fmt:
+        return fmt
+    accept = request.headers.get("accept", "")
+    if _MEDIA_TYPES["columnar-msgpack"] in accept:
+        return "columnar-msgpack"
+    if _MEDIA_TYPES["columnar"] in accept:
+        return "columnar"
+    return "json"
+
+
+def _negotiate_encoding(request: Request) -> Optional[str]:
+    """Preferred precompressed content coding the client accepts (q > 0), or None for identity.
+    "*" stands for every coding not listed explicitly, so it never overrides a "q=0"."""
+    accepted, refused = set(), set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    refused.add(coding)
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    for encoding in TREE_ENCODINGS:
+        if encoding in accepted or ("*" in accepted and encoding not in refused):
+            return encoding
+    return None
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names this ETag (or is '*')."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def _tree_response(chartId: str, request: Request, cache_control: str,
+                         focus: Optional[int], up: int, down: int, fmt: Optional[str]) -> Response:
+    if focus is None:
+        fmt = _negotiate_format(request, fmt)
+    elif fmt in (None, "json"):
+        fmt = "json"
+    else:
+        raise HTTPException(status_code=400, detail="The columnar format is only available for the full tree")
+    # The ETag is the chart data version: any person/relationship write bumps it, so a matching
+    # If-None-Match means the client's copy is current and we can skip building the tree entirely.
+    # ETags are scoped per URL, so the same version tag is valid for every window as well.
+    version = await get_chart_version(chartId)
+    etag = _etag(version, fmt)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "X-Chart-Version": str(version),
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if focus is not None:
+        window = await get_tree_window(chartId, focus, up, down)
+        body = TreeWindowOut.model_validate(window).model_dump_json().encode()
+        return Response(content=body, media_type=_MEDIA_TYPES[fmt], headers=headers)
+
+    # Full trees are served from the per-version cache, precompressed when the client allows it
+    entry = await get_tree_cached(chartId, version)
+    encoding = _negotiate_encoding(request)
+    if encoding:
+        body = await compressed_tree(entry, fmt, encoding)
+        headers["Content-Encoding"] = encoding
+    else:
+        body = encode_tree(entry, fmt)
+    return Response(content=body, media_type=_MEDIA_TYPES[fmt], headers=headers)
+
+
+_MAX_EXPAND_IDS = 200
+
+
+def _parse_person_ids(raw: str) -> list[int]:
+    """Parse a comma-separated personIds query value."""
+    try:
+        ids = [int(x) for x in raw.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="personIds must be a comma-separated list of integers")
+    if not ids:
+        raise HTTPException(status_code=400, detail="personIds is required")
+    if len(ids) > _MAX_EXPAND_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {_MAX_EXPAND_IDS} personIds per request")
+    return ids
+
+
+_FOCUS_QUERY = Query(None, description="Return only the window around this personId")
+_UP_QUERY = Query(2, ge=0, le=20, description="Generations above the focus person (with focus)")
+_DOWN_QUERY = Query(3, ge=0, le=20, description="Generations below the focus person (with focus)")
+_FORMAT_QUERY = Query(
+    None,
+    description="json (default), columnar or columnar-msgpack; also negotiable via the Accept header",
+)
+
+
+@router.get("", response_model=Union[TreeWindowOut, TreeOut])
 async def get_tree_route(
     chartId: str,
+    request: Request,
+    focus: Optional[int] = _FOCUS_QUERY,
+    up: int = _UP_QUERY,
+    down: int = _DOWN_QUERY,
+    format: Optional[Literal["json", "columnar", "columnar-msgpack"]] = _FORMAT_QUERY,
     user = Depends(get_current_user),
 ):
     chart = await get_chart_or_404(chartId)
     if not can_read(chart, user["_id"]):
         raise HTTPException(status_code=403, detail="Forbidden")
-    data = await get_tree(chartId)
     # Output format: {"nodes": [...], "links": [...]}
     # links contains PARENT_OF (1 per child) and SPOUSE_OF
-    return data
+    # With ?focus=..., only that person's window is returned (see get_tree_window)
+    return await _tree_response(chartId, request, "private, no-cache", focus, up, down, format)
 
-@router.get("/published", response_model=TreeOut)
-async def get_published_tree_route(chartId: str):
+@router.get("/published", response_model=Union[TreeWindowOut, TreeOut])
+async def get_published_tree_route(
+    chartId: str,
+    request: Request,
+    focus: Optional[int] = _FOCUS_QUERY,
+    up: int = _UP_QUERY,
+    down: int = _DOWN_QUERY,
+    format: Optional[Literal["json", "columnar", "columnar-msgpack"]] = _FORMAT_QUERY,
+):
     # Public endpoint: only allow if chart is published
     chart = await get_chart_or_404(chartId)
     if not can_read(chart, None):
         raise HTTPException(status_code=403, detail="Forbidden")
-    data = await get_tree(chartId)
-    return data
+    return await _tree_response(chartId, request, "public, no-cache", focus, up, down, format)
+
+@router.get("/expand", response_model=TreeExpandOut)
+async def expand_tree_route(
+    chartId: str,
+    personIds: str = Query(..., description="Comma-separated frontier personIds"),
+    direction: Literal["children", "parents"] = "children",
+    user = Depends(get_current_user),
+):
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await expand_tree(chartId, _parse_person_ids(personIds), direction)
+
+@router.get("/changes", response_model=TreeChangesOut)
+async def tree_changes_route(
+    chartId: str,
+    since: int = Query(..., ge=0, description="Chart version the client currently holds (X-Chart-Version of its tree)"),
+    user = Depends(get_current_user),
+):
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    version = await get_chart_version(chartId)
+    return await get_tree_changes(chartId, since, version)
+
+@router.get("/layout", response_model=TreeLayoutOut)
+async def tree_layout_route(
+    chartId: str,
+    request: Request,
+    user = Depends(get_current_user),
+):
+    """Full tree with server-computed x/y coordinates, cached per chart version."""
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    version = await get_chart_version(chartId)
+    etag = _etag(version, "layout")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Chart-Version": str(version)}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    layout = await get_tree_layout(chartId, version)
+    body = TreeLayoutOut.model_validate(layout).model_dump_json().encode()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/stream")
+async def stream_tree_route(
+    chartId: str,
+    format: Literal["ndjson", "json"] = "ndjson",
+    user = Depends(get_current_user),
+):
+    """Full tree streamed from Neo4j with flat memory use: NDJSON lines (meta, then node and
+    link objects) or, with format=json, the TreeOut document written incrementally."""
+    chart = await get_chart_or_404(chartId)
+    if not can_read(chart, user["_id"]):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    version, chunks = await stream_tree(chartId, format)
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"X-Chart-Version": str(version)},
+    )
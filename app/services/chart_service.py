@@ -7,6 +7,10 @@ from app.core.config import settings
 from app.db.neo4j import neo4j
 from app.services.event_service import delete_events_by_chart
 from app.services.news_service import delete_news_by_chart
+from app.services.tree_service import evict_tree_cache
+from app.services.projection_service import evict_graph
+from app.services.layout_service import evict_layout_cache
+from app.services.person_id_service import evict_person_ids
 from app.utils.cloudinary_helper import delete_images
 
 def now():
@@ -48,6 +52,11 @@ async def delete_chart_hard(chart_id: str, owner_id: str):
         photos = [rec["photo"] async for rec in res]
         await session.run("MATCH (p:Person {chartId:$cid}) DETACH DELETE p", cid=chart_id)
         await session.run("MATCH (c:Counter {chartId:$cid}) DETACH DELETE c", cid=chart_id)
+        await session.run("MATCH (t:TreeChange {chartId:$cid}) DELETE t", cid=chart_id)
+    evict_tree_cache(chart_id)
+    evict_graph(chart_id)
+    evict_layout_cache(chart_id)
+    evict_person_ids(chart_id)
     if photos:
         await delete_images(photos)  
     # Events and news both key off chartId; news also owns Cloudinary images.
@@ -0,0 +1,143 @@
+"""Duplicate person detection.
+
+Candidates are blocked by (folded name, level): only persons sharing both are compared, so a scan
+is a handful of small groups rather than every pair of the chart. Each pair is then scored on
+matching or conflicting dob / dod and on shared parents and spouses (same person, or at least the
+same folded name). Scans run as background jobs over a snapshot of the chart projection.
+"""
+import asyncio
+from datetime import date
+from typing import Optional
+
+from app.services.job_service import Report
+from app.services.projection_service import ChartGraph, get_chart_graph
+from app.utils.name_search import fold
+
+# Groups larger than this are common names at one level; their pairs are not worth a suggestion
+_MAX_BLOCK = 200
+
+# Score contributions
+_SAME_DATE = 3.0
+_NEAR_DATE = 1.0       # within a year: typo, or lunar vs solar date
+_FAR_DATE = -4.0       # more than two years apart
+_SAME_RELATIVE = 3.0
+_SAME_RELATIVE_NAME = 1.0
+_OTHER_RELATIVE = -1.0
+
+
+def _as_date(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return value
+
+
+def _snapshot(graph: ChartGraph) -> dict[int, tuple]:
+    """personId -> (folded name, level, gender, dob, dod, father, mother, spouses, name), read on
+    the event loop so the scan itself can run in a thread while the projection keeps being patched."""
+    snap = {}
+    for pid in graph.person_ids():
+        p = graph.persons[pid]
+        snap[pid] = (fold(p.get("name")), p.get("level"), p.get("gender"),
+                     _as_date(p.get("dob")), _as_date(p.get("dod")),
+                     graph.father[pid], graph.mother[pid], tuple(graph.spouses_of(pid)), p.get("name"))
+    return snap
+
+
+def _date_score(label: str, d1: Optional[date], d2: Optional[date], reasons: list[str]) -> float:
+    if d1 is None or d2 is None:
+        return 0.0
+    days = abs((d1 - d2).days)
+    if days == 0:
+        reasons.append(f"same {label}")
+        return _SAME_DATE
+    if days <= 366:
+        reasons.append(f"close {label}")
+        return _NEAR_DATE
+    if days > 2 * 366:
+        reasons.append(f"different {label}")
+        return _FAR_DATE
+    return 0.0
+
+
+def _relative_score(label: str, ids1: tuple, ids2: tuple, names: dict[int, tuple],
+                    reasons: list[str]) -> float:
+    ids1, ids2 = {i for i in ids1 if i}, {i for i in ids2 if i}
+    if not ids1 or not ids2:
+        return 0.0
+    if ids1 & ids2:
+        reasons.append(f"same {label}")
+        return _SAME_RELATIVE
+    if {names[i][0] for i in ids1} & {names[i][0] for i in ids2}:
+        reasons.append(f"{label} with the same name")
+        return _SAME_RELATIVE_NAME
+    return _OTHER_RELATIVE
+
+
+def _score(a: tuple, b: tuple, snap: dict[int, tuple]) -> tuple[float, list[str]]:
+    reasons: list[str] = []
+    score = _date_score("dob", a[3], b[3], reasons) + _date_score("dod", a[4], b[4], reasons)
+    score += _relative_score("father", (a[5],), (b[5],), snap, reasons)
+    score += _relative_score("mother", (a[6],), (b[6],), snap, reasons)
+    score += _relative_score("spouse", a[7], b[7], snap, reasons)
+    return score, reasons
+
+
+def _brief(pid: int, row: tuple) -> dict:
+    dob, dod = row[3], row[4]
+    return {
+        "personId": pid, "name": row[8], "level": row[1],
+        "dob": dob.isoformat() if dob else None, "dod": dod.isoformat() if dod else None,
+    }
+
+
+def find_duplicates(snap: dict[int, tuple], min_score: float, limit: int) -> tuple[list[tuple], dict]:
+    """Best-scored candidate pairs [(score, a, b, reasons)] and scan statistics."""
+    blocks: dict[tuple, list[int]] = {}
+    for pid, row in snap.items():
+        if row[0]:
+            blocks.setdefault((row[0], row[1]), []).append(pid)
+    pairs, compared, skipped = [], 0, 0
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) > _MAX_BLOCK:
+            skipped += 1
+            continue
+        for i, a in enumerate(members):
+            ra = snap[a]
+            for b in members[i + 1:]:
+                rb = snap[b]
+                compared += 1
+                if ra[2] != rb[2] and "O" not in (ra[2], rb[2]):
+                    continue
+                if b in ra[7]:
+                    continue
+                score, reasons = _score(ra, rb, snap)
+                if score >= min_score:
+                    pairs.append((score, a, b, reasons))
+    pairs.sort(key=lambda p: (-p[0], p[1], p[2]))
+    stats = {"persons": len(snap), "blocks": sum(1 for m in blocks.values() if len(m) > 1),
+             "pairsCompared": compared, "blocksSkipped": skipped, "candidates": len(pairs)}
+    return pairs[:limit], stats
+
+
+async def scan_duplicates(chart_id: str, min_score: float, limit: int, report: Report) -> dict:
+    """Background job: ranked merge suggestions for a chart (see module docstring)."""
+    graph = await get_chart_graph(chart_id)
+    version = graph.version
+    snap = _snapshot(graph)
+    await report({"phase": "scan", "persons": len(snap)})
+    pairs, stats = await asyncio.to_thread(find_duplicates, snap, min_score, limit)
+    return {
+        "version": version,
+        **stats,
+        "suggestions": [
+            {"a": _brief(a, snap[a]), "b": _brief(b, snap[b]), "score": score, "reasons": reasons}
+            for score, a, b, reasons in pairs
+        ],
+    }
@@ -8,6 +8,7 @@ from app.core.config import settings
 from app.db.mongo import mongo
 from app.db.neo4j import neo4j
 from app.models.event_model import EventCreate
+from app.services.projection_service import get_chart_graph
 from app.utils.lunar_converter import lunar_to_solar, get_leap_month
 
 
@@ -136,18 +137,21 @@ async def list_custom(chartId: str) -> list[dict]:
 async def _list_person_events(chartId: str) -> tuple[list[dict], list[dict]]:
     """Return (birthdays, deaths) extracted from Neo4j persons in the chart.
     Birthday is omitted for deceased persons (per Vietnamese tradition)."""
-    async with neo4j.driver.session() as session:
-        res = await session.run(
-            """
-            MATCH (n:Person {chartId:$cid})
-            RETURN n.personId AS personId, n.name AS name,
-                   toString(n.dob) AS dob, toString(n.dod) AS dod,
-                   n.lunarDeathDay AS ld, n.lunarDeathMonth AS lm,
-                   n.lunarDeathYear AS ly, n.lunarIsLeap AS leap
-            """,
-            cid=chartId,
-        )
-        records = await res.data()
+    if settings.GRAPH_PROJECTION_ENABLED:
+        records = (await get_chart_graph(chartId)).event_rows()
+    else:
+        async with neo4j.driver.session() as session:
+            res = await session.run(
+                """
+                MATCH (n:Person {chartId:$cid})
+                RETURN n.personId AS personId, n.name AS name,
+                       toString(n.dob) AS dob, toString(n.dod) AS dod,
+                       n.lunarDeathDay AS ld, n.lunarDeathMonth AS lm,
+                       n.lunarDeathYear AS ly, n.lunarIsLeap AS leap
+                """,
+                cid=chartId,
+            )
+            records = await res.data()
 
     births, deaths = [], []
     for r in records:
@@ -0,0 +1,169 @@
+"""GEDCOM 5.5.1 export of a chart, streamed straight off Neo4j record cursors.
+
+Persons become INDI records (xref @I<personId>@). Families are not stored as such: a FAM record
+@F<husband>_<wife>@ stands for a SPOUSE_OF couple and/or the pair of parents of some children,
+with 0 for a missing parent. INDI records list their FAMC / FAMS from the same keys, and FAM
+records come from one query sorted by family, so they are grouped on the fly; besides the family
+being written only the ids of the persons written and of the families they point at are held in
+memory.
+
+Both queries and the chart version run in one read transaction. Neo4j reads are read-committed,
+though, so a write committed in between can still show up in the second query only. FAM records
+are therefore written only for families some INDI points at, list only persons written as INDI,
+and a family pointed at but no longer returned by the second query is still written.
+"""
+from datetime import date
+from typing import AsyncIterator, Optional, Union
+
+from app.core.config import settings
+from app.db.neo4j import neo4j
+from app.services.version_service import VERSION_COUNTER
+from app.utils.gedcom import format_date, text_lines
+
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+_SEX = {"M": "M", "F": "F"}
+
+
+def _fam_id(husband: Optional[int], wife: Optional[int]) -> str:
+    return f"@F{husband or 0}_{wife or 0}@"
+
+
+def _header(chart_name: Optional[str]) -> list[str]:
+    return [
+        "0 HEAD",
+        f"1 SOUR {settings.APP_NAME}",
+        "1 GEDC", "2 VERS 5.5.1", "2 FORM LINEAGE-LINKED",
+        "1 CHAR UTF-8",
+        f"1 DATE {format_date(date.today())}",
+        "1 SUBM @U1@",
+        "0 @U1@ SUBM",
+        *text_lines(1, "NAME", chart_name or "Family tree"),
+    ]
+
+
+def _indi_lines(rec, families: dict[tuple[int, int], list[int]]) -> list[str]:
+    """INDI record lines. Registers the (husband, wife) keys of the FAMC / FAMS it points at in
+    `families`, with the person as a child of its FAMC."""
+    p = rec["person"]
+    lines = [f"0 @I{p['personId']}@ INDI", *text_lines(1, "NAME", p.get("name") or ""),
+             f"1 SEX {_SEX.get(p.get('gender'), 'U')}"]
+    for tag, value in (("BIRT", p.get("dob")), ("DEAT", p.get("dod"))):
+        formatted = format_date(value)
+        if formatted:
+            lines += [f"1 {tag}", f"2 DATE {formatted}"]
+    if p.get("description"):
+        lines += text_lines(1, "NOTE", p["description"])
+    if p.get("photoUrl"):
+        ext = p["photoUrl"].rsplit(".", 1)[-1].lower()
+        lines += ["1 OBJE", f"2 FILE {p['photoUrl']}",
+                  f"3 FORM {ext if ext in ('jpg', 'jpeg', 'png', 'gif', 'webp') else 'jpg'}"]
+    if rec["fatherId"] is not None or rec["motherId"] is not None:
+        key = (rec["fatherId"] or 0, rec["motherId"] or 0)
+        families.setdefault(key, []).append(p["personId"])
+        lines.append(f"1 FAMC {_fam_id(*key)}")
+    fams: list[tuple[int, int]] = []
+    for husband, wife, _ in sorted(rec["couples"], key=lambda c: (c[2] is None, c[2])):
+        fams.append((husband, wife))
+    for father, mother in rec["parentPairs"]:
+        fams.append((father or 0, mother or 0))
+    for key in dict.fromkeys(fams):
+        families.setdefault(key, [])
+        lines.append(f"1 FAMS {_fam_id(*key)}")
+    return lines
+
+
+def _fam_lines(husband: int, wife: int, children: list[int], written: set[int]) -> list[str]:
+    lines = [f"0 {_fam_id(husband, wife)} FAM"]
+    if husband in written:
+        lines.append(f"1 HUSB @I{husband}@")
+    if wife in written:
+        lines.append(f"1 WIFE @I{wife}@")
+    lines.extend(f"1 CHIL @I{child}@" for child in children if child in written)
+    return lines
+
+
+async def _iter_gedcom_lines(chart_id: str, chart_name: Optional[str]) -> AsyncIterator[Union[int, list[str]]]:
+    """Yields the chart version first, then the lines of the file record by record."""
+    async with neo4j.driver.session() as session, await session.begin_transaction() as tx:
+        res = await tx.run(
+            "OPTIONAL MATCH (c:Counter {chartId:$cid, type:$type}) RETURN coalesce(c.value, 0) AS version",
+            cid=chart_id, type=VERSION_COUNTER,
+        )
+        yield (await res.single())["version"]
+        yield _header(chart_name)
+
+        written: set[int] = set()
+        families: dict[tuple[int, int], list[int]] = {}
+        res = await tx.run(
+            """
+            MATCH (p:Person {chartId:$cid})
+            RETURN p {.personId, .name, .gender, .dob, .dod, .description, .photoUrl} AS person,
+                   head([(f:Person)-[:FATHER_OF]->(p) | f.personId]) AS fatherId,
+                   head([(m:Person)-[:MOTHER_OF]->(p) | m.personId]) AS motherId,
+                   [(p)-[s:SPOUSE_OF]-(:Person) | [startNode(s).personId, endNode(s).personId, s.spouseOrder]] AS couples,
+                   [(p)-[:FATHER_OF|MOTHER_OF]->(c:Person) |
+                       [head([(f:Person)-[:FATHER_OF]->(c) | f.personId]),
+                        head([(m:Person)-[:MOTHER_OF]->(c) | m.personId])]] AS parentPairs
+            """,
+            cid=chart_id,
+        )
+        async for rec in res:
+            written.add(rec["person"]["personId"])
+            yield _indi_lines(rec, families)
+
+        # One row per child (keyed by its parents) and per couple; the couple row sorts first.
+        res = await tx.run(
+            """
+            CALL {
+                MATCH (c:Person {chartId:$cid})
+                WITH c, head([(f:Person)-[r:FATHER_OF]->(c) | [f.personId, r.childOrder]]) AS f,
+                        head([(m:Person)-[r:MOTHER_OF]->(c) | [m.personId, r.childOrder]]) AS m
+                WHERE f IS NOT NULL OR m IS NOT NULL
+                RETURN coalesce(f[0], 0) AS husband, coalesce(m[0], 0) AS wife, c.personId AS child,
+                       coalesce(f[1], m[1]) AS ord, c.dob AS dob
+                UNION ALL
+                MATCH (h:Person {chartId:$cid})-[:SPOUSE_OF]->(w:Person {chartId:$cid})
+                RETURN h.personId AS husband, w.personId AS wife, null AS child, null AS ord, null AS dob
+            }
+            RETURN husband, wife, child, ord, dob
+            ORDER BY husband, wife, child IS NOT NULL, ord, dob, child
+            """,
+            cid=chart_id,
+        )
+        key, children = None, []
+        async for rec in res:
+            if (rec["husband"], rec["wife"]) != key:
+                if families.pop(key, None) is not None:
+                    yield _fam_lines(*key, children, written)
+                key, children = (rec["husband"], rec["wife"]), []
+            if rec["child"] is not None:
+                children.append(rec["child"])
+        if families.pop(key, None) is not None:
+            yield _fam_lines(*key, children, written)
+        # Families pointed at by an INDI that the second query no longer returned
+        for key in sorted(families):
+            yield _fam_lines(*key, families[key], written)
+    yield ["0 TRLR"]
+
+
+async def _chunks(lines_iter: AsyncIterator[list[str]]) -> AsyncIterator[bytes]:
+    buf: list[str] = []
+    size = 0
+    async for lines in lines_iter:
+        for line in lines:
+            buf.append(line)
+            size += len(line) + 1
+        if size >= _STREAM_CHUNK_BYTES:
+            yield ("\n".join(buf) + "\n").encode()
+            buf, size = [], 0
+    if buf:
+        yield ("\n".join(buf) + "\n").encode()
+
+
+async def stream_gedcom(chart_id: str, chart_name: Optional[str] = None) -> tuple[int, AsyncIterator[bytes]]:
+    """Start a GEDCOM 5.5.1 export of a chart: (chart version it reflects, UTF-8 file in ~64 KB
+    chunks). The read transaction stays open until the chunks are consumed or closed."""
+    lines_iter = _iter_gedcom_lines(chart_id, chart_name)
+    version = await lines_iter.__anext__()
+    return version, _chunks(lines_iter)
@@ -0,0 +1,306 @@
+"""GEDCOM import into an existing chart.
+
+The upload is spooled to a temporary file and imported by a background job in two streaming passes,
+so memory stays bounded by the number of persons rather than the file size:
+
+1. scan: INDI / FAM records are reduced to an index per INDI, its sex and the family links. Parent
+   edges and couples are checked with the rules of the relationship endpoints (offending links are
+   skipped and reported) and `level` is computed breadth-first from the roots, so every parent sits
+   above their children; married-in persons without parents are pulled down next to their spouse.
+2. write: the file is read again and persons are created in UNWIND batches of IMPORT_BATCH_SIZE,
+   followed by the FATHER_OF / MOTHER_OF / SPOUSE_OF edges.
+
+Each batch is its own write transaction and bumps the chart version (without a change list, so
+clients reload the tree), and a loaded projection is patched batch by batch. A failed import leaves
+the batches committed so far in place.
+"""
+import asyncio
+import os
+import tempfile
+from collections import deque
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.db.neo4j import neo4j
+from app.services.job_service import Report
+from app.services.person_id_service import allocate_person_ids
+from app.services.person_service import new_person_row, person_from_row, write_person_rows
+from app.services.projection_service import ChartGraph, apply_to_graph
+from app.services.relationship_service import write_relationship_rows
+from app.services.version_service import bump_chart_version
+from app.utils.gedcom import GedcomRecord, parse_date, parse_name, read_records
+
+# Skipped-record notes kept in the job result (the count covers all of them)
+_NOTES_KEPT = 100
+
+_UNKNOWN_NAME = "Không rõ"
+
+
+async def save_upload(chunks: AsyncIterator[bytes], suffix: str = ".ged") -> str:
+    """Spool an uploaded file to disk and return its path (413 beyond IMPORT_MAX_MB)."""
+    limit = settings.IMPORT_MAX_MB * 1024 * 1024
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail=f"File is larger than {settings.IMPORT_MAX_MB} MB")
+                f.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    if not size:
+        os.unlink(path)
+        raise HTTPException(status_code=400, detail="Empty file")
+    return path
+
+
+def _records(path: str):
+    # ANSEL-encoded (pre-5.5.1) files are not decoded; their non-ASCII characters are replaced
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        yield from read_records(f)
+
+
+class _Plan:
+    """Result of the scan pass: who is who, and the edges to create (indexes into the INDI order)."""
+
+    def __init__(self):
+        self.xrefs: dict[str, int] = {}
+        self.genders: list[str] = []
+        self.father: list[int] = []
+        self.mother: list[int] = []
+        self.child_order: list[Optional[int]] = []
+        self.couples: list[tuple[int, int, int]] = []   # (husband, wife, spouseOrder)
+        self.levels: list[int] = []
+        self.notes: list[str] = []
+        self.note_count = 0
+
+    def note(self, text: str) -> None:
+        self.note_count += 1
+        if len(self.notes) < _NOTES_KEPT:
+            self.notes.append(text)
+
+    def edge_count(self) -> int:
+        return (sum(1 for p in self.father if p >= 0) + sum(1 for p in self.mother if p >= 0)
+                + len(self.couples))
+
+
+_SEX = {"M": "M", "F": "F"}
+
+
+def _scan(path: str, base_level: int) -> _Plan:
+    plan = _Plan()
+    families: list[tuple[Optional[str], Optional[str], str, list[str]]] = []
+    for rec in _records(path):
+        if rec.tag == "INDI":
+            if rec.xref and rec.xref not in plan.xrefs:
+                plan.xrefs[rec.xref] = len(plan.genders)
+            elif rec.xref:
+                plan.note(f"{rec.xref}: duplicate INDI id, imported without relationships")
+            plan.genders.append(_SEX.get((rec.value_of("SEX") or "").upper()[:1], "O"))
+        elif rec.tag == "FAM":
+            families.append((rec.value_of("HUSB"), rec.value_of("WIFE"), rec.xref or "FAM",
+                             [c.value for c in rec.all("CHIL")]))
+
+    n = len(plan.genders)
+    plan.father, plan.mother, plan.child_order = [-1] * n, [-1] * n, [None] * n
+    wives: set[int] = set()
+    marriages: dict[int, int] = {}
+    for husb_ref, wife_ref, fam, children in families:
+        husb = _partner(plan, fam, husb_ref, "M", "Father must be male")
+        wife = _partner(plan, fam, wife_ref, "F", "Mother must be female")
+        if husb >= 0 and wife >= 0:
+            if wife in wives:
+                plan.note(f"{fam}: The female person already has a spouse.")
+            else:
+                wives.add(wife)
+                marriages[husb] = marriages.get(husb, 0) + 1
+                plan.couples.append((husb, wife, marriages[husb]))
+        for order, ref in enumerate(children, 1):
+            child = plan.xrefs.get(ref, -1)
+            if child < 0:
+                plan.note(f"{fam}: unknown child {ref}")
+                continue
+            for parent, links, role in ((husb, plan.father, "father"), (wife, plan.mother, "mother")):
+                if parent < 0:
+                    continue
+                if parent == child:
+                    plan.note(f"{fam}: Cycle detected")
+                elif links[child] >= 0:
+                    if links[child] != parent:
+                        plan.note(f"{fam}: Child {ref} already has a {role}")
+                else:
+                    links[child] = parent
+                    if plan.child_order[child] is None:
+                        plan.child_order[child] = order
+    plan.levels = _levels(plan, base_level)
+    return plan
+
+
+def _partner(plan: _Plan, fam: str, ref: Optional[str], gender: str, error: str) -> int:
+    if not ref:
+        return -1
+    idx = plan.xrefs.get(ref, -1)
+    if idx < 0:
+        plan.note(f"{fam}: unknown person {ref}")
+        return -1
+    if plan.genders[idx] == "O":
+        # Sex not recorded: the family role tells it
+        plan.genders[idx] = gender
+    elif plan.genders[idx] != gender:
+        plan.note(f"{fam}: {error} ({ref})")
+        return -1
+    return idx
+
+
+def _levels(plan: _Plan, base_level: int) -> list[int]:
+    """Generation of every person, breadth-first from the persons without parents: a child is one
+    below its lowest-placed parent. Parent links closing a cycle are dropped (and noted)."""
+    n = len(plan.genders)
+    children: list[list[int]] = [[] for _ in range(n)]
+    pending = [0] * n
+    for child in range(n):
+        for parent in (plan.father[child], plan.mother[child]):
+            if parent >= 0:
+                children[parent].append(child)
+                pending[child] += 1
+    level = [0] * n
+    placed = [False] * n
+    queue = deque(i for i in range(n) if not pending[i])
+    remaining = n
+    while remaining:
+        while queue:
+            parent = queue.popleft()
+            placed[parent] = True
+            remaining -= 1
+            for child in children[parent]:
+                level[child] = max(level[child], level[parent] + 1)
+                pending[child] -= 1
+                if not pending[child]:
+                    queue.append(child)
+        if not remaining:
+            break
+        # Everyone left is on or below a cycle: climb unplaced parents until a person repeats and
+        # cut the link that closed the loop.
+        cur = next(i for i in range(n) if not placed[i])
+        seen: set[int] = set()
+        while True:
+            seen.add(cur)
+            parent = next(p for p in (plan.father[cur], plan.mother[cur]) if p >= 0 and not placed[p])
+            if parent in seen:
+                break
+            cur = parent
+        links = plan.father if plan.father[cur] == parent else plan.mother
+        links[cur] = -1
+        children[parent].remove(cur)
+        plan.note("Cycle detected: a parent link was dropped")
+        pending[cur] -= 1
+        if not pending[cur]:
+            queue.append(cur)
+
+    # Persons without parents (married-in spouses, founders) go right above their highest child,
+    # or next to their spouse when they have no children either.
+    for i in range(n):
+        if plan.father[i] < 0 and plan.mother[i] < 0 and children[i]:
+            level[i] = min(level[c] for c in children[i]) - 1
+    for husb, wife, _ in plan.couples:
+        for person, spouse in ((husb, wife), (wife, husb)):
+            if plan.father[person] < 0 and plan.mother[person] < 0 and not children[person]:
+                level[person] = level[spouse]
+    return [lv + base_level for lv in level]
+
+
+def _person_row(rec: GedcomRecord, pid: int, owner_id: str, gender: str, level: int) -> dict:
+    notes = [n.value for n in rec.all("NOTE") if n.value and not n.value.startswith("@")]
+    dob, dod = parse_date(rec.value_of("BIRT", "DATE")), parse_date(rec.value_of("DEAT", "DATE"))
+    # Approximate or partial dates do not fit a date field; keep them readable in the description
+    for label, event, parsed in (("Birth", "BIRT", dob), ("Death", "DEAT", dod)):
+        raw = rec.value_of(event, "DATE")
+        if raw and parsed is None:
+            notes.append(f"{label}: {raw}")
+    name = parse_name(rec.value_of("NAME")) or _UNKNOWN_NAME
+    return new_person_row(pid, owner_id, name, gender, level, dob, dod, "\n".join(notes) or None)
+
+
+async def _write_tx(tx, chart_id: str, rows: list[dict], rel_type: Optional[str]) -> int:
+    # Rows only touch persons this import creates, so there is nothing to validate under the lock
+    if rel_type is None:
+        await write_person_rows(tx, chart_id, rows)
+    else:
+        await write_relationship_rows(tx, chart_id, rel_type, rows)
+    return await bump_chart_version(tx, chart_id)
+
+
+def _apply_rows(graph: ChartGraph, chart_id: str, rows: list[dict], rel_type: Optional[str]) -> None:
+    for row in rows:
+        if rel_type is None:
+            graph.upsert_person(person_from_row(chart_id, row))
+        elif rel_type == "SPOUSE_OF":
+            graph.add_spouse(row["source"], row["target"], row["order"])
+        else:
+            graph.add_parent(rel_type, row["source"], row["target"], row["order"])
+
+
+async def _write(chart_id: str, rows: list[dict], rel_type: Optional[str] = None) -> int:
+    """Write one batch of person rows (rel_type None) or edges, bumping the chart version."""
+    async with neo4j.driver.session() as session:
+        version = await session.execute_write(_write_tx, chart_id, rows, rel_type)
+    apply_to_graph(chart_id, version, lambda g: _apply_rows(g, chart_id, rows, rel_type))
+    return version
+
+
+async def import_gedcom(chart_id: str, owner_id: str, path: str, base_level: int, report: Report) -> dict:
+    """Import the GEDCOM file at `path` (deleted afterwards) into the chart; see module docstring."""
+    batch = settings.IMPORT_BATCH_SIZE
+    try:
+        await report({"phase": "scan"})
+        plan = await asyncio.to_thread(_scan, path, base_level)
+        total = len(plan.genders)
+        if not total:
+            raise HTTPException(status_code=400, detail="No INDI records found in the file")
+        edges_total = plan.edge_count()
+        ids = await allocate_person_ids(chart_id, total)
+        progress = {"phase": "persons", "persons": 0, "personsTotal": total,
+                    "relationships": 0, "relationshipsTotal": edges_total}
+        await report(progress)
+
+        rows, idx = [], 0
+        for rec in _records(path):
+            if rec.tag != "INDI":
+                continue
+            rows.append(_person_row(rec, ids[idx], owner_id, plan.genders[idx], plan.levels[idx]))
+            idx += 1
+            if len(rows) >= batch or idx == total:
+                version = await _write(chart_id, rows)
+                progress["persons"] = idx
+                await report(progress)
+                rows = []
+
+        progress["phase"] = "relationships"
+        for rel_type, edges in (
+            ("FATHER_OF", ((f, c, plan.child_order[c]) for c, f in enumerate(plan.father) if f >= 0)),
+            ("MOTHER_OF", ((m, c, plan.child_order[c]) for c, m in enumerate(plan.mother) if m >= 0)),
+            ("SPOUSE_OF", iter(plan.couples)),
+        ):
+            rows = []
+            for source, target, order in edges:
+                rows.append({"source": ids[source], "target": ids[target], "order": order})
+                if len(rows) >= batch:
+                    version = await _write(chart_id, rows, rel_type)
+                    progress["relationships"] += len(rows)
+                    await report(progress)
+                    rows = []
+            if rows:
+                version = await _write(chart_id, rows, rel_type)
+                progress["relationships"] += len(rows)
+                await report(progress)
+    finally:
+        os.unlink(path)
+
+    return {
+        "persons": total, "relationships": edges_total, "version": version, "skipped": plan.notes, "skippedCount": plan.note_count,
+    }
@@ -0,0 +1,94 @@
+"""Background jobs (imports, scans) with their progress kept in MongoDB.
+
+A job runs as an asyncio task on the worker that accepted it and clients poll
+GET /charts/{chartId}/jobs/{jobId}. Jobs do not survive a worker restart.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.db.mongo import mongo
+
+logger = logging.getLogger(__name__)
+
+# Running tasks, referenced so they are not garbage collected before they finish
+_tasks: set[asyncio.Task] = set()
+
+Report = Callable[[dict], Awaitable[None]]
+
+
+def _jobs_coll():
+    """Return the 'jobs' MongoDB collection."""
+    return mongo.client[settings.MONGODB_DB].jobs
+
+
+def _now():
+    """Return the current UTC timestamp."""
+    return datetime.now(timezone.utc)
+
+
+def _doc_to_out(doc) -> dict:
+    return {
+        "jobId": str(doc["_id"]),
+        "chartId": doc["chartId"],
+        "type": doc["type"],
+        "status": doc["status"],
+        "progress": doc.get("progress") or {},
+        "result": doc.get("result"),
+        "error": doc.get("error"),
+        "createdAt": doc["createdAt"],
+        "updatedAt": doc["updatedAt"],
+    }
+
+
+async def _set(job_id: ObjectId, **fields) -> None:
+    await _jobs_coll().update_one({"_id": job_id}, {"$set": {**fields, "updatedAt": _now()}})
+
+
+async def _run(job_id: ObjectId, work: Callable[[Report], Awaitable[dict]]) -> None:
+    async def report(progress: dict) -> None:
+        await _set(job_id, progress=progress)
+
+    await _set(job_id, status="running")
+    try:
+        result = await work(report)
+    except HTTPException as e:
+        await _set(job_id, status="failed", error=str(e.detail))
+    except Exception:
+        logger.exception("Job %s failed", job_id)
+        await _set(job_id, status="failed", error="Internal error")
+    else:
+        await _set(job_id, status="succeeded", result=result)
+
+
+async def start_job(chart_id: str, job_type: str, user_id: str,
+                    work: Callable[[Report], Awaitable[dict]]) -> dict:
+    """Record a queued job and run `work(report)` in the background. `work` calls `report` with
+    its progress as it goes and returns the job's result."""
+    now = _now()
+    doc = {
+        "chartId": chart_id, "type": job_type, "status": "queued", "createdBy": user_id,
+        "progress": {}, "result": None, "error": None, "createdAt": now, "updatedAt": now,
+    }
+    res = await _jobs_coll().insert_one(doc)
+    doc["_id"] = res.inserted_id
+    task = asyncio.create_task(_run(res.inserted_id, work))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return _doc_to_out(doc)
+
+
+async def get_job(chart_id: str, job_id: str) -> dict:
+    try:
+        oid = ObjectId(job_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid jobId")
+    doc = await _jobs_coll().find_one({"_id": oid, "chartId": chart_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _doc_to_out(doc)
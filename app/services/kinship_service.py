@@ -0,0 +1,282 @@
+"""Kinship between two persons of a chart, with Vietnamese kinship terms ("A là gì của B").
+
+Blood relations come from the closest common ancestor over FATHER_OF / MOTHER_OF. Because a person
+has two parents the graph is a DAG rather than a tree, so instead of binary lifting the index keeps,
+per person, a map ancestor -> (generations, parent the shortest path goes through). Maps are built
+once per chart data version from the parents' maps (memoised, so each person is computed once) and a
+query is a dict intersection of two maps. Relations by marriage go through at most one SPOUSE_OF
+edge on either side.
+
+Seniority between branches (anh/chị vs em, bác vs chú) follows the Vietnamese convention of the
+branch's birth order at the common ancestor: dob when both are known, otherwise childOrder.
+"""
+import sys
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.services.projection_service import ChartGraph, get_chart_graph
+
+
+class KinshipIndex:
+    """Ancestor maps of one ChartGraph version. get_kinship_index keeps it on the graph, whose
+    nbytes it grows as maps are built, so it counts towards GRAPH_PROJECTION_MAX_MB and is evicted
+    (or dropped by the next patch) together with the graph."""
+
+    def __init__(self, graph: ChartGraph):
+        self.graph = graph
+        self.version = graph.version
+        self._ancestors: dict[int, dict[int, tuple[int, int]]] = {}
+        self.nbytes = 0
+
+    def ancestors(self, pid: int) -> dict[int, tuple[int, int]]:
+        """ancestor -> (generations up, parent the shortest path leaves `pid` through).
+        `pid` itself is included at (0, 0); on ties the father's side wins."""
+        memo, graph = self._ancestors, self.graph
+        stack, visiting = [pid], set()
+        while stack:
+            cur = stack[-1]
+            if cur in memo:
+                stack.pop()
+                continue
+            visiting.add(cur)
+            pending = [p for p in graph.parents_of(cur) if p not in memo and p not in visiting]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            found = {cur: (0, 0)}
+            for parent in graph.parents_of(cur):
+                for anc, (depth, _) in memo.get(parent, {}).items():
+                    known = found.get(anc)
+                    if known is None or depth + 1 < known[0]:
+                        found[anc] = (depth + 1, parent)
+            memo[cur] = found
+            size = sys.getsizeof(found)
+            self.nbytes += size
+            if graph.kinship_index is self:
+                graph.nbytes += size
+        return memo[pid]
+
+    def path_up(self, pid: int, ancestor: int) -> list[int]:
+        """[pid, parent, ..., ancestor] along the shortest line."""
+        path = [pid]
+        while pid != ancestor:
+            pid = self.ancestors(pid)[ancestor][1]
+            path.append(pid)
+        return path
+
+    def blood(self, a: int, b: int) -> Optional[tuple[list[int], list[int]]]:
+        """Lines from a and b up to their closest common ancestor, or None if unrelated by blood."""
+        anc_a, anc_b = self.ancestors(a), self.ancestors(b)
+        small, large = (anc_a, anc_b) if len(anc_a) <= len(anc_b) else (anc_b, anc_a)
+        best = None
+        for anc, (depth, _) in small.items():
+            other = large.get(anc)
+            if other is None:
+                continue
+            key = (depth + other[0], self.graph.persons[anc].get("gender") != "M", anc)
+            if best is None or key < best:
+                best = key
+        if best is None:
+            return None
+        return self.path_up(a, best[2]), self.path_up(b, best[2])
+
+
+def _gender(graph: ChartGraph, pid: int) -> str:
+    return graph.persons[pid].get("gender") or "O"
+
+
+def _pick(gender: str, male: str, female: str) -> str:
+    if gender == "M":
+        return male
+    if gender == "F":
+        return female
+    return f"{male}/{female}"
+
+
+def _older(graph: ChartGraph, s1: int, s2: int, parent: int) -> Optional[bool]:
+    """Whether sibling s1 was born before s2 (None if unknown)."""
+    d1, d2 = graph.persons[s1].get("dob"), graph.persons[s2].get("dob")
+    if d1 and d2 and str(d1) != str(d2):
+        return str(d1) < str(d2)
+    o1, o2 = graph.child_order(parent, s1), graph.child_order(parent, s2)
+    if o1 and o2 and o1 != o2:
+        return o1 < o2
+    return None
+
+
+def _uncle_term(graph: ChartGraph, a: int, older: Optional[bool], paternal: bool) -> str:
+    """What a is to someone whose parent is a's sibling (or cousin)."""
+    gender = _gender(graph, a)
+    if not paternal:
+        return _pick(gender, "cậu", "dì")
+    if gender == "F":
+        return "bác" if older else "cô"
+    if gender == "M":
+        return "bác" if older else "chú" if older is False else "chú/bác"
+    return "chú/bác/cô"
+
+
+_ANCESTOR_WORDS = {3: "cụ", 4: "kỵ"}
+_DESCENDANT_WORDS = {3: "chắt", 4: "chút", 5: "chít"}
+
+
+def _blood_term(graph: ChartGraph, path_a: list[int], path_b: list[int]) -> str:
+    a, b = path_a[0], path_b[0]
+    da, db = len(path_a) - 1, len(path_b) - 1
+    gender = _gender(graph, a)
+    side = ("nội" if path_b[1] == graph.father[b] else "ngoại") if db else None
+
+    if da == 0:
+        if db == 1:
+            return _pick(gender, "bố", "mẹ")
+        if db == 2:
+            return f"{_pick(gender, 'ông', 'bà')} {side}"
+        return f"{_ANCESTOR_WORDS.get(db, f'tổ {db} đời')} {side}"
+    if db == 0:
+        if da == 1:
+            return _pick(gender, "con trai", "con gái")
+        if da == 2:
+            return "cháu nội" if _gender(graph, path_a[-2]) == "M" else "cháu ngoại"
+        return _DESCENDANT_WORDS.get(da, f"hậu duệ {da} đời")
+
+    # Related through the branches of the common ancestor's children
+    lca = path_a[-1]
+    older = _older(graph, path_a[-2], path_b[-2], lca)
+    distant = " họ" if min(da, db) >= 2 else ""
+    if da == db:
+        if older is None:
+            return _pick(gender, "anh/em", "chị/em") + (distant or " ruột")
+        if older:
+            return _pick(gender, "anh", "chị") + distant
+        return "em" + (distant or {"M": " trai", "F": " gái"}.get(gender, ""))
+    if da < db:
+        gap = db - da
+        # The person on b's line in the generation just below a decides the paternal/maternal side
+        below = path_b[gap - 1]
+        uncle = _uncle_term(graph, a, older, path_b[gap] == graph.father[below])
+        if gap == 1:
+            return uncle + distant
+        if gap == 2:
+            return f"{_pick(gender, 'ông', 'bà')} {uncle}{distant}"
+        return f"{_ANCESTOR_WORDS.get(gap, f'tổ {gap} đời')}{distant or ' họ'}"
+    gap = da - db
+    return ("cháu" if gap <= 2 else _DESCENDANT_WORDS.get(gap, f"hậu duệ {gap} đời")) + distant
+
+
+# What the spouse of a b's uncle/aunt is to b
+_UNCLE_SPOUSES = {"chú": "thím", "cậu": "mợ", "cô": "dượng", "dì": "dượng"}
+
+
+def _spouse_of_relative_term(graph: ChartGraph, a: int, path_r: list[int], path_b: list[int],
+                             relative_term: str) -> str:
+    """What a is to b when a is married to r, a blood relative of b."""
+    male = _gender(graph, a) == "M"
+    dr, db = len(path_r) - 1, len(path_b) - 1
+    if dr == 0 and db == 1:
+        return "bố dượng" if male else "mẹ kế"
+    if db == 0:
+        in_law = "rể" if male else "dâu"
+        return f"con {in_law}" if dr == 1 else f"cháu {in_law}"
+    if dr == db:
+        in_law = "rể" if male else "dâu"
+        distant = " họ" if relative_term.endswith(" họ") else ""
+        if relative_term.startswith("em"):
+            return f"em {in_law}{distant}"
+        if "/" in relative_term.split(" ")[0]:
+            return f"{'anh/em' if male else 'chị/em'} {in_law}{distant}"
+        return f"{'anh' if male else 'chị'} {in_law}{distant}"
+    base, distant, _ = relative_term.partition(" họ")
+    if base == "bác":
+        return ("bác trai" if male else "bác gái") + distant
+    if base in _UNCLE_SPOUSES:
+        return _UNCLE_SPOUSES[base] + distant
+    return f"{'chồng' if male else 'vợ'} của {relative_term}"
+
+
+def _relative_of_spouse_term(graph: ChartGraph, spouse: int, path_a: list[int], path_s: list[int],
+                             relative_term: str) -> str:
+    """What a is to b when a is a blood relative of b's spouse."""
+    suffix = _pick(_gender(graph, spouse), "chồng", "vợ")
+    if len(path_s) == 1 and len(path_a) == 2:
+        return f"con riêng của {suffix}"
+    return f"{relative_term.replace(' trai', '').replace(' gái', '')} {suffix}"
+
+
+def _relation(a: int, b: int, path: list[int], term: str, lca: Optional[int] = None,
+              da: Optional[int] = None, db: Optional[int] = None, via: Optional[int] = None) -> dict:
+    return {
+        "a": a, "b": b, "related": True, "term": term, "commonAncestor": lca,
+        "generationsFromA": da, "generationsFromB": db, "via": via, "path": path,
+    }
+
+
+def _closest_blood(index: KinshipIndex, candidates: list[int], other: int):
+    """The candidate with the closest blood relation to `other`: (candidate, path_c, path_other)."""
+    best = None
+    for cand in candidates:
+        if cand == other:
+            continue
+        lines = index.blood(cand, other)
+        if lines and (best is None or len(lines[0]) + len(lines[1]) < len(best[1]) + len(best[2])):
+            best = (cand, *lines)
+    return best
+
+
+def kinship(index: KinshipIndex, a: int, b: int) -> dict:
+    graph = index.graph
+    if a == b:
+        return _relation(a, b, [a], "bản thân")
+
+    lines = index.blood(a, b)
+    if lines:
+        path_a, path_b = lines
+        return _relation(a, b, path_a + path_b[-2::-1], _blood_term(graph, path_a, path_b),
+                         path_a[-1], len(path_a) - 1, len(path_b) - 1)
+
+    if b in graph.spouses_of(a):
+        return _relation(a, b, [a, b], _pick(_gender(graph, a), "chồng", "vợ"), via=b)
+
+    # a married into b's family
+    found = _closest_blood(index, graph.spouses_of(a), b)
+    if found:
+        r, path_r, path_b = found
+        term = _spouse_of_relative_term(graph, a, path_r, path_b, _blood_term(graph, path_r, path_b))
+        return _relation(a, b, [a] + path_r + path_b[-2::-1], term, path_r[-1],
+                         len(path_r) - 1, len(path_b) - 1, via=r)
+
+    # a belongs to the family b married into
+    found = _closest_blood(index, graph.spouses_of(b), a)
+    if found:
+        s, path_s, path_a = found
+        term = _relative_of_spouse_term(graph, s, path_a, path_s, _blood_term(graph, path_a, path_s))
+        return _relation(a, b, path_a + path_s[-2::-1] + [b], term, path_a[-1],
+                         len(path_a) - 1, len(path_s) - 1, via=s)
+
+    # Parents of a married couple
+    for child in graph.children[a] or ():
+        for spouse in graph.spouses_of(child):
+            if b in graph.parents_of(spouse):
+                return _relation(a, b, [a, child, spouse, b], "thông gia", via=child)
+
+    return {
+        "a": a, "b": b, "related": False, "term": None, "commonAncestor": None,
+        "generationsFromA": None, "generationsFromB": None, "via": None, "path": [],
+    }
+
+
+async def get_kinship_index(chart_id: str) -> KinshipIndex:
+    """Kinship index of a chart at its current data version, built once per version."""
+    graph = await get_chart_graph(chart_id)
+    if graph.kinship_index is None:
+        graph.kinship_index = KinshipIndex(graph)
+    return graph.kinship_index
+
+
+async def get_kinship(chart_id: str, a: int, b: int) -> dict:
+    index = await get_kinship_index(chart_id)
+    if not index.graph.has(a) or not index.graph.has(b):
+        raise HTTPException(status_code=404, detail="Person not found")
+    return kinship(index, a, b)
+
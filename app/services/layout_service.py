@@ -0,0 +1,142 @@
+"""Server-side generational layout of a chart's tree.
+
+The layout works on the same forest the tree view draws: every child hangs off exactly one parent
+(father preferred, see tree_service.get_tree). Each person is placed together with the spouses who
+married into the family (spouses without a parent of their own) as one "unit"; children are ordered
+by childOrder and spouses by spouseOrder. A subtree is as wide as the larger of its unit and its
+children, and a unit is centred above its children. y is the person's `level`; x is in node-width
+slots, left to right, so the client only has to scale the numbers.
+
+Layouts are computed from the graph projection and cached per chart data version, so the work runs
+once per edit rather than once per view.
+"""
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.services.projection_service import ChartGraph, get_chart_graph
+
+# Horizontal gap (in node slots) between sibling subtrees
+SIBLING_GAP = 0.5
+
+# chartId -> layout dict (with its "version"); least recently used first
+_layout_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+_UNKNOWN_ORDER = float("inf")
+
+
+def _child_sort_key(graph: ChartGraph, parent: int, child: int):
+    order = graph.child_order(parent, child)
+    dob = graph.persons[child].get("dob")
+    return (order or _UNKNOWN_ORDER, str(dob) if dob else "~", child)
+
+
+def compute_layout(graph: ChartGraph) -> dict:
+    """Return {version, width, nodes (tree nodes with x, y), links} for a chart graph."""
+    pids = list(graph.person_ids())
+
+    def tree_parent(pid: int) -> int:
+        return graph.father[pid] or graph.mother[pid]
+
+    # 1. Attach married-in spouses (no parent of their own) to their partner. When neither partner has
+    #    a parent, the SPOUSE_OF source (the husband) is the primary one.
+    attached_to: dict[int, int] = {}
+    for pid in pids:
+        if tree_parent(pid):
+            continue
+        candidates = []
+        for source in graph.spouse_in[pid] or ():
+            candidates.append((graph.spouse_order.get((source, pid)) or _UNKNOWN_ORDER, source))
+        for target in graph.spouse_out[pid] or ():
+            if tree_parent(target):
+                candidates.append((graph.spouse_order.get((pid, target)) or _UNKNOWN_ORDER, target))
+        if candidates:
+            attached_to[pid] = min(candidates)[1]
+    # A partner that is itself attached elsewhere cannot anchor anyone; keep such persons standalone.
+    attached_to = {pid: host for pid, host in attached_to.items() if host not in attached_to}
+
+    spouses_of: dict[int, list[int]] = {}
+    for pid, host in attached_to.items():
+        spouses_of.setdefault(host, []).append(pid)
+    for host, spouses in spouses_of.items():
+        spouses.sort(key=lambda s: (graph.spouse_order.get((host, s)) or graph.spouse_order.get((s, host))
+                                    or _UNKNOWN_ORDER, s))
+
+    # 2. Children of each unit: tree children of the primary person and of their attached spouses.
+    unit_children: dict[int, list[int]] = {}
+    for pid in pids:
+        parent = tree_parent(pid)
+        if parent:
+            host = attached_to.get(parent, parent)
+            unit_children.setdefault(host, []).append(pid)
+    for host, children in unit_children.items():
+        children.sort(key=lambda c: _child_sort_key(graph, tree_parent(c), c))
+
+    roots = [pid for pid in pids if not tree_parent(pid) and pid not in attached_to]
+    roots.sort(key=lambda pid: (graph.persons[pid].get("level") or 0, pid))
+
+    # 3. Subtree widths, post-order without recursion.
+    width: dict[int, float] = {}
+    for root in roots:
+        stack = [(root, False)]
+        while stack:
+            pid, done = stack.pop()
+            children = unit_children.get(pid, [])
+            if not done:
+                stack.append((pid, True))
+                stack.extend((c, False) for c in children)
+                continue
+            own = 1 + len(spouses_of.get(pid, []))
+            below = sum(width[c] for c in children) + SIBLING_GAP * max(len(children) - 1, 0)
+            width[pid] = max(own, below)
+
+    # 4. Positions, pre-order: each unit is centred over the block its children occupy.
+    x: dict[int, float] = {}
+    cursor = 0.0
+    for root in roots:
+        stack = [(root, cursor)]
+        while stack:
+            pid, left = stack.pop()
+            spouses = spouses_of.get(pid, [])
+            own = 1 + len(spouses)
+            start = left + (width[pid] - own) / 2
+            x[pid] = start
+            for i, spouse in enumerate(spouses, start=1):
+                x[spouse] = start + i
+            children = unit_children.get(pid, [])
+            below = sum(width[c] for c in children) + SIBLING_GAP * max(len(children) - 1, 0)
+            child_left = left + (width[pid] - below) / 2
+            for child in children:
+                stack.append((child, child_left))
+                child_left += width[child] + SIBLING_GAP
+        cursor += width[root] + SIBLING_GAP
+
+    tree = graph.to_tree()
+    nodes = [{**node, "x": x.get(node["id"], 0.0), "y": node["level"]} for node in tree["nodes"]]
+    return {
+        "version": graph.version,
+        "width": max(cursor - SIBLING_GAP, 0.0),
+        "nodes": nodes,
+        "links": tree["links"],
+    }
+
+
+async def get_tree_layout(chart_id: str, version: int) -> dict:
+    """Layout of a chart at data `version`, computed once per version."""
+    cached = _layout_cache.get(chart_id)
+    if cached is not None and cached["version"] == version:
+        _layout_cache.move_to_end(chart_id)
+        return cached
+    graph = await get_chart_graph(chart_id, version)
+    layout = compute_layout(graph)
+    current = _layout_cache.get(chart_id)
+    if current is None or current["version"] < layout["version"]:
+        _layout_cache[chart_id] = layout
+        _layout_cache.move_to_end(chart_id)
+        while len(_layout_cache) > settings.TREE_CACHE_MAX_CHARTS:
+            _layout_cache.popitem(last=False)
+    return layout
+
+
+def evict_layout_cache(chart_id: str) -> None:
+    """Drop a chart's cached layout (used when the chart is deleted)."""
+    _layout_cache.pop(chart_id, None)
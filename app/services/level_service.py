@@ -0,0 +1,152 @@
+"""Generation levels derived from the parent edges.
+
+`derive_levels` walks the chart breadth-first from anchors whose level is kept: the founders
+(persons without parents, unless they married into the family) for the whole chart, or the given
+person for a subtree. A child is placed once all its parents are, one level below the lowest of
+them. A person without parents who married someone with parents takes that spouse's level.
+"""
+from collections import deque
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.db.neo4j import neo4j
+from app.services.projection_service import ChartGraph, apply_to_graph, get_chart_graph
+from app.services.version_service import bump_chart_version, node_change
+
+
+def _level(graph: ChartGraph, pid: int) -> int:
+    return graph.persons[pid].get("level") or 0
+
+
+def _subtree(graph: ChartGraph, root: int) -> set[int]:
+    scope, frontier = {root}, [root]
+    while frontier:
+        frontier = [c for cur in frontier for c in (graph.children[cur] or ()) if c not in scope]
+        scope.update(frontier)
+    return scope
+
+
+def _married_in(graph: ChartGraph, scope: set[int]) -> set[int]:
+    """Spouses of `scope` members who are outside it and have no parents."""
+    return {s for pid in scope for s in graph.spouses_of(pid) if s not in scope and not graph.parents_of(s)}
+
+
+def derive_levels(graph: ChartGraph, root: Optional[int] = None) -> dict[int, int]:
+    """New level of every person the walk reaches (whole chart, or `root` and its descendants)."""
+    # Married-in persons follow their spouse (in subtree mode they sit outside the scope)
+    if root is None:
+        scope = set(graph.person_ids())
+        in_laws = {s for pid in scope if graph.parents_of(pid) for s in graph.spouses_of(pid) if not graph.parents_of(s)}
+    else:
+        scope = _subtree(graph, root)
+        in_laws = _married_in(graph, scope)
+    pending = {pid: sum(1 for p in graph.parents_of(pid) if p in scope) for pid in scope}
+
+    new: dict[int, int] = {}
+    queue: deque[int] = deque()
+
+    def place(pid: int, lv: int) -> None:
+        new[pid] = lv
+        queue.append(pid)
+
+    if root is None:
+        for pid in scope:
+            if not pending[pid] and pid not in in_laws:
+                place(pid, _level(graph, pid))
+    else:
+        place(root, _level(graph, root))
+    while queue:
+        cur = queue.popleft()
+        for spouse in graph.spouses_of(cur):
+            if spouse in in_laws and spouse not in new:
+                place(spouse, new[cur])
+        for child in graph.children[cur] or ():
+            if child not in scope or child in new:
+                continue
+            pending[child] -= 1
+            if pending[child] <= 0:
+                place(child, max(new.get(p, _level(graph, p)) for p in graph.parents_of(child)) + 1)
+    return new
+
+
+def shift_levels(graph: ChartGraph, root: int, level: int) -> dict[int, int]:
+    """Levels after moving `root` to `level` with its descendants (and their married-in spouses)
+    shifted by the same number of generations."""
+    delta = level - _level(graph, root)
+    scope = _subtree(graph, root)
+    return {pid: _level(graph, pid) + delta for pid in scope | _married_in(graph, scope)}
+
+
+def check_levels(graph: ChartGraph, changed: dict[int, int], moved: Optional[int] = None) -> None:
+    """Every parent edge touching a changed person must still go down a level (409 otherwise).
+    The parent edges of `moved` are about to be replaced and are not checked."""
+    def level(pid: int) -> int:
+        return changed.get(pid, _level(graph, pid))
+
+    for pid in changed:
+        for parent in graph.parents_of(pid) if pid != moved else ():
+            if level(parent) >= level(pid):
+                raise HTTPException(status_code=409, detail=f"Person {pid} would no longer be below their parent {parent}")
+        for child in graph.children[pid] or ():
+            if level(pid) >= level(child):
+                raise HTTPException(status_code=409, detail=f"Person {child} would no longer be below their parent {pid}")
+
+
+async def _write_levels(tx, chart_id: str, expected_version: int, changed: dict[int, int], changes: list[dict]) -> int:
+    # Optimistic check (see version_service): the levels were derived at expected_version
+    version = await bump_chart_version(tx, chart_id, changes)
+    if version != expected_version + 1:
+        raise HTTPException(status_code=409, detail="Chart is being modified concurrently, please retry")
+    await write_level_rows(tx, chart_id, changed)
+    return version
+
+
+async def write_level_rows(tx, chart_id: str, changed: dict[int, int]) -> None:
+    res = await tx.run("""
+        UNWIND $rows AS row
+        MATCH (n:Person {chartId:$cid, personId: row.personId})
+        SET n.level = row.level
+    """, rows=[{"personId": pid, "level": lv} for pid, lv in changed.items()], cid=chart_id)
+    await res.consume()
+
+
+def level_report(graph: ChartGraph, changed: dict[int, int]) -> list[dict]:
+    """LevelChangeOut rows for `changed`, top generation first."""
+    return [
+        {"personId": pid, "name": graph.persons[pid].get("name"),
+         "oldLevel": graph.persons[pid].get("level"), "newLevel": lv}
+        for pid, lv in sorted(changed.items(), key=lambda item: (item[1], item[0]))
+    ]
+
+
+async def write_levels(graph: ChartGraph, changed: dict[int, int]) -> int:
+    """Persist new levels derived from `graph` in one transaction and patch the projection."""
+    check_levels(graph, changed)
+    persons = [{**graph.persons[pid], "level": lv} for pid, lv in changed.items()]
+    async with neo4j.driver.session() as session:
+        version = await session.execute_write(
+            _write_levels, graph.chart_id, graph.version, changed, [node_change(p) for p in persons])
+
+    def patch_graph(g):
+        for person in persons:
+            g.upsert_person(person)
+    apply_to_graph(graph.chart_id, version, patch_graph)
+    return version
+
+
+async def recompute_levels(chart_id: str, person_id: Optional[int] = None, dry_run: bool = False) -> dict:
+    """Re-derive levels for the whole chart or for `person_id`'s subtree (whose own level is
+    kept). Returns the persons whose level changes; with dry_run nothing is written."""
+    graph = await get_chart_graph(chart_id)
+    if person_id is not None and not graph.has(person_id):
+        raise HTTPException(status_code=404, detail="Person not found")
+    changed = {
+        pid: lv for pid, lv in derive_levels(graph, person_id).items()
+        if lv != graph.persons[pid].get("level")
+    }
+    report = level_report(graph, changed)
+    version = graph.version
+    if changed and not dry_run:
+        version = await write_levels(graph, changed)
+    return {"changed": report, "version": version, "dryRun": dry_run}
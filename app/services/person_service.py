@@ -1,8 +1,14 @@
+import base64
+import json
 from fastapi import HTTPException
 from app.db.neo4j import neo4j
 from datetime import date
 from app.utils.lunar_converter import solar_to_lunar
 from app.utils.cloudinary_helper import delete_images
+from app.services.version_service import bump_chart_version, link_change, lock_chart_version, node_change, node_removed
+from app.services.projection_service import apply_to_graph, get_chart_graph
+from app.services.person_id_service import allocate_person_id
+from app.core.config import settings
 try:  # neo4j driver date type
     from neo4j.time import Date as Neo4jDate  # type: ignore
 except Exception:  # pragma: no cover
@@ -31,60 +37,200 @@ def _node_to_dict(node) -> dict:
         out[k] = v
     return out
 
+def _new_person_params(ownerId: str, name: str, gender: str, level: int,
+                       dob=None, dod=None, description=None, photoUrl=None) -> dict:
+    """Query parameters for _PERSON_PROPS, with the lunar death date fields computed from dod."""
+    lunar = solar_to_lunar(dod)
+    return dict(
+        oid=ownerId, name=name, gender=gender, level=level,
+        dob=dob if dob else None, dod=dod if dod else None,
+        desc=description, photo=photoUrl,
+        lunarDay=lunar["lunarDeathDay"] if lunar else None,
+        lunarMonth=lunar["lunarDeathMonth"] if lunar else None,
+        lunarYear=lunar["lunarDeathYear"] if lunar else None,
+        lunarIsLeap=lunar["lunarIsLeap"] if lunar else None,
+    )
+
+# Property map of a new Person node
+_PERSON_PROPS = """{
+    personId:$pid, chartId:$cid, ownerId:$oid,
+    name:$name, gender:$gender, level:$level,
+    dob:$dob, dod:$dod, description:$desc, photoUrl:$photo,
+    lunarDeathDay:$lunarDay, lunarDeathMonth:$lunarMonth,
+    lunarDeathYear:$lunarYear, lunarIsLeap:$lunarIsLeap
+}"""
+
+# _PERSON_PROPS read from an UNWIND row; the chart stays a query parameter
+_PERSON_ROW_PROPS = _PERSON_PROPS.replace("$", "row.").replace("row.cid", "$cid")
+
+def new_person_row(personId: int, ownerId: str, name: str, gender: str, level: int,
+                   dob=None, dod=None, description=None, photoUrl=None) -> dict:
+    """One row for write_person_rows."""
+    return dict(_new_person_params(ownerId, name, gender, level, dob, dod, description, photoUrl), pid=personId)
+
+def person_from_row(chartId: str, row: dict) -> dict:
+    """Properties of the node write_person_rows creates from `row` (to patch projections)."""
+    return {
+        "personId": row["pid"], "chartId": chartId, "ownerId": row["oid"],
+        "name": row["name"], "gender": row["gender"], "level": row["level"],
+        "dob": row["dob"], "dod": row["dod"], "description": row["desc"], "photoUrl": row["photo"],
+        "lunarDeathDay": row["lunarDay"], "lunarDeathMonth": row["lunarMonth"],
+        "lunarDeathYear": row["lunarYear"], "lunarIsLeap": row["lunarIsLeap"],
+    }
+
+async def write_person_rows(tx, chartId: str, rows: list[dict]) -> None:
+    """CREATE one Person per new_person_row(...) (bulk imports)."""
+    res = await tx.run(f"UNWIND $rows AS row CREATE (n:Person {_PERSON_ROW_PROPS})", rows=rows, cid=chartId)
+    await res.consume()
+
+async def _create_person_tx(tx, chartId: str, personId: int, params: dict):
+    # Create node with lunar fields and return it
+    res = await tx.run(f"CREATE (n:Person {_PERSON_PROPS}) RETURN n", pid=personId, cid=chartId, **params)
+    person = _node_to_dict((await res.single())["n"])
+    version = await bump_chart_version(tx, chartId, [node_change(person)])
+    return person, version
+
 async def create_person(chartId: str, ownerId: str, name: str, gender: str, level: int,
                         dob=None, dod=None, description=None, photoUrl=None):
-    # Compute lunar death date fields
-    lunar = solar_to_lunar(dod)
-    lunar_day = lunar["lunarDeathDay"] if lunar else None
-    lunar_month = lunar["lunarDeathMonth"] if lunar else None
-    lunar_year = lunar["lunarDeathYear"] if lunar else None
-    lunar_is_leap = lunar["lunarIsLeap"] if lunar else None
+    params = _new_person_params(ownerId, name, gender, level, dob, dod, description, photoUrl)
+
+    # personId comes from this worker's reserved block (see person_id_service)
+    personId = await allocate_person_id(chartId)
 
     async with neo4j.driver.session() as session:
-        # Generate auto-increment personId per chart
-        resId = await session.run(
-            """
-            MATCH (x:Person {chartId:$cid})
-            WITH coalesce(max(x.personId), 0) AS mx
-            MERGE (c:Counter {chartId:$cid, type:'PERSON'})
-            ON CREATE SET c.value = mx
-            WITH c
-            SET c.value = c.value + 1
-            RETURN c.value AS nextId
-            """,
-            cid=chartId,
+        person, version = await session.execute_write(_create_person_tx, chartId, personId, params)
+    apply_to_graph(chartId, version, lambda g: g.upsert_person(person))
+    return person
+
+async def _create_child_tx(tx, chartId: str, params: dict, father_id, mother_id, child_order):
+    await lock_chart_version(tx, chartId)
+    # Validation lives in the WHERE clause: no row means nothing was written.
+    res = await tx.run(f"""
+        OPTIONAL MATCH (f:Person {{personId:$fatherId, chartId:$cid}})
+        OPTIONAL MATCH (m:Person {{personId:$motherId, chartId:$cid}})
+        WITH f, m
+        WHERE ($fatherId IS NULL OR (f.gender = 'M' AND f.level < $level))
+          AND ($motherId IS NULL OR (m.gender = 'F' AND m.level < $level))
+          AND CASE WHEN f IS NULL OR m IS NULL THEN true ELSE EXISTS {{ (f)-[:SPOUSE_OF]-(m) }} END
+        CREATE (n:Person {_PERSON_PROPS})
+        FOREACH (ok IN CASE WHEN f IS NULL THEN [] ELSE [1] END |
+            CREATE (f)-[:FATHER_OF {{childOrder:$childOrder}}]->(n))
+        FOREACH (ok IN CASE WHEN m IS NULL THEN [] ELSE [1] END |
+            CREATE (m)-[:MOTHER_OF {{childOrder:$childOrder}}]->(n))
+        RETURN n
+    """, cid=chartId, fatherId=father_id, motherId=mother_id, childOrder=child_order, **params)
+    rec = await res.single()
+    if rec is None:
+        await _raise_add_child_error(tx, chartId, params["level"], father_id, mother_id)
+    person = _node_to_dict(rec["n"])
+    parent_id = father_id if father_id is not None else mother_id
+    changes = [node_change(person)]
+    if parent_id is not None:
+        changes.append(link_change(parent_id, person["personId"], "PARENT_OF"))
+    version = await bump_chart_version(tx, chartId, changes)
+    return person, version
+
+async def _raise_add_child_error(tx, chartId: str, level: int, father_id, mother_id):
+    """Explain why _create_child_tx matched nothing (same messages as the relationship endpoints)."""
+    res = await tx.run("""
+        OPTIONAL MATCH (f:Person {personId:$fatherId, chartId:$cid})
+        OPTIONAL MATCH (m:Person {personId:$motherId, chartId:$cid})
+        RETURN f.gender AS fatherGender, f.level AS fatherLevel,
+               m.gender AS motherGender, m.level AS motherLevel,
+               CASE WHEN f IS NULL OR m IS NULL THEN false ELSE EXISTS { (f)-[:SPOUSE_OF]-(m) } END AS isCouple
+    """, cid=chartId, fatherId=father_id, motherId=mother_id)
+    rec = await res.single()
+    if father_id is not None and mother_id is not None and not rec["isCouple"]:
+        raise HTTPException(
+            status_code=400,
+            detail="Father and mother must be a married couple (SPOUSE_OF relationship required)"
         )
-        personIdRec = await resId.single()
-        if not personIdRec:
-            raise HTTPException(status_code=500, detail="Failed to generate personId")
-        personId: int = personIdRec["nextId"]
-
-        # Create node with lunar fields
-        await session.run("""
-            CREATE (n:Person {
-                personId:$pid, chartId:$cid, ownerId:$oid,
-                name:$name, gender:$gender, level:$level,
-                dob:$dob, dod:$dod, description:$desc, photoUrl:$photo,
-                lunarDeathDay:$lunarDay, lunarDeathMonth:$lunarMonth,
-                lunarDeathYear:$lunarYear, lunarIsLeap:$lunarIsLeap
-            })
-        """, pid=personId, cid=chartId, oid=ownerId, name=name, gender=gender, level=level,
-           dob=dob if dob else None, dod=dod if dod else None,
-           desc=description, photo=photoUrl,
-           lunarDay=lunar_day, lunarMonth=lunar_month,
-           lunarYear=lunar_year, lunarIsLeap=lunar_is_leap)
-
-        # Return created
-        res = await session.run("""
-            MATCH (n:Person {personId:$pid, chartId:$cid})
-            RETURN n
-        """, pid=personId, cid=chartId)
-        node = (await res.single())["n"]
-        return _node_to_dict(node)
+    for role, pid, gender, gender_name in (("father", father_id, "M", "male"), ("mother", mother_id, "F", "female")):
+        if pid is None:
+            continue
+        if rec[f"{role}Gender"] is None:
+            raise HTTPException(status_code=404, detail=f"{role.capitalize()} or child not found")
+        if rec[f"{role}Gender"] != gender:
+            raise HTTPException(status_code=400, detail=f"{role.capitalize()} must be {gender_name} (gender='{gender}')")
+        if rec[f"{role}Level"] >= level:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid relationship: {role} (level {rec[f'{role}Level']}) must have lower level than child (level {level})"
+            )
+    raise HTTPException(status_code=409, detail="Chart was modified concurrently, please retry")
 
-async def update_person(chartId: str, personId: int, patch: dict):
-    if not patch:
-        raise HTTPException(status_code=400, detail="Nothing to update")
+async def create_child_person(chartId: str, ownerId: str, name: str, gender: str, level: int,
+                              dob=None, dod=None, description=None, photoUrl=None,
+                              father_id: int = None, mother_id: int = None, child_order: int = None):
+    """Create a person together with its FATHER_OF / MOTHER_OF edges in one write transaction."""
+    params = _new_person_params(ownerId, name, gender, level, dob, dod, description, photoUrl)
+    params["pid"] = await allocate_person_id(chartId)
+    async with neo4j.driver.session() as session:
+        person, version = await session.execute_write(
+            _create_child_tx, chartId, params, father_id, mother_id, child_order)
+
+    def patch(g):
+        g.upsert_person(person)
+        if father_id is not None:
+            g.add_parent("FATHER_OF", father_id, person["personId"], child_order)
+        if mother_id is not None:
+            g.add_parent("MOTHER_OF", mother_id, person["personId"], child_order)
+    apply_to_graph(chartId, version, patch)
+    return person
+
+async def _create_spouse_tx(tx, chartId: str, params: dict, spouse_id: int, spouse_order):
+    await lock_chart_version(tx, chartId)
+    # Same rules as add_spouse_of; the edge is always stored male -> female
+    res = await tx.run(f"""
+        MATCH (s:Person {{personId:$spouseId, chartId:$cid}})
+        WHERE NOT (s.gender = $gender AND $gender IN ['M', 'F'])
+          AND NOT (s.gender = 'F' AND EXISTS {{ ()-[:SPOUSE_OF]->(s) }})
+        CREATE (n:Person {_PERSON_PROPS})
+        FOREACH (ok IN CASE WHEN s.gender = 'M' THEN [1] ELSE [] END |
+            CREATE (s)-[:SPOUSE_OF {{spouseOrder:$spouseOrder}}]->(n))
+        FOREACH (ok IN CASE WHEN s.gender = 'M' THEN [] ELSE [1] END |
+            CREATE (n)-[:SPOUSE_OF {{spouseOrder:$spouseOrder}}]->(s))
+        RETURN n, s.gender = 'M' AS spouseIsSource
+    """, cid=chartId, spouseId=spouse_id, spouseOrder=spouse_order, **params)
+    rec = await res.single()
+    if rec is None:
+        check = await tx.run("""
+            OPTIONAL MATCH (s:Person {personId:$spouseId, chartId:$cid})
+            RETURN s.gender AS gender
+        """, cid=chartId, spouseId=spouse_id)
+        spouse_gender = (await check.single())["gender"]
+        if spouse_gender is None:
+            raise HTTPException(status_code=404, detail="One or both persons not found")
+        if spouse_gender == params["gender"] and spouse_gender in ["M", "F"]:
+            raise HTTPException(status_code=400, detail="Spouses must be of different genders")
+        raise HTTPException(status_code=400, detail="The female person already has a spouse.")
+    person = _node_to_dict(rec["n"])
+    pid = person["personId"]
+    source, target = (spouse_id, pid) if rec["spouseIsSource"] else (pid, spouse_id)
+    version = await bump_chart_version(tx, chartId, [node_change(person), link_change(source, target, "SPOUSE_OF")])
+    return person, source, target, version
+
+async def create_spouse_person(chartId: str, ownerId: str, name: str, gender: str, level: int,
+                               dob=None, dod=None, description=None, photoUrl=None,
+                               spouse_id: int = None, spouse_order: int = None):
+    """Create a person married to `spouse_id` (SPOUSE_OF edge included) in one write transaction."""
+    params = _new_person_params(ownerId, name, gender, level, dob, dod, description, photoUrl)
+    params["pid"] = await allocate_person_id(chartId)
+    async with neo4j.driver.session() as session:
+        person, source, target, version = await session.execute_write(
+            _create_spouse_tx, chartId, params, spouse_id, spouse_order)
+
+    def patch(g):
+        g.upsert_person(person)
+        g.add_spouse(source, target, spouse_order)
+    apply_to_graph(chartId, version, patch)
+    return person
+
+_LUNAR_FIELDS = ("lunarDeathDay", "lunarDeathMonth", "lunarDeathYear", "lunarIsLeap")
+
+def _prepare_patch(patch: dict, lunar_cache: dict = None) -> dict:
+    """Validate a person patch and add the lunar death fields when dod changes.
+    `lunar_cache` memoises solar_to_lunar across the patches of a bulk update."""
     # Do not allow changing identity fields
     patch.pop("personId", None)
     patch.pop("chartId", None)
@@ -96,63 +242,130 @@ async def update_person(chartId: str, personId: int, patch: dict):
     # If dod is being updated, recompute lunar fields
     if "dod" in patch:
         dod_val = patch["dod"]
-        lunar = solar_to_lunar(dod_val)
-        if lunar:
-            patch["lunarDeathDay"] = lunar["lunarDeathDay"]
-            patch["lunarDeathMonth"] = lunar["lunarDeathMonth"]
-            patch["lunarDeathYear"] = lunar["lunarDeathYear"]
-            patch["lunarIsLeap"] = lunar["lunarIsLeap"]
+        if lunar_cache is None:
+            lunar = solar_to_lunar(dod_val)
         else:
-            patch["lunarDeathDay"] = None
-            patch["lunarDeathMonth"] = None
-            patch["lunarDeathYear"] = None
-            patch["lunarIsLeap"] = None
+            if dod_val not in lunar_cache:
+                lunar_cache[dod_val] = solar_to_lunar(dod_val)
+            lunar = lunar_cache[dod_val]
+        for f in _LUNAR_FIELDS:
+            patch[f] = lunar[f] if lunar else None
+    return patch
 
+async def _update_person_tx(tx, chartId: str, personId: int, patch: dict):
+    # gender / level are what relationship writes validate against; wait for any in progress
+    await lock_chart_version(tx, chartId)
     setters = ", ".join([f"n.{k} = ${k}" for k in patch.keys()])
+    # Capture the old photoUrl before SET so we can clean up Cloudinary if it changes.
+    res = await tx.run(f"""
+        MATCH (n:Person {{personId:$pid, chartId:$cid}})
+        WITH n, n.photoUrl AS oldPhoto
+        SET {setters}
+        RETURN n, oldPhoto
+    """, pid=personId, cid=chartId, **patch)
+    rec = await res.single()
+    if not rec:
+        raise HTTPException(status_code=404, detail="Person not found")
+    person = _node_to_dict(rec["n"])
+    version = await bump_chart_version(tx, chartId, [node_change(person)])
+    return person, rec["oldPhoto"], version
+
+async def update_person(chartId: str, personId: int, patch: dict):
+    if not patch:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    _prepare_patch(patch)
+
     async with neo4j.driver.session() as session:
-        # Capture the old photoUrl before SET so we can clean up Cloudinary if it changes.
-        res = await session.run(f"""
-            MATCH (n:Person {{personId:$pid, chartId:$cid}})
-            WITH n, n.photoUrl AS oldPhoto
-            SET {setters}
-            RETURN n, oldPhoto
-        """, pid=personId, cid=chartId, **patch)
-        rec = await res.single()
-        if not rec:
-            raise HTTPException(status_code=404, detail="Person not found")
-        person = _node_to_dict(rec["n"])
+        person, old_photo, version = await session.execute_write(_update_person_tx, chartId, personId, patch)
+    apply_to_graph(chartId, version, lambda g: g.upsert_person(person))
 
     # If the avatar was replaced or removed, delete the previous Cloudinary image (best-effort).
     if "photoUrl" in patch:
-        old_photo = rec["oldPhoto"]
         if old_photo and old_photo != patch.get("photoUrl"):
             await delete_images([old_photo])
     return person
 
+async def _update_persons_tx(tx, chartId: str, rows: list[dict]):
+    # Same as update_person: relationship writes validate against gender / level
+    await lock_chart_version(tx, chartId)
+    res = await tx.run("""
+        UNWIND $rows AS row
+        MATCH (n:Person {personId:row.personId, chartId:$cid})
+        WITH n, row, n.photoUrl AS oldPhoto
+        SET n += row.props
+        RETURN n, oldPhoto
+    """, rows=rows, cid=chartId)
+    records = [rec async for rec in res]
+    persons = [_node_to_dict(rec["n"]) for rec in records]
+    old_photos = {rec["n"]["personId"]: rec["oldPhoto"] for rec in records}
+    version = None
+    if persons:
+        version = await bump_chart_version(tx, chartId, [node_change(p) for p in persons])
+    return persons, old_photos, version
+
+async def update_persons(chartId: str, patches: list[dict]) -> tuple[list[dict], list[int]]:
+    """Apply many person patches in one transaction. Returns (updated persons, missing ids).
+    Replaced or removed avatars are deleted from Cloudinary in a single batched call."""
+    ids = [p["personId"] for p in patches]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each personId may appear only once")
+    lunar_cache: dict = {}
+    rows = []
+    for i, patch in enumerate(patches):
+        pid = patch["personId"]
+        props = _prepare_patch(dict(patch), lunar_cache)
+        if not props:
+            raise HTTPException(status_code=400, detail=f"Nothing to update for person {pid} (patch {i})")
+        rows.append({"personId": pid, "props": props})
+
+    async with neo4j.driver.session() as session:
+        persons, old_photos, version = await session.execute_write(_update_persons_tx, chartId, rows)
+    if version is not None:
+        def patch_graph(g):
+            for person in persons:
+                g.upsert_person(person)
+        apply_to_graph(chartId, version, patch_graph)
+
+    # If avatars were replaced or removed, delete the previous Cloudinary images (best-effort).
+    stale = [
+        old_photos[row["personId"]] for row in rows
+        if "photoUrl" in row["props"] and old_photos.get(row["personId"])
+        and old_photos[row["personId"]] != row["props"]["photoUrl"]
+    ]
+    if stale:
+        await delete_images(stale)
+    updated = {p["personId"] for p in persons}
+    return persons, [pid for pid in ids if pid not in updated]
+
+async def _delete_person_tx(tx, chartId: str, personId: int):
+    # Grab the avatar URL before deleting so we can clean it up from Cloudinary afterwards.
+    # Children who had this person as father now hang off their mother in the tree.
+    res = await tx.run("""
+        MATCH (n:Person {personId:$pid, chartId:$cid})
+        WITH n, n.photoUrl AS photo,
+             [(n)-[:FATHER_OF]->(c:Person)<-[:MOTHER_OF]-(m:Person) | [m.personId, c.personId]] AS promoted
+        DETACH DELETE n
+        RETURN photo, promoted
+    """, pid=personId, cid=chartId)
+    rec = await res.single()
+    if not rec:
+        raise HTTPException(status_code=404, detail="Person not found")
+    changes = [node_removed(personId)]
+    changes += [link_change(mother, child, "PARENT_OF") for mother, child in rec["promoted"]]
+    version = await bump_chart_version(tx, chartId, changes)
+    return rec["photo"], version
+
 async def delete_person(chartId: str, personId: int):
     async with neo4j.driver.session() as session:
-        # Grab the avatar URL before deleting so we can clean it up from Cloudinary afterwards.
-        res = await session.run("""
-            MATCH (n:Person {personId:$pid, chartId:$cid})
-            WITH n, n.photoUrl AS photo
-            DETACH DELETE n
-            RETURN photo
-        """, pid=personId, cid=chartId)
-        rec = await res.single()
-        if not rec:
-            raise HTTPException(status_code=404, detail="Person not found")
-        photo = rec["photo"]
+        photo, version = await session.execute_write(_delete_person_tx, chartId, personId)
+    apply_to_graph(chartId, version, lambda g: g.remove_person(personId))
 
     if photo:
         await delete_images([photo])  # best-effort — node is already gone
     return True
 
-async def get_person_detail(chartId: str, personId: int):
-    """Get person details including all relationships (parents, spouses, children)."""
-    async with neo4j.driver.session() as session:
-        res = await session.run("""
-            MATCH (n:Person {personId:$pid, chartId:$cid})
-
+# Relationships of each matched `n`, shaped for PersonDetailOut
+_PERSON_DETAIL_BODY = """
             // Parents (people who have FATHER_OF or MOTHER_OF edges pointing to this person)
             OPTIONAL MATCH (parent)-[rp:FATHER_OF|MOTHER_OF]->(n)
             WITH n, collect(
@@ -187,53 +400,175 @@ async def get_person_detail(chartId: str, personId: int):
             ) AS children
 
             RETURN n, parents, spouses, children
-        """, pid=personId, cid=chartId)
+"""
+
+def _detail_from_record(rec) -> dict:
+    person = _node_to_dict(rec["n"])
+    person["parents"] = [p for p in (rec["parents"] or []) if p is not None]
+    person["spouses"] = [s for s in (rec["spouses"] or []) if s is not None]
+    person["children"] = [c for c in (rec["children"] or []) if c is not None]
+    return person
+
+async def get_person_detail(chartId: str, personId: int):
+    """Get person details including all relationships (parents, spouses, children)."""
+    if settings.GRAPH_PROJECTION_ENABLED:
+        person = (await get_chart_graph(chartId)).person_detail(personId)
+        if person is None:
+            raise HTTPException(status_code=404, detail="Person not found")
+        return person
+
+    async with neo4j.driver.session() as session:
+        res = await session.run(
+            "MATCH (n:Person {personId:$pid, chartId:$cid})" + _PERSON_DETAIL_BODY,
+            pid=personId, cid=chartId,
+        )
 
         rec = await res.single()
         if not rec:
             raise HTTPException(status_code=404, detail="Person not found")
 
-        person = _node_to_dict(rec["n"])
-        person["parents"] = [p for p in (rec["parents"] or []) if p is not None]
-        person["spouses"] = [s for s in (rec["spouses"] or []) if s is not None]
-        person["children"] = [c for c in (rec["children"] or []) if c is not None]
+        return _detail_from_record(rec)
 
-        return person
+async def get_person_details(chartId: str, personIds: list[int]) -> tuple[list[dict], list[int]]:
+    """Details of several persons in one round trip: (details in request order, missing ids)."""
+    ids = list(dict.fromkeys(personIds))
+    if settings.GRAPH_PROJECTION_ENABLED:
+        graph = await get_chart_graph(chartId)
+        found = {pid: graph.person_detail(pid) for pid in ids}
+    else:
+        async with neo4j.driver.session() as session:
+            res = await session.run(
+                "UNWIND $pids AS pid MATCH (n:Person {personId:pid, chartId:$cid})" + _PERSON_DETAIL_BODY,
+                pids=ids, cid=chartId,
+            )
+            found = {}
+            async for rec in res:
+                person = _detail_from_record(rec)
+                found[person["personId"]] = person
+    details = [found[pid] for pid in ids if found.get(pid) is not None]
+    missing = [pid for pid in ids if found.get(pid) is None]
+    return details, missing
+
+
+async def suggest_persons(chartId: str, prefix: str, limit: int = 10, gender: str = None) -> list[dict]:
+    """Typeahead for person pickers: persons whose folded name (or a later part of it) starts with
+    `prefix`, served from the chart graph's prefix index (loaded whatever GRAPH_PROJECTION_ENABLED
+    says, see projection_service)."""
+    graph = await get_chart_graph(chartId)
+    accept = (lambda pid: graph.persons[pid].get("gender") == gender) if gender else None
+    out = []
+    for pid in graph.prefix_index().lookup(prefix, limit, accept):
+        props = graph.persons[pid]
+        out.append({
+            "personId": pid,
+            "name": props.get("name"),
+            "gender": props.get("gender"),
+            "level": props.get("level"),
+        })
+    return out
+
+
+# Fields of a person listing row (see list_persons)
+_LIST_FIELDS = (
+    "personId", "name", "gender", "level", "dob", "dod", "description", "photoUrl",
+    "lunarDeathDay", "lunarDeathMonth", "lunarDeathYear", "lunarIsLeap",
+)
+
+SEARCH_DEFAULT_LIMIT = 50
+
+def parse_list_fields(raw: str = None) -> tuple:
+    """Validate a comma-separated `fields=` projection (personId is always included)."""
+    if not raw:
+        return _LIST_FIELDS
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in _LIST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(f for f in _LIST_FIELDS if f == "personId" or f in fields)
+
+def _encode_cursor(row: dict) -> str:
+    key = json.dumps([row["level"], row["name"], row["personId"]], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(key, list):
+            raise ValueError(key)
+        level, name, pid = key
+        return int(level), str(name), int(pid)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
+def _list_row(props: dict, fields: tuple = _LIST_FIELDS) -> dict:
+    row = {k: props.get(k) for k in fields}
+    for k in ("dob", "dod"):
+        if row.get(k) is not None:
+            row[k] = str(row[k])
+    return row
+
+async def list_persons(chartId: str, q: str = None, gender: str = None, level: int = None,
+                       limit: int = None, cursor: str = None, fields: tuple = _LIST_FIELDS):
+    """List persons in a chart with optional filters, including lunar death date fields.
+    Returns (rows, nextCursor); rows carry only `fields`.
+
+    Without `q`, rows are ordered by (level, name, personId) and paged by keyset: pass the returned
+    nextCursor back as `cursor` for the next `limit` rows (no limit = everything after the cursor).
+    With `q`, names are matched diacritic-insensitively through the chart graph's name index and
+    rows come back best match first (at most `limit`, default SEARCH_DEFAULT_LIMIT, no paging).
+    The graph is loaded for this even with GRAPH_PROJECTION_ENABLED off."""
+    if q:
+        if cursor:
+            raise HTTPException(status_code=400, detail="cursor cannot be combined with q")
+        graph = await get_chart_graph(chartId)
+        limit = limit or SEARCH_DEFAULT_LIMIT
+        rows = []
+        # Filters are applied after ranking, so ask the index for everything when filtering
+        for pid in graph.name_index().search(q, None if gender or level is not None else limit):
+            props = graph.persons[pid]
+            if gender and props.get("gender") != gender:
+                continue
+            if level is not None and props.get("level") != level:
+                continue
+            rows.append(_list_row(props, fields))
+            if len(rows) >= limit:
+                break
+        return rows, None
 
-async def list_persons(chartId: str, q: str = None, gender: str = None, level: int = None):
-    """List persons in a chart with optional filters, including lunar death date fields."""
     where = "n.chartId = $cid"
     params = {"cid": chartId}
-    if q:
-        where += " AND toLower(n.name) CONTAINS toLower($q)"
-        params["q"] = q
     if gender:
         where += " AND n.gender = $g"
         params["g"] = gender
     if level is not None:
         where += " AND n.level = $lvl"
         params["lvl"] = level
+    if cursor:
+        params["cLevel"], params["cName"], params["cPid"] = _decode_cursor(cursor)
+        where += """ AND (n.level > $cLevel OR (n.level = $cLevel AND (n.name > $cName
+                     OR (n.name = $cName AND n.personId > $cPid))))"""
+    page = ""
+    if limit:
+        # One extra row tells whether there is a next page
+        page = "LIMIT $limit"
+        params["limit"] = limit + 1
 
+    projection = ",\n                ".join(
+        f"{f}: toString(n.{f})" if f in ("dob", "dod") else f"{f}: n.{f}" for f in fields
+    )
     async with neo4j.driver.session() as session:
         res = await session.run(
             f"""MATCH (n:Person) WHERE {where}
+            WITH n ORDER BY n.level ASC, n.name ASC, n.personId ASC {page}
             RETURN {{
-                personId: n.personId,
-                name: n.name,
-                gender: n.gender,
-                level: n.level,
-                dob: toString(n.dob),
-                dod: toString(n.dod),
-                description: n.description,
-                photoUrl: n.photoUrl,
-                lunarDeathDay: n.lunarDeathDay,
-                lunarDeathMonth: n.lunarDeathMonth,
-                lunarDeathYear: n.lunarDeathYear,
-                lunarIsLeap: n.lunarIsLeap
-            }} AS n
-            ORDER BY n.level ASC, n.name ASC""",
+                {projection}
+            }} AS n, [n.level, n.name, n.personId] AS sortKey""",
             **params
         )
         records = await res.data()
-        return [r["n"] for r in records]
+    next_cursor = None
+    if limit and len(records) > limit:
+        records = records[:limit]
+        level_, name_, pid_ = records[-1]["sortKey"]
+        next_cursor = _encode_cursor({"level": level_, "name": name_, "personId": pid_})
+    return [r["n"] for r in records], next_cursor
@@ -0,0 +1,449 @@
+"""Optional in-process projection of each chart's Person graph.
+
+A `ChartGraph` holds one chart's persons and FATHER_OF / MOTHER_OF / SPOUSE_OF edges in compact
+integer arrays indexed directly by personId (ids are a per-chart sequence starting at 1 with only
+small gaps, see person_id_service, so 0 doubles as "none"). Graphs are loaded lazily on first access, stamped with the chart data version
+(see version_service) and patched in place by the write services, so consecutive edits on the same
+worker never trigger a reload. A version gap (a write handled by another worker) drops the graph and
+the next access reloads it. Graphs are evicted least-recently-used once the estimated memory of all
+loaded graphs exceeds GRAPH_PROJECTION_MAX_MB.
+
+With GRAPH_PROJECTION_ENABLED the tree, person detail and person events read paths are answered
+from the projection instead of their own Cypher queries, and so are the cycle checks of single-edge
+writes: each graph memoises per-person ancestor sets (see ChartGraph.ancestors), so "is ancestor of"
+is a set lookup instead of a variable-length path search.
+
+Features that need indexes or walks over the whole chart always load the graph, whatever the flag
+says: name search (list_persons with q) and typeahead, tree layout, kinship, batch relationships,
+spreadsheet import, level recompute, person move and duplicate scans. GRAPH_PROJECTION_MAX_MB
+bounds their memory as well: their indexes live on the graph, count towards its nbytes and are
+evicted with it.
+"""
+import asyncio
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.db.neo4j import neo4j
+from app.services.version_service import VERSION_COUNTER, get_chart_version
+from app.utils.name_search import NameIndex, PrefixIndex
+
+# Rough fixed cost of the per-person slots (array entries, list pointers, children/spouse arrays).
+_SLOT_BYTES = 4 * 4 + 3 * 8 + 3 * 64
+
+
+def _props_bytes(props: Optional[dict]) -> int:
+    if props is None:
+        return 0
+    return sys.getsizeof(props) + sum(sys.getsizeof(v) for v in props.values())
+
+
+def _add_to(adj: list, idx: int, value: int) -> None:
+    arr = adj[idx]
+    if arr is None:
+        adj[idx] = array("i", [value])
+    elif value not in arr:
+        arr.append(value)
+
+
+def _remove_from(adj: list, idx: int, value: int) -> None:
+    arr = adj[idx]
+    if arr is not None and value in arr:
+        arr.remove(value)
+
+
+class ChartGraph:
+    """Compact adjacency copy of one chart's Person graph at a given data version."""
+
+    def __init__(self, chart_id: str, version: int):
+        self.chart_id = chart_id
+        self.version = version
+        self.persons: list[Optional[dict]] = [None]   # personId -> node properties (None = no person)
+        self.father = array("i", [0])                  # personId -> father's personId (0 = none)
+        self.mother = array("i", [0])
+        # childOrder on the FATHER_OF / MOTHER_OF edge. 0 = null: every writer keeps orders >= 1 (the
+        # models say ge=1, GEDCOM import counts from 1), and readers map 0 back to None.
+        self.father_order = array("i", [0])
+        self.mother_order = array("i", [0])
+        self.children: list[Optional[array]] = [None]  # personId -> children via FATHER_OF|MOTHER_OF
+        self.spouse_out: list[Optional[array]] = [None]  # SPOUSE_OF targets (edge stored male -> female)
+        self.spouse_in: list[Optional[array]] = [None]
+        self.spouse_order: dict[tuple[int, int], int] = {}  # (source, target) -> spouseOrder, 0 = null as above
+        self._ancestors: dict[int, frozenset] = {}     # memoised ancestor sets, see ancestors()
+        self._name_index: Optional[NameIndex] = None   # built on first search, see name_index()
+        self._prefix_index: Optional[PrefixIndex] = None  # built on first suggest, see prefix_index()
+        self.kinship_index = None  # kinship_service.KinshipIndex for this version, counted in nbytes
+        self.count = 0
+        self.nbytes = 0
+
+    # --- construction / patching (all operations are idempotent) ---
+
+    def _ensure(self, pid: int) -> None:
+        grow = pid + 1 - len(self.persons)
+        if grow <= 0:
+            return
+        self.persons.extend([None] * grow)
+        for arr in (self.father, self.mother, self.father_order, self.mother_order):
+            arr.extend([0] * grow)
+        for adj in (self.children, self.spouse_out, self.spouse_in):
+            adj.extend([None] * grow)
+
+    def has(self, pid: int) -> bool:
+        return 0 < pid < len(self.persons) and self.persons[pid] is not None
+
+    def upsert_person(self, props: dict) -> None:
+        pid = props["personId"]
+        self._ensure(pid)
+        old = self.persons[pid]
+        if old is None:
+            self.count += 1
+            self.nbytes += _SLOT_BYTES
+        self.nbytes += _props_bytes(props) - _props_bytes(old)
+        self.persons[pid] = dict(props)
+        if old is None or old.get("name") != props.get("name"):
+            self._patch_name_indexes(lambda index: index.add(pid, props.get("name")))
+
+    def remove_person(self, pid: int) -> None:
+        if not self.has(pid):
+            return
+        self._forget_ancestors(pid)
+        for parent in (self.father[pid], self.mother[pid]):
+            if parent:
+                _remove_from(self.children, parent, pid)
+        for child in list(self.children[pid] or ()):
+            if self.father[child] == pid:
+                self.father[child], self.father_order[child] = 0, 0
+            if self.mother[child] == pid:
+                self.mother[child], self.mother_order[child] = 0, 0
+        for other in list(self.spouse_out[pid] or ()):
+            self.remove_spouse(pid, other)
+        for other in list(self.spouse_in[pid] or ()):
+            self.remove_spouse(other, pid)
+        self.nbytes -= _props_bytes(self.persons[pid]) + _SLOT_BYTES
+        self.persons[pid] = None
+        self._patch_name_indexes(lambda index: index.remove(pid))
+        self.father[pid] = self.mother[pid] = 0
+        self.father_order[pid] = self.mother_order[pid] = 0
+        self.children[pid] = self.spouse_out[pid] = self.spouse_in[pid] = None
+        self.count -= 1
+
+    def add_parent(self, rel_type: str, parent: int, child: int, child_order: Optional[int]) -> None:
+        """Apply a FATHER_OF / MOTHER_OF edge (parent -> child)."""
+        self._ensure(max(parent, child))
+        links, orders = (self.father, self.father_order) if rel_type == "FATHER_OF" else (self.mother, self.mother_order)
+        previous = links[child]
+        if previous != parent:
+            self._forget_ancestors(child)
+        if previous and previous != parent:
+            _remove_from(self.children, previous, child)
+        links[child] = parent
+        orders[child] = child_order or 0
+        _add_to(self.children, parent, child)
+
+    def remove_parent(self, rel_type: str, parent: int, child: int) -> None:
+        if not (0 < child < len(self.persons)):
+            return
+        links, orders = (self.father, self.father_order) if rel_type == "FATHER_OF" else (self.mother, self.mother_order)
+        if links[child] != parent:
+            return
+        self._forget_ancestors(child)
+        links[child] = 0
+        orders[child] = 0
+        # The child stays in the parent's list if they are also linked the other way round.
+        if self.father[child] != parent and self.mother[child] != parent:
+            _remove_from(self.children, parent, child)
+
+    def add_spouse(self, source: int, target: int, spouse_order: Optional[int]) -> None:
+        """Apply a SPOUSE_OF edge stored as source -> target."""
+        self._ensure(max(source, target))
+        _add_to(self.spouse_out, source, target)
+        _add_to(self.spouse_in, target, source)
+        self.spouse_order[(source, target)] = spouse_order or 0
+
+    def remove_spouse(self, a: int, b: int) -> None:
+        """Remove the SPOUSE_OF edge between a and b in either direction."""
+        for source, target in ((a, b), (b, a)):
+            if (source, target) in self.spouse_order:
+                del self.spouse_order[(source, target)]
+                _remove_from(self.spouse_out, source, target)
+                _remove_from(self.spouse_in, target, source)
+
+    def _forget_ancestors(self, pid: int) -> None:
+        """Drop the memoised ancestor sets of pid and its descendants (pid's parents changed).
+        A set is only memoised after its parents' sets, so the walk can stop at unmemoised persons."""
+        stack = [pid]
+        while stack:
+            cur = stack.pop()
+            found = self._ancestors.pop(cur, None)
+            if found is None:
+                continue
+            self.nbytes -= sys.getsizeof(found)
+            stack.extend(self.children[cur] or ())
+
+    def drop_kinship_index(self) -> None:
+        """Drop the kinship index: it is only valid for the version it was built at."""
+        if self.kinship_index is not None:
+            self.nbytes -= self.kinship_index.nbytes
+            self.kinship_index = None
+
+    def _patch_name_indexes(self, patch: Callable) -> None:
+        for index in (self._name_index, self._prefix_index):
+            if index is not None:
+                before = index.nbytes
+                patch(index)
+                self.nbytes += index.nbytes - before
+
+    # --- queries ---
+
+    def person_ids(self):
+        return (pid for pid, props in enumerate(self.persons) if props is not None)
+
+    def parents_of(self, pid: int) -> list[int]:
+        return [p for p in (self.father[pid], self.mother[pid]) if p]
+
+    def spouses_of(self, pid: int) -> list[int]:
+        return list(self.spouse_out[pid] or ()) + list(self.spouse_in[pid] or ())
+
+    def child_order(self, parent: int, child: int) -> int:
+        """childOrder on the edge parent -> child (0 = null)."""
+        return self.father_order[child] if self.father[child] == parent else self.mother_order[child]
+
+    def ancestors(self, pid: int) -> frozenset:
+        """All ancestors of `pid` through FATHER_OF/MOTHER_OF edges. Each set is built from the
+        parents' sets and memoised until an edge above that person changes."""
+        memo = self._ancestors
+        stack, visiting = [pid], set()
+        while stack:
+            cur = stack[-1]
+            if cur in memo:
+                stack.pop()
+                continue
+            visiting.add(cur)
+            parents = self.parents_of(cur)
+            pending = [p for p in parents if p not in memo and p not in visiting]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            found = frozenset(parents).union(*(memo.get(p, ()) for p in parents))
+            memo[cur] = found
+            self.nbytes += sys.getsizeof(found)
+        return memo[pid]
+
+    def name_index(self) -> NameIndex:
+        """Diacritic-insensitive name search index, built on first use and patched afterwards."""
+        if self._name_index is None:
+            index = NameIndex()
+            for pid in self.person_ids():
+                index.add(pid, self.persons[pid].get("name"))
+            self._name_index = index
+            self.nbytes += index.nbytes
+        return self._name_index
+
+    def prefix_index(self) -> PrefixIndex:
+        """Typeahead index over folded names, built on first use and patched afterwards."""
+        if self._prefix_index is None:
+            index = PrefixIndex()
+            index.build((pid, self.persons[pid].get("name")) for pid in self.person_ids())
+            self._prefix_index = index
+            self.nbytes += index.nbytes
+        return self._prefix_index
+
+    def is_ancestor(self, ancestor: int, pid: int) -> bool:
+        """True if `ancestor` reaches `pid` through FATHER_OF/MOTHER_OF edges."""
+        return ancestor in self.ancestors(pid)
+
+    def ancestors_within(self, pid: int, depth: int) -> set[int]:
+        """Ancestors of `pid` at most `depth` generations up."""
+        found, frontier = set(), [pid]
+        for _ in range(depth):
+            frontier = [p for cur in frontier for p in self.parents_of(cur) if p not in found]
+            found.update(frontier)
+        return found
+
+    def descendants_within(self, pid: int, depth: int) -> set[int]:
+        """Descendants of `pid` at most `depth` generations down."""
+        found, frontier = set(), [pid]
+        for _ in range(depth):
+            frontier = [c for cur in frontier for c in (self.children[cur] or ()) if c not in found]
+            found.update(frontier)
+        return found
+
+    def tree_rows(self, pids) -> list[dict]:
+        """Per-person rows (tree node, incoming parent edges, children, outgoing spouse edges) in the
+        shape tree_service assembles windows and expansions from."""
+        rows = []
+        for pid in pids:
+            if not self.has(pid):
+                continue
+            parents = []
+            if self.father[pid]:
+                parents.append({"source": self.father[pid], "type": "FATHER_OF"})
+            if self.mother[pid]:
+                parents.append({"source": self.mother[pid], "type": "MOTHER_OF"})
+            rows.append({
+                "node": self.tree_node(pid),
+                "parents": parents,
+                "children": list(self.children[pid] or ()),
+                "spousesOut": list(self.spouse_out[pid] or ()),
+            })
+        return rows
+
+    def tree_node(self, pid: int) -> dict:
+        props = self.persons[pid]
+        return {
+            "id": pid,
+            "name": props.get("name"),
+            "gender": props.get("gender"),
+            "level": props.get("level"),
+            "photoUrl": props.get("photoUrl"),
+        }
+
+    def to_tree(self) -> dict:
+        """Same shape and link rules as tree_service.get_tree."""
+        nodes, links = [], []
+        for pid in self.person_ids():
+            nodes.append(self.tree_node(pid))
+            for target in self.spouse_out[pid] or ():
+                links.append({"source": pid, "target": target, "type": "SPOUSE_OF"})
+        for pid in self.person_ids():
+            parent = self.father[pid] or self.mother[pid]
+            if parent:
+                links.append({"source": parent, "target": pid, "type": "PARENT_OF"})
+        return {"nodes": nodes, "links": links}
+
+    def person_detail(self, pid: int) -> Optional[dict]:
+        """Same shape as person_service.get_person_detail, or None if the person does not exist."""
+        if not self.has(pid):
+            return None
+
+        def brief(other: int) -> dict:
+            props = self.persons[other]
+            return {"personId": other, "name": props.get("name"), "gender": props.get("gender")}
+
+        person = dict(self.persons[pid])
+        person["parents"] = []
+        for parent, order in ((self.father[pid], self.father_order[pid]), (self.mother[pid], self.mother_order[pid])):
+            if parent:
+                person["parents"].append({**brief(parent), "birthOrder": order or None})
+        person["spouses"] = []
+        for target in self.spouse_out[pid] or ():
+            person["spouses"].append({**brief(target), "spouseOrder": self.spouse_order.get((pid, target)) or None})
+        for source in self.spouse_in[pid] or ():
+            person["spouses"].append({**brief(source), "spouseOrder": self.spouse_order.get((source, pid)) or None})
+        person["children"] = []
+        for child in self.children[pid] or ():
+            order = self.father_order[child] if self.father[child] == pid else self.mother_order[child]
+            person["children"].append({**brief(child), "childOrder": order or None})
+        return person
+
+    def event_rows(self) -> list[dict]:
+        """Rows shaped like the Cypher result consumed by event_service._list_person_events."""
+        rows = []
+        for pid in self.person_ids():
+            props = self.persons[pid]
+            dob, dod = props.get("dob"), props.get("dod")
+            rows.append({
+                "personId": pid,
+                "name": props.get("name"),
+                "dob": dob.isoformat() if hasattr(dob, "isoformat") else dob,
+                "dod": dod.isoformat() if hasattr(dod, "isoformat") else dod,
+                "ld": props.get("lunarDeathDay"),
+                "lm": props.get("lunarDeathMonth"),
+                "ly": props.get("lunarDeathYear"),
+                "leap": props.get("lunarIsLeap"),
+            })
+        return rows
+
+
+# chartId -> ChartGraph, least recently used first
+_graphs: "OrderedDict[str, ChartGraph]" = OrderedDict()
+_load_locks: dict[str, asyncio.Lock] = {}
+
+
+def _total_bytes() -> int:
+    return sum(g.nbytes for g in _graphs.values())
+
+
+def _enforce_budget() -> None:
+    budget = settings.GRAPH_PROJECTION_MAX_MB * 1024 * 1024
+    # Always keep the most recently used graph, even if it alone exceeds the budget.
+    while len(_graphs) > 1 and _total_bytes() > budget:
+        _graphs.popitem(last=False)
+
+
+async def _load_graph(chart_id: str) -> ChartGraph:
+    from app.services.person_service import _node_to_dict  # local import: person_service patches us
+
+    async with neo4j.driver.session() as session, await session.begin_transaction() as tx:
+        # The stamp is read first, in the same transaction: the data is at least as new as it.
+        res = await tx.run(
+            "OPTIONAL MATCH (c:Counter {chartId:$cid, type:$type}) RETURN coalesce(c.value, 0) AS version",
+            cid=chart_id, type=VERSION_COUNTER,
+        )
+        graph = ChartGraph(chart_id, (await res.single())["version"])
+        res = await tx.run("MATCH (n:Person {chartId:$cid}) RETURN n", cid=chart_id)
+        async for rec in res:
+            graph.upsert_person(_node_to_dict(rec["n"]))
+        res = await tx.run(
+            """
+            MATCH (a:Person {chartId:$cid})-[r:FATHER_OF|MOTHER_OF|SPOUSE_OF]->(b:Person {chartId:$cid})
+            RETURN type(r) AS type, a.personId AS source, b.personId AS target,
+                   coalesce(r.childOrder, r.spouseOrder) AS ord
+            """,
+            cid=chart_id,
+        )
+        async for rec in res:
+            if rec["type"] == "SPOUSE_OF":
+                graph.add_spouse(rec["source"], rec["target"], rec["ord"])
+            else:
+                graph.add_parent(rec["type"], rec["source"], rec["target"], rec["ord"])
+    return graph
+
+
+async def get_chart_graph(chart_id: str, version: Optional[int] = None) -> ChartGraph:
+    """Return the projection of a chart at its current data version, loading it if needed.
+    Pass `version` when the caller has already read it to save the counter lookup."""
+    if version is None:
+        version = await get_chart_version(chart_id)
+    graph = _graphs.get(chart_id)
+    if graph is not None and graph.version >= version:
+        _graphs.move_to_end(chart_id)
+        return graph
+
+    lock = _load_locks.setdefault(chart_id, asyncio.Lock())
+    async with lock:
+        # Another request may have finished loading while we waited for the lock.
+        graph = _graphs.get(chart_id)
+        if graph is None or graph.version < version:
+            graph = await _load_graph(chart_id)
+            _graphs[chart_id] = graph
+        _graphs.move_to_end(chart_id)
+        _enforce_budget()
+    return graph
+
+
+def apply_to_graph(chart_id: str, version: int, patch: Callable[[ChartGraph], None]) -> None:
+    """Patch a loaded projection after a write that bumped the chart to `version`.
+
+    Only a graph sitting at exactly `version - 1` can be patched; any other gap means a write we did
+    not see, so the graph is dropped and reloaded on next access. Not loaded -> nothing to do.
+    """
+    graph = _graphs.get(chart_id)
+    if graph is None or graph.version >= version:
+        return
+    if graph.version != version - 1:
+        _graphs.pop(chart_id, None)
+        return
+    patch(graph)
+    graph.version = version
+    graph.drop_kinship_index()
+    _enforce_budget()
+
+
+def evict_graph(chart_id: str) -> None:
+    """Drop a chart's projection (used when the chart is deleted)."""
+    _graphs.pop(chart_id, None)
+    _load_locks.pop(chart_id, None)
@@ -1,182 +1,260 @@
 from fastapi import HTTPException
 from app.db.neo4j import neo4j
+from app.core.config import settings
+from app.services.version_service import bump_chart_version, link_change, link_removed, lock_chart_version, node_change
+from app.services.projection_service import apply_to_graph, get_chart_graph
+from app.services.level_service import check_levels, level_report, shift_levels, write_level_rows
+
+# Single-edge writes run their checks, the mutation and the version bump in one write transaction.
+# Adds take the version counter's lock before checking (see lock_chart_version); a removal cannot
+# make any other write invalid, so it just bumps after deleting.
+
+async def _creates_cycle(tx, chart_id: str, graph, version: int, parent_id: int, child_id: int) -> bool:
+    """True if `parent_id` descends from `child_id`. With the projection enabled and at the locked
+    `version` its memoised ancestor sets answer; otherwise a path query runs in the transaction."""
+    if graph is not None and graph.version == version:
+        return graph.is_ancestor(child_id, parent_id)
+    cyc = await tx.run("""
+        MATCH (parent:Person {personId:$parentId, chartId:$cid}),
+              (child:Person {personId:$childId, chartId:$cid})
+        OPTIONAL MATCH path = (child)-[:FATHER_OF|MOTHER_OF*]->(parent)
+        RETURN path IS NOT NULL AS cycle
+    """, parentId=parent_id, childId=child_id, cid=chart_id)
+    return (await cyc.single())["cycle"]
+
+async def _add_father_tx(tx, chart_id: str, graph, father_id: int, child_id: int, child_order) -> int:
+    version = await lock_chart_version(tx, chart_id)
+
+    # 1. Check existence, gender and level
+    check = await tx.run("""
+        MATCH (father:Person {personId: $fatherId, chartId: $cid})
+        MATCH (child:Person {personId: $childId, chartId: $cid})
+        OPTIONAL MATCH ()-[existing:FATHER_OF]->(child)
+        RETURN father.level as fatherLevel, child.level as childLevel,
+               father.gender as fatherGender,
+               existing IS NOT NULL AS alreadyHasFather
+    """, fatherId=father_id, childId=child_id, cid=chart_id)
+
+    result = await check.single()
+    if not result:
+        raise HTTPException(status_code=404, detail="Father or child not found")
+
+    # 2. Gender validation
+    if result["fatherGender"] != "M":
+        raise HTTPException(status_code=400, detail="Father must be male (gender='M')")
+
+    # 3. Level validation
+    if result["fatherLevel"] >= result["childLevel"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid relationship: father (level {result['fatherLevel']}) must have lower level than child (level {result['childLevel']})"
+        )
+
+    # 4. Check child doesn't already have a father
+    if result["alreadyHasFather"]:
+        raise HTTPException(status_code=400, detail="Child already has a father")
+
+    # 5. Prevent cycles
+    if await _creates_cycle(tx, chart_id, graph, version, father_id, child_id):
+        raise HTTPException(status_code=400, detail="Cycle detected")
+
+    # 6. Create relationship
+    res = await tx.run("""
+        MATCH (f:Person {personId:$fatherId, chartId:$cid}),
+              (c:Person {personId:$childId, chartId:$cid})
+        MERGE (f)-[r:FATHER_OF]->(c)
+        SET r.childOrder = $childOrder
+    """, fatherId=father_id, childId=child_id, cid=chart_id, childOrder=child_order)
+    await res.consume()
+    return await bump_chart_version(tx, chart_id, [link_change(father_id, child_id, "PARENT_OF")])
 
 async def add_father_of(chart_id: str, father_id: int, child_id: int, child_order: int = None):
     """Create a FATHER_OF relationship. Validates father is male, level order, no cycles, and no existing father."""
+    graph = await get_chart_graph(chart_id) if settings.GRAPH_PROJECTION_ENABLED else None
     async with neo4j.driver.session() as session:
-
-        # 1. Check existence, gender and level
-        check = await session.run("""
-            MATCH (father:Person {personId: $fatherId, chartId: $cid})
-            MATCH (child:Person {personId: $childId, chartId: $cid})
-            OPTIONAL MATCH ()-[existing:FATHER_OF]->(child)
-            RETURN father.level as fatherLevel, child.level as childLevel,
-                   father.gender as fatherGender,
-                   existing IS NOT NULL AS alreadyHasFather
-        """, fatherId=father_id, childId=child_id, cid=chart_id)
-
-        result = await check.single()
-        if not result:
-            raise HTTPException(status_code=404, detail="Father or child not found")
-
-        # 2. Gender validation
-        if result["fatherGender"] != "M":
-            raise HTTPException(status_code=400, detail="Father must be male (gender='M')")
-
-        # 3. Level validation
-        if result["fatherLevel"] >= result["childLevel"]:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid relationship: father (level {result['fatherLevel']}) must have lower level than child (level {result['childLevel']})"
-            )
-
-        # 4. Check child doesn't already have a father
-        if result["alreadyHasFather"]:
-            raise HTTPException(status_code=400, detail="Child already has a father")
-
-        # 5. Prevent cycles
-        cyc = await session.run("""
-            MATCH (father:Person {personId:$fatherId, chartId:$cid}),
-                  (child:Person {personId:$childId, chartId:$cid})
-            OPTIONAL MATCH path = (child)-[:FATHER_OF|MOTHER_OF*]->(father)
-            RETURN path IS NOT NULL AS cycle
-        """, fatherId=father_id, childId=child_id, cid=chart_id)
-        if (await cyc.single())["cycle"]:
-            raise HTTPException(status_code=400, detail="Cycle detected")
-
-        # 6. Create relationship
-        await session.run("""
-            MATCH (f:Person {personId:$fatherId, chartId:$cid}),
-                  (c:Person {personId:$childId, chartId:$cid})
-            MERGE (f)-[r:FATHER_OF]->(c)
-            SET r.childOrder = $childOrder
-        """, fatherId=father_id, childId=child_id, cid=chart_id, childOrder=child_order)
+        version = await session.execute_write(_add_father_tx, chart_id, graph, father_id, child_id, child_order)
+    apply_to_graph(chart_id, version, lambda g: g.add_parent("FATHER_OF", father_id, child_id, child_order))
 
     return True
 
+async def _remove_father_tx(tx, chart_id: str, father_id: int, child_id: int):
+    res = await tx.run("""
+        MATCH (f:Person {personId:$fatherId, chartId:$cid})-[r:FATHER_OF]->(c:Person {personId:$childId, chartId:$cid})
+        WITH r, head([(m:Person)-[:MOTHER_OF]->(c) | m.personId]) AS motherId
+        DELETE r
+        RETURN count(r) AS removed, max(motherId) AS motherId
+    """, fatherId=father_id, childId=child_id, cid=chart_id)
+    rec = await res.single()
+    if not rec["removed"]:
+        return None
+    # Without the father, the child's PARENT_OF link falls back to the mother (if any)
+    mother_id = rec["motherId"]
+    changes = [link_change(mother_id, child_id, "PARENT_OF") if mother_id is not None
+               else link_removed(father_id, child_id, "PARENT_OF")]
+    return await bump_chart_version(tx, chart_id, changes)
+
 async def remove_father_of(chart_id: str, father_id: int, child_id: int):
     async with neo4j.driver.session() as session:
-        await session.run("""
-            MATCH (f:Person {personId:$fatherId, chartId:$cid})-[r:FATHER_OF]->(c:Person {personId:$childId, chartId:$cid})
-            DELETE r
-        """, fatherId=father_id, childId=child_id, cid=chart_id)
+        version = await session.execute_write(_remove_father_tx, chart_id, father_id, child_id)
+    if version is not None:
+        apply_to_graph(chart_id, version, lambda g: g.remove_parent("FATHER_OF", father_id, child_id))
     return True
 
+async def _add_mother_tx(tx, chart_id: str, graph, mother_id: int, child_id: int, child_order) -> int:
+    version = await lock_chart_version(tx, chart_id)
+
+    # 1. Check existence, gender and level
+    check = await tx.run("""
+        MATCH (mother:Person {personId: $motherId, chartId: $cid})
+        MATCH (child:Person {personId: $childId, chartId: $cid})
+        OPTIONAL MATCH ()-[existing:MOTHER_OF]->(child)
+        RETURN mother.level as motherLevel, child.level as childLevel,
+               mother.gender as motherGender,
+               existing IS NOT NULL AS alreadyHasMother,
+               EXISTS { ()-[:FATHER_OF]->(child) } AS hasFather
+    """, motherId=mother_id, childId=child_id, cid=chart_id)
+
+    result = await check.single()
+    if not result:
+        raise HTTPException(status_code=404, detail="Mother or child not found")
+
+    # 2. Gender validation
+    if result["motherGender"] != "F":
+        raise HTTPException(status_code=400, detail="Mother must be female (gender='F')")
+
+    # 3. Level validation
+    if result["motherLevel"] >= result["childLevel"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid relationship: mother (level {result['motherLevel']}) must have lower level than child (level {result['childLevel']})"
+        )
+
+    # 4. Check child doesn't already have a mother
+    if result["alreadyHasMother"]:
+        raise HTTPException(status_code=400, detail="Child already has a mother")
+
+    # 5. Prevent cycles
+    if await _creates_cycle(tx, chart_id, graph, version, mother_id, child_id):
+        raise HTTPException(status_code=400, detail="Cycle detected")
+
+    # 6. Create relationship
+    res = await tx.run("""
+        MATCH (m:Person {personId:$motherId, chartId:$cid}),
+              (c:Person {personId:$childId, chartId:$cid})
+        MERGE (m)-[r:MOTHER_OF]->(c)
+        SET r.childOrder = $childOrder
+    """, motherId=mother_id, childId=child_id, cid=chart_id, childOrder=child_order)
+    await res.consume()
+    # The tree shows one PARENT_OF per child with the father preferred, so a mother only
+    # changes the tree when the child has no father.
+    changes = [] if result["hasFather"] else [link_change(mother_id, child_id, "PARENT_OF")]
+    return await bump_chart_version(tx, chart_id, changes)
+
 async def add_mother_of(chart_id: str, mother_id: int, child_id: int, child_order: int = None):
     """Create a MOTHER_OF relationship. Validates mother is female, level order, no cycles, and no existing mother."""
+    graph = await get_chart_graph(chart_id) if settings.GRAPH_PROJECTION_ENABLED else None
     async with neo4j.driver.session() as session:
-
-        # 1. Check existence, gender and level
-        check = await session.run("""
-            MATCH (mother:Person {personId: $motherId, chartId: $cid})
-            MATCH (child:Person {personId: $childId, chartId: $cid})
-            OPTIONAL MATCH ()-[existing:MOTHER_OF]->(child)
-            RETURN mother.level as motherLevel, child.level as childLevel,
-                   mother.gender as motherGender,
-                   existing IS NOT NULL AS alreadyHasMother
-        """, motherId=mother_id, childId=child_id, cid=chart_id)
-
-        result = await check.single()
-        if not result:
-            raise HTTPException(status_code=404, detail="Mother or child not found")
-
-        # 2. Gender validation
-        if result["motherGender"] != "F":
-            raise HTTPException(status_code=400, detail="Mother must be female (gender='F')")
-
-        # 3. Level validation
-        if result["motherLevel"] >= result["childLevel"]:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid relationship: mother (level {result['motherLevel']}) must have lower level than child (level {result['childLevel']})"
-            )
-
-        # 4. Check child doesn't already have a mother
-        if result["alreadyHasMother"]:
-            raise HTTPException(status_code=400, detail="Child already has a mother")
-
-        # 5. Prevent cycles
-        cyc = await session.run("""
-            MATCH (mother:Person {personId:$motherId, chartId:$cid}),
-                  (child:Person {personId:$childId, chartId:$cid})
-            OPTIONAL MATCH path = (child)-[:FATHER_OF|MOTHER_OF*]->(mother)
-            RETURN path IS NOT NULL AS cycle
-        """, motherId=mother_id, childId=child_id, cid=chart_id)
-        if (await cyc.single())["cycle"]:
-            raise HTTPException(status_code=400, detail="Cycle detected")
-
-        # 6. Create relationship
-        await session.run("""
-            MATCH (m:Person {personId:$motherId, chartId:$cid}),
-                  (c:Person {personId:$childId, chartId:$cid})
-            MERGE (m)-[r:MOTHER_OF]->(c)
-            SET r.childOrder = $childOrder
-        """, motherId=mother_id, childId=child_id, cid=chart_id, childOrder=child_order)
+        version = await session.execute_write(_add_mother_tx, chart_id, graph, mother_id, child_id, child_order)
+    apply_to_graph(chart_id, version, lambda g: g.add_parent("MOTHER_OF", mother_id, child_id, child_order))
 
     return True
 
+async def _remove_mother_tx(tx, chart_id: str, mother_id: int, child_id: int):
+    res = await tx.run("""
+        MATCH (m:Person {personId:$motherId, chartId:$cid})-[r:MOTHER_OF]->(c:Person {personId:$childId, chartId:$cid})
+        WITH r, EXISTS { ()-[:FATHER_OF]->(c) } AS hasFather
+        DELETE r
+        RETURN count(r) AS removed, any(x IN collect(hasFather) WHERE x) AS hasFather
+    """, motherId=mother_id, childId=child_id, cid=chart_id)
+    rec = await res.single()
+    if not rec["removed"]:
+        return None
+    changes = [] if rec["hasFather"] else [link_removed(mother_id, child_id, "PARENT_OF")]
+    return await bump_chart_version(tx, chart_id, changes)
+
 async def remove_mother_of(chart_id: str, mother_id: int, child_id: int):
     async with neo4j.driver.session() as session:
-        await session.run("""
-            MATCH (m:Person {personId:$motherId, chartId:$cid})-[r:MOTHER_OF]->(c:Person {personId:$childId, chartId:$cid})
-            DELETE r
-        """, motherId=mother_id, childId=child_id, cid=chart_id)
+        version = await session.execute_write(_remove_mother_tx, chart_id, mother_id, child_id)
+    if version is not None:
+        apply_to_graph(chart_id, version, lambda g: g.remove_parent("MOTHER_OF", mother_id, child_id))
     return True
 
+async def _add_spouse_tx(tx, chart_id: str, person1_id: int, person2_id: int, spouse_order) -> tuple[int, int, int]:
+    await lock_chart_version(tx, chart_id)
+
+    # 1. Check existence, gender, and existing incoming SPOUSE_OF of each person
+    check = await tx.run("""
+        MATCH (p1:Person {personId: $p1Id, chartId: $cid})
+        MATCH (p2:Person {personId: $p2Id, chartId: $cid})
+        // Count INCOMING edges (someone already married this person as target/female)
+        OPTIONAL MATCH ()-[r1:SPOUSE_OF]->(p1)
+        WITH p1, p2, count(r1) AS p1InCount
+        OPTIONAL MATCH ()-[r2:SPOUSE_OF]->(p2)
+        RETURN p1.personId AS id1, p2.personId AS id2,
+               p1.gender AS g1, p2.gender AS g2,
+               p1InCount AS p1InCount,
+               count(r2) AS p2InCount
+    """, p1Id=person1_id, p2Id=person2_id, cid=chart_id)
+
+    result = await check.single()
+    if not result:
+        raise HTTPException(status_code=404, detail="One or both persons not found")
+
+    # 2. Gender validation: must be different genders
+    g1, g2 = result["g1"], result["g2"]
+    if g1 == g2 and g1 in ["M", "F"]:
+        raise HTTPException(status_code=400, detail="Spouses must be of different genders")
+
+    # 3. The female person must not already be the target of a SPOUSE_OF edge
+    female_already_has_husband = (
+        (g1 == "F" and result["p1InCount"] > 0) or
+        (g2 == "F" and result["p2InCount"] > 0)
+    )
+    if female_already_has_husband:
+        raise HTTPException(
+            status_code=400,
+            detail="The female person already has a spouse."
+        )
+
+    # 4. Always MERGE as (male)-[:SPOUSE_OF]->(female), regardless of input order
+    male_id = person1_id if g1 == "M" else person2_id
+    female_id = person2_id if g1 == "M" else person1_id
+
+    res = await tx.run("""
+        MATCH (male:Person {personId:$maleId, chartId:$cid}),
+              (female:Person {personId:$femaleId, chartId:$cid})
+        MERGE (male)-[r:SPOUSE_OF]->(female)
+        SET r.spouseOrder = $spouseOrder
+    """, maleId=male_id, femaleId=female_id, cid=chart_id, spouseOrder=spouse_order)
+    await res.consume()
+    version = await bump_chart_version(tx, chart_id, [link_change(male_id, female_id, "SPOUSE_OF")])
+    return male_id, female_id, version
+
 async def add_spouse_of(chart_id: str, person1_id: int, person2_id: int, spouse_order: int = None):
     async with neo4j.driver.session() as session:
-        # 1. Check existence, gender, and existing incoming SPOUSE_OF of each person
-        check = await session.run("""
-            MATCH (p1:Person {personId: $p1Id, chartId: $cid})
-            MATCH (p2:Person {personId: $p2Id, chartId: $cid})
-            // Count INCOMING edges (someone already married this person as target/female)
-            OPTIONAL MATCH ()-[r1:SPOUSE_OF]->(p1)
-            WITH p1, p2, count(r1) AS p1InCount
-            OPTIONAL MATCH ()-[r2:SPOUSE_OF]->(p2)
-            RETURN p1.personId AS id1, p2.personId AS id2,
-                   p1.gender AS g1, p2.gender AS g2,
-                   p1InCount AS p1InCount,
-                   count(r2) AS p2InCount
-        """, p1Id=person1_id, p2Id=person2_id, cid=chart_id)
-
-        result = await check.single()
-        if not result:
-            raise HTTPException(status_code=404, detail="One or both persons not found")
-
-        # 2. Gender validation: must be different genders
-        g1, g2 = result["g1"], result["g2"]
-        if g1 == g2 and g1 in ["M", "F"]:
-            raise HTTPException(status_code=400, detail="Spouses must be of different genders")
-
-        # 3. The female person must not already be the target of a SPOUSE_OF edge
-        female_already_has_husband = (
-            (g1 == "F" and result["p1InCount"] > 0) or
-            (g2 == "F" and result["p2InCount"] > 0)
-        )
-        if female_already_has_husband:
-            raise HTTPException(
-                status_code=400,
-                detail="The female person already has a spouse."
-            )
-
-        # 4. Always MERGE as (male)-[:SPOUSE_OF]->(female), regardless of input order
-        male_id = person1_id if g1 == "M" else person2_id
-        female_id = person2_id if g1 == "M" else person1_id
-
-        await session.run("""
-            MATCH (male:Person {personId:$maleId, chartId:$cid}),
-                  (female:Person {personId:$femaleId, chartId:$cid})
-            MERGE (male)-[r:SPOUSE_OF]->(female)
-            SET r.spouseOrder = $spouseOrder
-        """, maleId=male_id, femaleId=female_id, cid=chart_id, spouseOrder=spouse_order)
+        male_id, female_id, version = await session.execute_write(
+            _add_spouse_tx, chart_id, person1_id, person2_id, spouse_order)
+    apply_to_graph(chart_id, version, lambda g: g.add_spouse(male_id, female_id, spouse_order))
     return True
 
+async def _remove_spouse_tx(tx, chart_id: str, person1_id: int, person2_id: int):
+    res = await tx.run("""
+        MATCH (p1:Person {personId:$p1Id, chartId:$cid})-[r:SPOUSE_OF]-(p2:Person {personId:$p2Id, chartId:$cid})
+        WITH DISTINCT r, startNode(r).personId AS source, endNode(r).personId AS target
+        DELETE r
+        RETURN collect([source, target]) AS removed
+    """, p1Id=person1_id, p2Id=person2_id, cid=chart_id)
+    removed = (await res.single())["removed"]
+    if not removed:
+        return None
+    changes = [link_removed(source, target, "SPOUSE_OF") for source, target in removed]
+    return await bump_chart_version(tx, chart_id, changes)
+
 async def remove_spouse_of(chart_id: str, person1_id: int, person2_id: int):
     async with neo4j.driver.session() as session:
-        await session.run("""
-            MATCH (p1:Person {personId:$p1Id, chartId:$cid})-[r:SPOUSE_OF]-(p2:Person {personId:$p2Id, chartId:$cid})
-            DELETE r
-        """, p1Id=person1_id, p2Id=person2_id, cid=chart_id)
+        version = await session.execute_write(_remove_spouse_tx, chart_id, person1_id, person2_id)
+    if version is not None:
+        apply_to_graph(chart_id, version, lambda g: g.remove_spouse(person1_id, person2_id))
     return True
 
 async def check_spouse_couple(chart_id: str, father_id: int, mother_id: int) -> bool:
@@ -188,3 +266,224 @@ async def check_spouse_couple(chart_id: str, father_id: int, mother_id: int) ->
         """, fId=father_id, mId=mother_id, cid=chart_id)
         record = await res.single()
         return record["isCouple"] if record else False
+
+
+class _VersionConflict(Exception):
+    """The chart changed between validating a batch and writing it."""
+
+
+_BATCH_ATTEMPTS = 3
+
+
+def _validate_batch(graph, edges: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Check a batch of edges against the chart graph plus the edges accepted before them in the
+    batch, with the same rules as add_father_of / add_mother_of / add_spouse_of.
+    Returns (accepted edges, normalised; per-edge errors)."""
+    fathers: dict[int, int] = {}
+    mothers: dict[int, int] = {}
+    wives: set[int] = set()
+    accepted, errors = [], []
+
+    def is_ancestor(ancestor: int, pid: int) -> bool:
+        # Graph edges are covered by the memoised ancestor sets; only batch edges need walking.
+        seen, stack = set(), [pid]
+        while stack:
+            cur = stack.pop()
+            if cur in seen:
+                continue
+            seen.add(cur)
+            above = graph.ancestors(cur)
+            if ancestor in above:
+                return True
+            for child in (fathers.keys() | mothers.keys()):
+                if child == cur or child in above:
+                    stack.extend(p for p in (fathers.get(child), mothers.get(child)) if p)
+        return False
+
+    for i, edge in enumerate(edges):
+        rel_type, source, target = edge["type"], edge["sourceId"], edge["targetId"]
+        if not graph.has(source) or not graph.has(target):
+            errors.append({"index": i, "detail": "One or both persons not found"})
+            continue
+        src, tgt = graph.persons[source], graph.persons[target]
+
+        if rel_type == "SPOUSE_OF":
+            g1, g2 = src.get("gender"), tgt.get("gender")
+            if g1 == g2 and g1 in ["M", "F"]:
+                errors.append({"index": i, "detail": "Spouses must be of different genders"})
+                continue
+            male_id, female_id = (source, target) if g1 == "M" else (target, source)
+            if any(graph.persons[pid].get("gender") == "F" and (graph.spouse_in[pid] or pid in wives)
+                   for pid in (source, target)):
+                errors.append({"index": i, "detail": "The female person already has a spouse."})
+                continue
+            wives.add(female_id)
+            accepted.append({"type": rel_type, "source": male_id, "target": female_id, "order": edge.get("order")})
+            continue
+
+        role, gender, links, batch_links = (
+            ("father", "M", graph.father, fathers) if rel_type == "FATHER_OF"
+            else ("mother", "F", graph.mother, mothers)
+        )
+        if src.get("gender") != gender:
+            errors.append({"index": i, "detail": f"{role.capitalize()} must be {'male' if gender == 'M' else 'female'} (gender='{gender}')"})
+            continue
+        if src.get("level") >= tgt.get("level"):
+            errors.append({"index": i, "detail": f"Invalid relationship: {role} (level {src.get('level')}) must have lower level than child (level {tgt.get('level')})"})
+            continue
+        if links[target] or target in batch_links:
+            errors.append({"index": i, "detail": f"Child already has a {role}"})
+            continue
+        if source == target or is_ancestor(target, source):
+            errors.append({"index": i, "detail": "Cycle detected"})
+            continue
+        batch_links[target] = source
+        accepted.append({"type": rel_type, "source": source, "target": target, "order": edge.get("order")})
+
+    return accepted, errors
+
+
+def _batch_changes(graph, accepted: list[dict]) -> list[dict]:
+    """Tree change records for a validated batch (one PARENT_OF per child, father preferred)."""
+    with_father = {e["target"] for e in accepted if e["type"] == "FATHER_OF"}
+    changes = []
+    for e in accepted:
+        if e["type"] == "MOTHER_OF":
+            if graph.father[e["target"]] or e["target"] in with_father:
+                continue
+            changes.append(link_change(e["source"], e["target"], "PARENT_OF"))
+        else:
+            changes.append(link_change(e["source"], e["target"],
+                                       "SPOUSE_OF" if e["type"] == "SPOUSE_OF" else "PARENT_OF"))
+    return changes
+
+
+_ORDER_PROPS = {"FATHER_OF": "childOrder", "MOTHER_OF": "childOrder", "SPOUSE_OF": "spouseOrder"}
+
+
+async def write_relationship_rows(tx, chart_id: str, rel_type: str, rows: list[dict]) -> None:
+    """MERGE one `rel_type` edge per {source, target, order} row; rows must already be validated."""
+    res = await tx.run(f"""
+        UNWIND $rows AS row
+        MATCH (a:Person {{personId: row.source, chartId: $cid}}),
+              (b:Person {{personId: row.target, chartId: $cid}})
+        MERGE (a)-[r:{rel_type}]->(b)
+        SET r.{_ORDER_PROPS[rel_type]} = row.order
+    """, rows=rows, cid=chart_id)
+    await res.consume()
+
+
+async def _write_batch(tx, chart_id: str, expected_version: int, accepted: list[dict], changes: list[dict]) -> int:
+    # Optimistic check (see version_service): the batch was validated at expected_version
+    version = await bump_chart_version(tx, chart_id, changes)
+    if version != expected_version + 1:
+        raise _VersionConflict()
+    for rel_type in _ORDER_PROPS:
+        rows = [e for e in accepted if e["type"] == rel_type]
+        if rows:
+            await write_relationship_rows(tx, chart_id, rel_type, rows)
+    return version
+
+
+def _apply_batch(graph, accepted: list[dict]) -> None:
+    for e in accepted:
+        if e["type"] == "SPOUSE_OF":
+            graph.add_spouse(e["source"], e["target"], e["order"])
+        else:
+            graph.add_parent(e["type"], e["source"], e["target"], e["order"])
+
+
+async def add_relationships_batch(chart_id: str, edges: list[dict]) -> dict:
+    """Validate a list of FATHER_OF / MOTHER_OF / SPOUSE_OF edges in memory against the chart's
+    current state and write the valid ones in a single transaction. Invalid edges are reported per
+    index and skipped; if the chart changes while writing, the batch is revalidated and retried."""
+    for _ in range(_BATCH_ATTEMPTS):
+        graph = await get_chart_graph(chart_id)
+        expected = graph.version
+        accepted, errors = _validate_batch(graph, edges)
+        if not accepted:
+            return {"created": 0, "version": expected, "errors": errors}
+        changes = _batch_changes(graph, accepted)
+        try:
+            async with neo4j.driver.session() as session:
+                version = await session.execute_write(_write_batch, chart_id, expected, accepted, changes)
+        except _VersionConflict:
+            continue
+        apply_to_graph(chart_id, version, lambda g: _apply_batch(g, accepted))
+        return {"created": len(accepted), "version": version, "errors": errors}
+    raise HTTPException(status_code=409, detail="Chart is being modified concurrently, please retry")
+
+
+async def _move_tx(tx, chart_id: str, expected_version: int, person_id: int, parents: list[dict],
+                   levels: dict[int, int], changes: list[dict]) -> int:
+    # Optimistic check (see version_service): the move was validated at expected_version
+    version = await bump_chart_version(tx, chart_id, changes)
+    if version != expected_version + 1:
+        raise HTTPException(status_code=409, detail="Chart is being modified concurrently, please retry")
+    res = await tx.run("""
+        MATCH (:Person {chartId:$cid})-[old:FATHER_OF|MOTHER_OF]->(c:Person {personId:$pid, chartId:$cid})
+        DELETE old
+    """, pid=person_id, cid=chart_id)
+    await res.consume()
+    for edge in parents:
+        await write_relationship_rows(tx, chart_id, edge["type"], [edge])
+    if levels:
+        await write_level_rows(tx, chart_id, levels)
+    return version
+
+
+async def move_person(chart_id: str, person_id: int, father_id: int = None, mother_id: int = None,
+                      child_order: int = None) -> dict:
+    """Detach a person from their parents and attach them to new ones in one transaction. The
+    person is placed one level below the new parents and their descendants (with married-in
+    spouses) shift by the same number of generations."""
+    graph = await get_chart_graph(chart_id)
+    if not graph.has(person_id):
+        raise HTTPException(status_code=404, detail="Person not found")
+    parents = []
+    for role, rel_type, pid, gender, gender_name in (
+        ("father", "FATHER_OF", father_id, "M", "male"), ("mother", "MOTHER_OF", mother_id, "F", "female"),
+    ):
+        if pid is None:
+            continue
+        if not graph.has(pid):
+            raise HTTPException(status_code=404, detail=f"{role.capitalize()} not found")
+        if graph.persons[pid].get("gender") != gender:
+            raise HTTPException(status_code=400, detail=f"{role.capitalize()} must be {gender_name} (gender='{gender}')")
+        # One memoised ancestor lookup: the new parent must not descend from the moved person
+        if pid == person_id or graph.is_ancestor(person_id, pid):
+            raise HTTPException(status_code=400, detail="Cycle detected")
+        parents.append({"type": rel_type, "source": pid, "target": person_id, "order": child_order})
+    if not parents:
+        raise HTTPException(status_code=400, detail="At least one of fatherId or motherId must be provided")
+    if father_id is not None and mother_id is not None and mother_id not in graph.spouses_of(father_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Father and mother must be a married couple (SPOUSE_OF relationship required)"
+        )
+
+    level = max(graph.persons[p["source"]].get("level") for p in parents) + 1
+    levels = {pid: lv for pid, lv in shift_levels(graph, person_id, level).items()
+              if lv != graph.persons[pid].get("level")}
+    check_levels(graph, levels, moved=person_id)
+    persons = [{**graph.persons[pid], "level": lv} for pid, lv in levels.items()]
+    changes = [link_change(parents[0]["source"], person_id, "PARENT_OF")] + [node_change(p) for p in persons]
+    old_parents = [("FATHER_OF", graph.father[person_id]), ("MOTHER_OF", graph.mother[person_id])]
+    report = level_report(graph, levels)
+
+    async with neo4j.driver.session() as session:
+        version = await session.execute_write(
+            _move_tx, chart_id, graph.version, person_id, parents, levels, changes)
+
+    def patch(g):
+        for rel_type, pid in old_parents:
+            if pid:
+                g.remove_parent(rel_type, pid, person_id)
+        for edge in parents:
+            g.add_parent(edge["type"], edge["source"], person_id, child_order)
+        for person in persons:
+            g.upsert_person(person)
+    apply_to_graph(chart_id, version, patch)
+    return {"personId": person_id, "fatherId": father_id, "motherId": mother_id,
+            "version": version, "changed": report}
+
@@ -0,0 +1,249 @@
+"""Person import from a spreadsheet (CSV or XLSX).
+
+The first row names the columns (any order, case-insensitive): name, gender, level, dob, dod,
+description, photoUrl, father, mother, spouse, childOrder, spouseOrder and an optional ref.
+father / mother / spouse point at another row by its ref, or by its sheet row number (the header
+is row 1) when there is no ref column, or at a person already in the chart as "#<personId>".
+
+Every row is checked before anything is written: the PersonCreate constraints, then the rules of
+the relationship endpoints and of child creation (a father and mother given together must be
+married, in the chart or in the sheet). All problems are reported together (422). A valid file is written in
+one transaction of chunked UNWIND statements.
+"""
+import asyncio
+import csv
+import os
+import zipfile
+from typing import Optional
+
+import openpyxl
+from fastapi import HTTPException
+from openpyxl.utils.exceptions import InvalidFileException
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.db.neo4j import neo4j
+from app.models.person_model import PersonImportRow
+from app.services.person_id_service import allocate_person_ids
+from app.services.person_service import new_person_row, person_from_row, write_person_rows
+from app.services.projection_service import ChartGraph, apply_to_graph, get_chart_graph
+from app.services.relationship_service import write_relationship_rows
+from app.services.version_service import bump_chart_version
+
+_COLUMNS = {name.lower(): name for name in ("ref", *PersonImportRow.model_fields)}
+_REQUIRED = ("name", "gender", "level")
+_REFERENCES = ("father", "mother", "spouse")
+
+
+def _read_sheet(path: str, fmt: str) -> list[tuple]:
+    if fmt == "xlsx":
+        try:
+            wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        except (InvalidFileException, zipfile.BadZipFile, KeyError):
+            raise HTTPException(status_code=400, detail="Not a valid XLSX file")
+        try:
+            return [tuple(row) for row in wb.worksheets[0].iter_rows(values_only=True)]
+        finally:
+            wb.close()
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        try:
+            dialect = csv.Sniffer().sniff(f.read(4096), delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        return [tuple(row) for row in csv.reader(f, dialect)]
+
+
+def _cell(value):
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class _Rows:
+    """Validated rows of a sheet plus every problem found, keyed by sheet row number."""
+
+    def __init__(self):
+        self.numbers: list[int] = []
+        self.persons: list[PersonImportRow] = []
+        self.refs: dict[str, Optional[int]] = {}   # ref -> index in persons (None: the row is invalid)
+        self.errors: list[dict] = []
+
+    def error(self, number: int, field: Optional[str], msg: str) -> None:
+        self.errors.append({"row": number, "field": field, "msg": msg})
+
+
+def _parse(sheet: list[tuple]) -> _Rows:
+    if not sheet:
+        raise HTTPException(status_code=400, detail="Empty file")
+    columns = [_COLUMNS.get(str(_cell(h) or "").lower()) for h in sheet[0]]
+    missing = [name for name in _REQUIRED if name not in columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing column(s): {', '.join(missing)}")
+    has_ref = "ref" in columns
+
+    rows = _Rows()
+    for number, values in enumerate(sheet[1:], start=2):
+        cells = {col: _cell(v) for col, v in zip(columns, values) if col}
+        if all(v is None for v in cells.values()):
+            continue
+        ref = cells.pop("ref", None)
+        key = str(ref) if has_ref else str(number)
+        for col in _REFERENCES:
+            if cells.get(col) is not None:
+                cells[col] = str(cells[col])
+        try:
+            person = PersonImportRow.model_validate(cells)
+        except ValidationError as e:
+            for err in e.errors():
+                rows.error(number, ".".join(str(loc) for loc in err["loc"]) or None, err["msg"])
+            person = None
+        if has_ref and ref is None:
+            key = None
+        elif key in rows.refs:
+            rows.error(number, "ref", f"Duplicate ref '{key}'")
+            continue
+        if key is not None:
+            rows.refs[key] = len(rows.persons) if person else None
+        if person:
+            rows.numbers.append(number)
+            rows.persons.append(person)
+    if not rows.persons and not rows.errors:
+        raise HTTPException(status_code=400, detail="No rows to import")
+    return rows
+
+
+def _edges(rows: _Rows, graph: ChartGraph) -> list[dict]:
+    """FATHER_OF / MOTHER_OF / SPOUSE_OF edges between rows ("row", index) and chart persons
+    ("person", personId), checked like the relationship endpoints. New parent edges always point
+    at a row, so with parents strictly above children they cannot close a cycle."""
+    def resolve(number: int, field: str, value: str):
+        if value.startswith("#"):
+            pid = int(value[1:]) if value[1:].isdigit() else 0
+            if not graph.has(pid):
+                rows.error(number, field, f"Person {value} not found")
+                return None
+            return ("person", pid)
+        if value not in rows.refs:
+            rows.error(number, field, f"Unknown row reference '{value}'")
+            return None
+        idx = rows.refs[value]
+        # A reference to an invalid row is covered by that row's own errors
+        return ("row", idx) if idx is not None else None
+
+    def props(node) -> dict:
+        kind, key = node
+        if kind == "person":
+            return graph.persons[key]
+        return {"gender": rows.persons[key].gender, "level": rows.persons[key].level}
+
+    edges, couples, wives = [], set(), set()
+    # Spouses first: a row's parents may be married on a later row
+    for idx, (number, person) in enumerate(zip(rows.numbers, rows.persons)):
+        me = ("row", idx)
+        other = resolve(number, "spouse", person.spouse) if person.spouse else None
+        if other is None:
+            continue
+        g1, g2 = person.gender, props(other).get("gender")
+        if other == me:
+            rows.error(number, "spouse", "A person cannot be their own spouse")
+            continue
+        if g1 == g2 and g1 in ["M", "F"]:
+            rows.error(number, "spouse", "Spouses must be of different genders")
+            continue
+        male, female = (me, other) if g1 == "M" else (other, me)
+        if (male, female) in couples:
+            # Both rows name each other
+            continue
+        if female in wives or (female[0] == "person" and props(female).get("gender") == "F" and graph.spouse_in[female[1]]):
+            rows.error(number, "spouse", "The female person already has a spouse.")
+            continue
+        couples.add((male, female))
+        wives.add(female)
+        edges.append({"type": "SPOUSE_OF", "source": male, "target": female, "order": person.spouseOrder})
+
+    for idx, (number, person) in enumerate(zip(rows.numbers, rows.persons)):
+        me = ("row", idx)
+        parents = {}
+        for field, rel_type, gender in (("father", "FATHER_OF", "M"), ("mother", "MOTHER_OF", "F")):
+            value = getattr(person, field)
+            parent = resolve(number, field, value) if value else None
+            if parent is None:
+                continue
+            src = props(parent)
+            if parent == me:
+                rows.error(number, field, "Cycle detected")
+            elif src.get("gender") != gender:
+                rows.error(number, field, f"{field.capitalize()} must be {'male' if gender == 'M' else 'female'} (gender='{gender}')")
+            elif src.get("level") >= person.level:
+                rows.error(number, field, f"Invalid relationship: {field} (level {src.get('level')}) must have lower level than child (level {person.level})")
+            else:
+                parents[field] = {"type": rel_type, "source": parent, "target": me, "order": person.childOrder}
+
+        if len(parents) == 2:
+            father, mother = parents["father"]["source"], parents["mother"]["source"]
+            married = (father, mother) in couples or (
+                father[0] == mother[0] == "person" and mother[1] in graph.spouses_of(father[1]))
+            if not married:
+                rows.error(number, "mother", "Father and mother must be a married couple (SPOUSE_OF relationship required)")
+                continue
+        edges.extend(parents.values())
+    return edges
+
+
+async def _write_import(tx, chart_id: str, expected_version: int, persons: list[dict], edges: list[dict]) -> int:
+    # Optimistic check (see version_service): the rows were validated at expected_version
+    version = await bump_chart_version(tx, chart_id)
+    if version != expected_version + 1:
+        raise HTTPException(status_code=409, detail="Chart is being modified concurrently, please retry")
+    batch = settings.IMPORT_BATCH_SIZE
+    for i in range(0, len(persons), batch):
+        await write_person_rows(tx, chart_id, persons[i:i + batch])
+    for rel_type in ("FATHER_OF", "MOTHER_OF", "SPOUSE_OF"):
+        rows = [e for e in edges if e["type"] == rel_type]
+        for i in range(0, len(rows), batch):
+            await write_relationship_rows(tx, chart_id, rel_type, rows[i:i + batch])
+    return version
+
+
+def _apply_import(graph: ChartGraph, chart_id: str, persons: list[dict], edges: list[dict]) -> None:
+    for row in persons:
+        graph.upsert_person(person_from_row(chart_id, row))
+    for e in edges:
+        if e["type"] == "SPOUSE_OF":
+            graph.add_spouse(e["source"], e["target"], e["order"])
+        else:
+            graph.add_parent(e["type"], e["source"], e["target"], e["order"])
+
+
+async def import_sheet(chart_id: str, owner_id: str, path: str, fmt: str) -> dict:
+    """Import the CSV / XLSX file at `path` (deleted afterwards); see module docstring."""
+    try:
+        sheet = await asyncio.to_thread(_read_sheet, path, fmt)
+    finally:
+        os.unlink(path)
+    rows = _parse(sheet)
+    del sheet
+    graph = await get_chart_graph(chart_id)
+    expected = graph.version
+    edges = _edges(rows, graph)
+    if rows.errors:
+        raise HTTPException(status_code=422, detail=sorted(rows.errors, key=lambda e: e["row"]))
+
+    ids = await allocate_person_ids(chart_id, len(rows.persons))
+    # Lunar death dates for every row are computed here, in one pass
+    persons = [
+        new_person_row(pid, owner_id, p.name, p.gender, p.level, p.dob, p.dod, p.description, p.photoUrl)
+        for pid, p in zip(ids, rows.persons)
+    ]
+    for e in edges:
+        for end in ("source", "target"):
+            kind, key = e[end]
+            e[end] = ids[key] if kind == "row" else key
+
+    async with neo4j.driver.session() as session:
+        version = await session.execute_write(_write_import, chart_id, expected, persons, edges)
+    apply_to_graph(chart_id, version, lambda g: _apply_import(g, chart_id, persons, edges))
+    return {"created": len(persons), "relationships": len(edges), "version": version, "personIds": ids}
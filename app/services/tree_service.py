@@ -1,4 +1,66 @@
+import asyncio
+import gzip
+import json
+from collections import OrderedDict
+from typing import AsyncIterator, Union
+import brotli
+import msgpack
+from fastapi import HTTPException
+from app.core.config import settings
 from app.db.neo4j import neo4j
+from app.models.person_model import TreeOut
+from app.services.projection_service import get_chart_graph
+from app.services.version_service import VERSION_COUNTER, list_changes
+
+# chartId -> {"version": int, "data": dict, "bodies": {format: bytes}, "pending": {format: Future}};
+# least recently used first. "pending" holds compressions in progress (see compressed_tree).
+# Entries are keyed by the chart data version (see version_service), so any write that bumps the
+# version makes the cached tree unreachable without explicit invalidation.
+_tree_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _normalize_links(father_links: list[dict], mother_links: list[dict], spouse_links: list[dict]) -> list[dict]:
+    """Merge raw FATHER_OF / MOTHER_OF / SPOUSE_OF links into the tree link set:
+    SPOUSE_OF links as-is plus exactly one PARENT_OF link per child (father preferred)."""
+    # Build lookup dicts: child_id -> link
+    father_by_child: dict[int, dict] = {}
+    for link in father_links:
+        father_by_child[link["target"]] = link
+
+    mother_by_child: dict[int, dict] = {}
+    for link in mother_links:
+        mother_by_child[link["target"]] = link
+
+    # All unique child ids
+    all_children = set(father_by_child.keys()) | set(mother_by_child.keys())
+
+    final_links: list[dict] = []
+
+    # 1. Keep all SPOUSE_OF links as-is
+    for link in spouse_links:
+        final_links.append(link)
+
+    # 2. Create exactly 1 PARENT_OF link per child
+    #    Rule: prefer father as source; fallback to mother (single mother)
+    for child_id in all_children:
+        father_link = father_by_child.get(child_id)
+        mother_link = mother_by_child.get(child_id)
+
+        if father_link:
+            final_links.append({
+                "source": father_link["source"],
+                "target": child_id,
+                "type": "PARENT_OF",
+            })
+        elif mother_link:
+            # Single mother case
+            final_links.append({
+                "source": mother_link["source"],
+                "target": child_id,
+                "type": "PARENT_OF",
+            })
+
+    return final_links
 
 
 async def get_tree(chart_id: str):
@@ -10,6 +72,9 @@ async def get_tree(chart_id: str):
           * PARENT_OF (1 per child, source = father if exists, else mother)
           * SPOUSE_OF (kept as-is)
     """
+    if settings.GRAPH_PROJECTION_ENABLED:
+        return (await get_chart_graph(chart_id)).to_tree()
+
     async with neo4j.driver.session() as session:
         res = await session.run(
             """
@@ -69,42 +134,406 @@ async def get_tree(chart_id: str):
         mother_links = [link for link in (rec["mother_links"] or []) if link is not None]
         spouse_links = [link for link in (rec["spouse_links"] or []) if link is not None]
 
-        # Build lookup dicts: child_id -> link
-        father_by_child: dict[int, dict] = {}
-        for link in father_links:
-            father_by_child[link["target"]] = link
-
-        mother_by_child: dict[int, dict] = {}
-        for link in mother_links:
-            mother_by_child[link["target"]] = link
-
-        # All unique child ids
-        all_children = set(father_by_child.keys()) | set(mother_by_child.keys())
-
-        final_links: list[dict] = []
-
-        # 1. Keep all SPOUSE_OF links as-is
-        for link in spouse_links:
-            final_links.append(link)
-
-        # 2. Create exactly 1 PARENT_OF link per child
-        #    Rule: prefer father as source; fallback to mother (single mother)
-        for child_id in all_children:
-            father_link = father_by_child.get(child_id)
-            mother_link = mother_by_child.get(child_id)
-
-            if father_link:
-                final_links.append({
-                    "source": father_link["source"],
-                    "target": child_id,
-                    "type": "PARENT_OF",
-                })
-            elif mother_link:
-                # Single mother case
-                final_links.append({
-                    "source": mother_link["source"],
-                    "target": child_id,
-                    "type": "PARENT_OF",
-                })
-
-        return {"nodes": nodes, "links": final_links}
\ No newline at end of file
+        return {"nodes": nodes, "links": _normalize_links(father_links, mother_links, spouse_links)}
+
+# Per-person neighbourhood used to assemble partial trees: the tree node plus the ids needed to
+# draw its links and decide whether it has relatives outside the returned fragment.
+_TREE_ROW_RETURN = """
+    RETURN n {id: n.personId, .name, .gender, .level, .photoUrl} AS node,
+           [(p:Person)-[r:FATHER_OF|MOTHER_OF]->(n) | {source: p.personId, type: type(r)}] AS parents,
+           [(n)-[:FATHER_OF|MOTHER_OF]->(c:Person) | c.personId] AS children,
+           [(n)-[:SPOUSE_OF]->(s:Person) | s.personId] AS spousesOut
+"""
+
+
+def _assemble_fragment(rows: list[dict]) -> dict:
+    """Build {nodes, links} for a subset of the chart from per-person rows.
+
+    Links are limited to persons inside the subset and normalised exactly like get_tree (one
+    PARENT_OF per child, father preferred among the visible parents). Each node is flagged with
+    hasMoreParents / hasMoreChildren when it has relatives that were left out, so the client knows
+    where the fragment can be expanded.
+    """
+    members = {row["node"]["id"] for row in rows}
+    nodes: list[dict] = []
+    father_links: list[dict] = []
+    mother_links: list[dict] = []
+    spouse_links: list[dict] = []
+    for row in rows:
+        node = dict(row["node"])
+        pid = node["id"]
+        node["hasMoreParents"] = any(p["source"] not in members for p in row["parents"])
+        node["hasMoreChildren"] = any(c not in members for c in row["children"])
+        nodes.append(node)
+        for parent in row["parents"]:
+            if parent["source"] in members:
+                link = {"source": parent["source"], "target": pid, "type": parent["type"]}
+                (father_links if parent["type"] == "FATHER_OF" else mother_links).append(link)
+        for target in row["spousesOut"]:
+            if target in members:
+                spouse_links.append({"source": pid, "target": target, "type": "SPOUSE_OF"})
+    return {"nodes": nodes, "links": _normalize_links(father_links, mother_links, spouse_links)}
+
+
+async def get_tree_window(chart_id: str, focus: int, up: int, down: int) -> dict:
+    """Return the part of the tree within `up` generations above and `down` generations below the
+    focus person, plus the spouses of everyone in that range. Query cost and payload scale with
+    the window instead of the chart. Raises 404 if the focus person does not exist."""
+    if settings.GRAPH_PROJECTION_ENABLED:
+        graph = await get_chart_graph(chart_id)
+        if not graph.has(focus):
+            raise HTTPException(status_code=404, detail="Person not found")
+        core = {focus} | graph.ancestors_within(focus, up) | graph.descendants_within(focus, down)
+        members = core | {s for pid in core for s in graph.spouses_of(pid)}
+        return {"focus": focus, **_assemble_fragment(graph.tree_rows(sorted(members)))}
+
+    # Variable-length bounds cannot be query parameters; up/down are validated ints.
+    ancestors = (
+        f"OPTIONAL MATCH (a:Person)-[:FATHER_OF|MOTHER_OF*1..{up}]->(f) RETURN collect(DISTINCT a) AS ancestors"
+        if up > 0 else "RETURN [] AS ancestors"
+    )
+    descendants = (
+        f"OPTIONAL MATCH (f)-[:FATHER_OF|MOTHER_OF*1..{down}]->(d:Person) RETURN collect(DISTINCT d) AS descendants"
+        if down > 0 else "RETURN [] AS descendants"
+    )
+    async with neo4j.driver.session() as session:
+        res = await session.run(
+            f"""
+            MATCH (f:Person {{chartId:$cid, personId:$focus}})
+            CALL {{ WITH f {ancestors} }}
+            CALL {{ WITH f {descendants} }}
+            WITH [f] + ancestors + descendants AS core
+            UNWIND core AS c
+            OPTIONAL MATCH (c)-[:SPOUSE_OF]-(s:Person)
+            WITH core, collect(DISTINCT s) AS spouses
+            UNWIND core + [s IN spouses WHERE NOT s IN core] AS n
+            {_TREE_ROW_RETURN}
+            """,
+            cid=chart_id, focus=focus,
+        )
+        rows = await res.data()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Person not found")
+    return {"focus": focus, **_assemble_fragment(rows)}
+
+
+async def expand_tree(chart_id: str, person_ids: list[int], direction: str) -> dict:
+    """Return the nodes newly reachable from a batch of frontier persons in one direction
+    ("children" or "parents"), together with their spouses (and, for children, their other
+    parent), and the links that touch them. Frontier persons themselves are not repeated.
+    Cost is bounded by the frontier's fan-out."""
+    frontier_ids = set(person_ids)
+    if settings.GRAPH_PROJECTION_ENABLED:
+        graph = await get_chart_graph(chart_id)
+        frontier = [pid for pid in frontier_ids if graph.has(pid)]
+        if direction == "children":
+            base = {c for pid in frontier for c in (graph.children[pid] or ())}
+            related = {p for pid in base for p in graph.parents_of(pid)}
+        else:
+            base = {p for pid in frontier for p in graph.parents_of(pid)}
+            related = set()
+        related |= {s for pid in base for s in graph.spouses_of(pid)}
+        rows = graph.tree_rows(sorted(set(frontier) | base | related))
+    else:
+        if direction == "children":
+            step = "(f)-[:FATHER_OF|MOTHER_OF]->(x:Person)"
+            # The other parent decides the PARENT_OF source (father preferred), so bring it along
+            related = "[(b)-[:SPOUSE_OF]-(s:Person) | s] + [(p:Person)-[:FATHER_OF|MOTHER_OF]->(b) | p]"
+        else:
+            step = "(x:Person)-[:FATHER_OF|MOTHER_OF]->(f)"
+            related = "[(b)-[:SPOUSE_OF]-(s:Person) | s]"
+        async with neo4j.driver.session() as session:
+            res = await session.run(
+                f"""
+                UNWIND $ids AS pid
+                MATCH (f:Person {{chartId:$cid, personId:pid}})
+                OPTIONAL MATCH {step}
+                WITH collect(DISTINCT f) AS frontier, collect(DISTINCT x) AS base
+                WITH frontier, base, reduce(acc = [], b IN base | acc + {related}) AS related
+                UNWIND frontier + base + related AS n
+                WITH DISTINCT n
+                {_TREE_ROW_RETURN}
+                """,
+                cid=chart_id, ids=list(frontier_ids),
+            )
+            rows = await res.data()
+
+    fragment = _assemble_fragment(rows)
+    new_ids = {node["id"] for node in fragment["nodes"]} - frontier_ids
+    return {
+        "direction": direction,
+        "nodes": [node for node in fragment["nodes"] if node["id"] in new_ids],
+        "links": [link for link in fragment["links"] if link["source"] in new_ids or link["target"] in new_ids],
+    }
+
+
+async def get_tree_cached(chart_id: str, version: int) -> dict:
+    """Return the cache entry holding the tree of `chart_id` at data `version`, building it on a miss.
+    The entry dict has keys version, data (the get_tree result) and bodies (encodings, see encode_tree)."""
+    entry = _tree_cache.get(chart_id)
+    if entry is not None and entry["version"] == version:
+        _tree_cache.move_to_end(chart_id)
+        return entry
+
+    entry = {"version": version, "data": await get_tree(chart_id), "bodies": {}, "pending": {}}
+    # A concurrent request may have cached a newer version meanwhile — never overwrite it.
+    current = _tree_cache.get(chart_id)
+    if current is None or current["version"] < version:
+        _tree_cache[chart_id] = entry
+        _tree_cache.move_to_end(chart_id)
+        while len(_tree_cache) > settings.TREE_CACHE_MAX_CHARTS:
+            _tree_cache.popitem(last=False)
+    return entry
+
+
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+async def _iter_tree_records(chart_id: str) -> AsyncIterator[Union[int, tuple[str, dict]]]:
+    """Yield the chart version, then ("node", node) and ("link", link) for a chart straight off
+    Neo4j record cursors, so only the ids of the nodes written are held in memory. PARENT_OF links are
+    normalised per child inside the query (father preferred), which needs no cross-record state here.
+
+    All reads share one transaction. Neo4j reads are read-committed, so a write committed between
+    the queries may still show up in a later one: links to nodes that were not written are dropped."""
+    async with neo4j.driver.session() as session, await session.begin_transaction() as tx:
+        res = await tx.run(
+            "OPTIONAL MATCH (c:Counter {chartId:$cid, type:$type}) RETURN coalesce(c.value, 0) AS version",
+            cid=chart_id, type=VERSION_COUNTER,
+        )
+        yield (await res.single())["version"]
+
+        written: set[int] = set()
+        res = await tx.run(
+            """
+            MATCH (n:Person {chartId:$cid})
+            RETURN n {id: n.personId, .name, .gender, .level, .photoUrl} AS node
+            """,
+            cid=chart_id,
+        )
+        async for rec in res:
+            written.add(rec["node"]["id"])
+            yield "node", rec["node"]
+
+        for query in (
+            """
+            MATCH (s1:Person {chartId:$cid})-[:SPOUSE_OF]->(s2:Person {chartId:$cid})
+            RETURN {source: s1.personId, target: s2.personId, type: "SPOUSE_OF"} AS link
+            """,
+            """
+            MATCH (c:Person {chartId:$cid})
+            WITH c, head([(f:Person)-[:FATHER_OF]->(c) | f.personId]) AS fatherId,
+                    head([(m:Person)-[:MOTHER_OF]->(c) | m.personId]) AS motherId
+            WHERE fatherId IS NOT NULL OR motherId IS NOT NULL
+            RETURN {source: coalesce(fatherId, motherId), target: c.personId, type: "PARENT_OF"} AS link
+            """,
+        ):
+            res = await tx.run(query, cid=chart_id)
+            async for rec in res:
+                link = rec["link"]
+                if link["source"] in written and link["target"] in written:
+                    yield "link", link
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+async def _tree_chunks(records: AsyncIterator[tuple[str, dict]], version: int, fmt: str) -> AsyncIterator[bytes]:
+    buf: list[str] = []
+    size = 0
+    if fmt == "ndjson":
+        buf.append(_dumps({"kind": "meta", "version": version}) + "\n")
+    else:
+        buf.append('{"nodes":[')
+    section = "node"
+    first = True
+    async for kind, item in records:
+        if fmt == "ndjson":
+            piece = _dumps({"kind": kind, **item}) + "\n"
+        else:
+            piece = ""
+            if kind != section:
+                piece, section, first = '],"links":[', kind, True
+            piece += ("" if first else ",") + _dumps(item)
+            first = False
+        buf.append(piece)
+        size += len(piece)
+        if size >= _STREAM_CHUNK_BYTES:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    if fmt == "json":
+        buf.append("]}" if section == "link" else '],"links":[]}')
+    if buf:
+        yield "".join(buf).encode()
+
+
+async def stream_tree(chart_id: str, fmt: str = "ndjson") -> tuple[int, AsyncIterator[bytes]]:
+    """Start streaming the tree of a chart: (data version it reflects, body in ~64 KB chunks).
+
+    fmt="ndjson": one JSON object per line — a {"kind":"meta","version":...} header, then
+    {"kind":"node",...} lines and {"kind":"link",...} lines.
+    fmt="json": the regular TreeOut document ({"nodes":[...],"links":[...]}) written incrementally.
+    The read transaction stays open until the chunks are consumed or closed.
+    """
+    records = _iter_tree_records(chart_id)
+    version = await records.__anext__()
+    return version, _tree_chunks(records, version, fmt)
+
+
+def _link_key(link: dict) -> tuple:
+    # A child has exactly one PARENT_OF link, so those are identified by their target alone.
+    if link["type"] == "PARENT_OF":
+        return (link["target"], "PARENT_OF")
+    return (link["source"], link["target"], link["type"])
+
+
+async def get_tree_changes(chart_id: str, since: int, version: int) -> dict:
+    """Return what changed in the tree between data version `since` and `version`.
+
+    The change log records are folded into net upserts and removals. When the log no longer covers
+    the range (compacted, or a bulk write logged without details), the full tree is returned with
+    full=True and the client replaces its copy instead of patching it.
+    """
+    out = {"fromVersion": since, "version": version, "full": False,
+           "nodes": [], "links": [], "removedNodes": [], "removedLinks": []}
+    if since == version:
+        return out
+    changes = await list_changes(chart_id, since, version) if since < version else None
+    if changes is None:
+        entry = await get_tree_cached(chart_id, version)
+        return {**out, "full": True, "nodes": entry["data"]["nodes"], "links": entry["data"]["links"]}
+
+    nodes: dict[int, dict] = {}
+    removed_nodes: set[int] = set()
+    links: dict[tuple, dict] = {}
+    removed_links: dict[tuple, dict] = {}
+    for change in changes:
+        op = change["op"]
+        if op == "node":
+            node = change["node"]
+            nodes[node["id"]] = node
+            removed_nodes.discard(node["id"])
+        elif op == "delNode":
+            pid = change["id"]
+            nodes.pop(pid, None)
+            removed_nodes.add(pid)
+            # Clients drop links of removed nodes themselves
+            for group in (links, removed_links):
+                for key in [k for k, link in group.items() if pid in (link["source"], link["target"])]:
+                    del group[key]
+        elif op == "link":
+            key = _link_key(change["link"])
+            links[key] = change["link"]
+            removed_links.pop(key, None)
+        elif op == "delLink":
+            key = _link_key(change["link"])
+            links.pop(key, None)
+            removed_links[key] = change["link"]
+    return {**out, "nodes": list(nodes.values()), "links": list(links.values()),
+            "removedNodes": sorted(removed_nodes), "removedLinks": list(removed_links.values())}
+
+
+TREE_FORMATS = ("json", "columnar", "columnar-msgpack")
+LINK_TYPES = ["PARENT_OF", "SPOUSE_OF"]
+
+
+def _photo_prefix(url: str) -> str:
+    # Cloudinary URLs share everything up to /upload/ (the version segment differs per upload);
+    # anything else is split at its last path separator.
+    idx = url.find("/upload/")
+    if idx != -1:
+        return url[:idx + len("/upload/")]
+    return url[:url.rfind("/") + 1]
+
+
+def to_columnar(data: dict, version: int) -> dict:
+    """Columnar form of a get_tree result.
+
+    Node fields are parallel arrays (genders packed into one string), links are index pairs into
+    those arrays plus a type code into linkTypes, and photo URLs are split into a deduplicated
+    prefix table (photoPrefix = index, -1 for no photo) and per-node suffixes.
+    """
+    nodes = data["nodes"]
+    index = {node["id"]: i for i, node in enumerate(nodes)}
+    prefixes: dict[str, int] = {}
+    photo_prefix: list[int] = []
+    photo_suffix: list[str] = []
+    for node in nodes:
+        url = node.get("photoUrl")
+        if not url:
+            photo_prefix.append(-1)
+            photo_suffix.append("")
+            continue
+        prefix = _photo_prefix(url)
+        photo_prefix.append(prefixes.setdefault(prefix, len(prefixes)))
+        photo_suffix.append(url[len(prefix):])
+    type_codes = {t: i for i, t in enumerate(LINK_TYPES)}
+    links = [link for link in data["links"] if link["source"] in index and link["target"] in index]
+    return {
+        "version": version,
+        "ids": [node["id"] for node in nodes],
+        "names": [node["name"] for node in nodes],
+        "genders": "".join(node["gender"] for node in nodes),
+        "levels": [node["level"] for node in nodes],
+        "photoPrefixes": list(prefixes),
+        "photoPrefix": photo_prefix,
+        "photoSuffix": photo_suffix,
+        "linkTypes": LINK_TYPES,
+        "linkSource": [index[link["source"]] for link in links],
+        "linkTarget": [index[link["target"]] for link in links],
+        "linkType": [type_codes[link["type"]] for link in links],
+    }
+
+
+def encode_tree(entry: dict, fmt: str = "json") -> bytes:
+    """Serialized tree of a cache entry in one of TREE_FORMATS, encoded once per version."""
+    body = entry["bodies"].get(fmt)
+    if body is None:
+        if fmt == "json":
+            body = TreeOut.model_validate(entry["data"]).model_dump_json().encode()
+        elif fmt == "columnar":
+            body = _dumps(to_columnar(entry["data"], entry["version"])).encode()
+        else:
+            body = msgpack.packb(to_columnar(entry["data"], entry["version"]), use_bin_type=True)
+        entry["bodies"][fmt] = body
+    return body
+
+
+# Content codings we precompress, in order of preference
+TREE_ENCODINGS = ("br", "gzip")
+
+
+# Moderate levels: brotli 11 takes ~20 s on an 8 MB tree for ~12% less than quality 5 (0.15 s)
+_COMPRESSORS = {
+    "br": lambda raw: brotli.compress(raw, quality=5),
+    "gzip": lambda raw: gzip.compress(raw, 6),
+}
+
+
+async def compressed_tree(entry: dict, fmt: str, encoding: str) -> bytes:
+    """`encode_tree` output compressed with `encoding` ("br" or "gzip"), cached in the entry next to
+    the plain body so each version is compressed once instead of once per request. Compression runs
+    in a worker thread; requests arriving while it runs wait for that same job."""
+    key = f"{fmt}+{encoding}"
+    body = entry["bodies"].get(key)
+    if body is not None:
+        return body
+    pending = entry["pending"]
+    job = pending.get(key)
+    if job is None:
+        job = asyncio.ensure_future(asyncio.to_thread(_COMPRESSORS[encoding], encode_tree(entry, fmt)))
+        pending[key] = job
+
+        def done(finished: asyncio.Future) -> None:
+            pending.pop(key, None)
+            if not finished.cancelled() and finished.exception() is None:
+                entry["bodies"][key] = finished.result()
+        job.add_done_callback(done)
+    # A client going away must not cancel the job the other requests are waiting for
+    return await asyncio.shield(job)
+
+
+def evict_tree_cache(chart_id: str) -> None:
+    """Drop a chart's cached tree (used when the chart is deleted)."""
+    _tree_cache.pop(chart_id, None)
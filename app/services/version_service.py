@@ -0,0 +1,133 @@
+"""Per-chart data version counter and tree change log.
+
+Every mutation of a chart's Person graph (persons and FATHER_OF / MOTHER_OF / SPOUSE_OF edges) bumps
+a `Counter {chartId, type:'VERSION'}` node in Neo4j. Read-side caches key their entries by this
+version, so a bump is all it takes to invalidate them — on every worker, since the counter lives in
+the database rather than in process memory.
+
+The same statement records what the write changed in the tree as seen by get_tree, as a
+`TreeChange {chartId, version, changes}` node (changes is a JSON list of records, see the *_change
+helpers below). Only the last TREE_CHANGE_LOG_SIZE versions are kept per chart; clients that fall
+further behind get a full snapshot from /tree/changes instead.
+
+Every write bumps the counter in the same transaction as its change (the GEDCOM import bumps once
+per batch it commits). A write validated outside its transaction, against the state at version V,
+bumps first and requires the result to be V + 1: nothing was committed since V, and the counter's
+write lock keeps it that way until commit.
+"""
+import json
+from typing import Optional
+
+from app.core.config import settings
+from app.db.neo4j import neo4j
+
+VERSION_COUNTER = "VERSION"
+
+
+def node_change(person: dict) -> dict:
+    """Tree node created or updated."""
+    return {"op": "node", "node": {
+        "id": person["personId"],
+        "name": person.get("name"),
+        "gender": person.get("gender"),
+        "level": person.get("level"),
+        "photoUrl": person.get("photoUrl"),
+    }}
+
+
+def node_removed(person_id: int) -> dict:
+    """Tree node deleted; clients drop every link touching it as well."""
+    return {"op": "delNode", "id": person_id}
+
+
+def link_change(source: int, target: int, link_type: str) -> dict:
+    """Tree link created. A PARENT_OF link replaces any PARENT_OF link of the same child."""
+    return {"op": "link", "link": {"source": source, "target": target, "type": link_type}}
+
+
+def link_removed(source: int, target: int, link_type: str) -> dict:
+    return {"op": "delLink", "link": {"source": source, "target": target, "type": link_type}}
+
+
+async def get_chart_version(chart_id: str) -> int:
+    """Return the current data version of a chart (0 if it has never been modified)."""
+    async with neo4j.driver.session() as session:
+        res = await session.run(
+            """
+            OPTIONAL MATCH (c:Counter {chartId:$cid, type:$type})
+            RETURN coalesce(c.value, 0) AS version
+            """,
+            cid=chart_id, type=VERSION_COUNTER,
+        )
+        rec = await res.single()
+        return rec["version"]
+
+
+async def bump_chart_version(runner, chart_id: str, changes: Optional[list[dict]] = None) -> int:
+    """Increment the chart's data version, log `changes` under the new version and return it.
+
+    `runner` is an open session or transaction, so the bump can share the caller's round trip
+    context (and, inside a transaction, commit atomically with the mutation itself). Pass
+    changes=None when the write cannot be described record by record (bulk operations): clients
+    asking for changes across that version receive a full snapshot.
+    """
+    res = await runner.run(
+        """
+        MERGE (c:Counter {chartId:$cid, type:$type})
+        ON CREATE SET c.value = 0
+        SET c.value = c.value + 1
+        WITH c.value AS version
+        CREATE (:TreeChange {chartId:$cid, version:version, changes:$changes})
+        WITH version
+        OPTIONAL MATCH (old:TreeChange {chartId:$cid}) WHERE old.version <= version - $keep
+        WITH version, collect(old) AS expired
+        FOREACH (t IN expired | DELETE t)
+        RETURN version
+        """,
+        cid=chart_id, type=VERSION_COUNTER, keep=settings.TREE_CHANGE_LOG_SIZE,
+        changes=json.dumps(changes, separators=(",", ":")) if changes is not None else None,
+    )
+    rec = await res.single()
+    return rec["version"]
+
+
+async def lock_chart_version(tx, chart_id: str) -> int:
+    """Take the write lock on the chart's version counter for the rest of `tx` and return the
+    current version. Every write bumps this counter, so a write that validates the graph before
+    changing it calls this first: nothing it reads can change until it commits."""
+    res = await tx.run(
+        """
+        MERGE (c:Counter {chartId:$cid, type:$type})
+        ON CREATE SET c.value = 0
+        SET c._lock = true
+        REMOVE c._lock
+        RETURN c.value AS version
+        """,
+        cid=chart_id, type=VERSION_COUNTER,
+    )
+    rec = await res.single()
+    return rec["version"]
+
+
+async def list_changes(chart_id: str, since: int, until: int) -> Optional[list[dict]]:
+    """Return the change records of versions since+1..until in order, or None if any of those
+    versions is missing from the log (compacted away) or was logged without changes."""
+    async with neo4j.driver.session() as session:
+        res = await session.run(
+            """
+            MATCH (t:TreeChange {chartId:$cid})
+            WHERE t.version > $since AND t.version <= $until
+            RETURN t.version AS version, t.changes AS changes
+            ORDER BY t.version
+            """,
+            cid=chart_id, since=since, until=until,
+        )
+        records = await res.data()
+    if [r["version"] for r in records] != list(range(since + 1, until + 1)):
+        return None
+    changes: list[dict] = []
+    for r in records:
+        if r["changes"] is None:
+            return None
+        changes.extend(json.loads(r["changes"]))
+    return changes
@@ -0,0 +1,141 @@
+"""GEDCOM 5.5.1 reading and writing helpers.
+
+A GEDCOM file is a sequence of lines "<level> [@xref@] <TAG> [value]". `read_records` groups them
+into one level-0 record at a time, so a file of any size is read with only the current record in
+memory. CONT / CONC continuation lines are folded into their parent's value; `text_lines` produces
+them when writing.
+"""
+import re
+from datetime import date
+from typing import Iterable, Iterator, Optional
+
+_LINE = re.compile(r"^\s*(\d+)\s+(?:(@[^@]+@)\s+)?(\S+)(?: (.*))?$")
+
+_MONTH_NAMES = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+_MONTHS = {m: i for i, m in enumerate(_MONTH_NAMES, 1)}
+
+# Values are split with CONC well below the 255-character line limit
+_CHUNK = 200
+
+
+class GedcomRecord:
+    __slots__ = ("tag", "xref", "value", "children")
+
+    def __init__(self, tag: str, xref: Optional[str] = None, value: str = ""):
+        self.tag = tag
+        self.xref = xref
+        self.value = value
+        self.children: list["GedcomRecord"] = []
+
+    def first(self, tag: str) -> Optional["GedcomRecord"]:
+        for child in self.children:
+            if child.tag == tag:
+                return child
+        return None
+
+    def all(self, tag: str) -> list["GedcomRecord"]:
+        return [child for child in self.children if child.tag == tag]
+
+    def value_of(self, *path: str) -> Optional[str]:
+        """Value at a tag path below this record, e.g. value_of("BIRT", "DATE")."""
+        node = self
+        for tag in path:
+            node = node.first(tag)
+            if node is None:
+                return None
+        return node.value or None
+
+
+def read_records(lines: Iterable[str]) -> Iterator[GedcomRecord]:
+    """Yield the level-0 records of a GEDCOM stream in file order. Malformed lines are skipped."""
+    stack: list[GedcomRecord] = []
+    for line in lines:
+        m = _LINE.match(line.rstrip("\r\n"))
+        if not m:
+            continue
+        level, xref, tag, value = m.groups()
+        level, tag, value = int(level), tag.upper(), (value or "").replace("@@", "@")
+        if level == 0:
+            if stack:
+                yield stack[0]
+            stack = [GedcomRecord(tag, xref, value)]
+            continue
+        if not stack or level > len(stack):
+            continue
+        del stack[level:]
+        parent = stack[-1]
+        if tag == "CONC":
+            parent.value += value
+            continue
+        if tag == "CONT":
+            parent.value += "\n" + value
+            continue
+        node = GedcomRecord(tag, xref, value)
+        parent.children.append(node)
+        stack.append(node)
+    if stack:
+        yield stack[0]
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """An exact "D MON YYYY" date; partial, approximate and ranged dates give None."""
+    if not value:
+        return None
+    parts = value.upper().split()
+    if len(parts) != 3 or parts[1] not in _MONTHS or not parts[0].isdigit() or not parts[2].isdigit():
+        return None
+    try:
+        return date(int(parts[2]), _MONTHS[parts[1]], int(parts[0]))
+    except ValueError:
+        return None
+
+
+def parse_name(value: Optional[str]) -> str:
+    """Personal name with the surname slashes removed, keeping the written order."""
+    return " ".join((value or "").replace("/", " ").split())
+
+
+def format_date(value) -> Optional[str]:
+    """GEDCOM "D MON YYYY" for a date, a neo4j Date or an ISO date string."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return f"{value.day} {_MONTH_NAMES[value.month - 1]} {value.year:04d}"
+
+
+def _chunks(text: str) -> list[str]:
+    """Escaped `text` cut into pieces of at most _CHUNK characters. Cuts fall between two
+    characters that are neither a space (as GEDCOM asks, so readers that trim line ends keep every
+    space) nor an "@" (so no "@@" escape is split)."""
+    chunks, start = [], 0
+    while len(text) - start > _CHUNK:
+        end = start + _CHUNK
+        while end > start + 1 and (text[end - 1] in " @" or text[end] in " @"):
+            end -= 1
+        if end == start + 1:
+            # A run of spaces / "@" longer than a chunk: cut anyway, between two "@@" escapes
+            end = start + _CHUNK
+            run = end
+            while run > start and text[run - 1] == "@":
+                run -= 1
+            end -= (end - run) % 2
+        chunks.append(text[start:end])
+        start = end
+    chunks.append(text[start:])
+    return chunks
+
+
+def text_lines(level: int, tag: str, text: str) -> list[str]:
+    """Lines of a free-text value: newlines become CONT, long lines are cut with CONC."""
+    lines = []
+    for i, part in enumerate(text.replace("\r\n", "\n").split("\n")):
+        chunks = _chunks(part.replace("@", "@@"))
+        first = f"{level} {tag} {chunks[0]}" if i == 0 else f"{level + 1} CONT {chunks[0]}"
+        # Only a line without continuation may lose its trailing spaces (and the one after an empty tag)
+        lines.append(first if len(chunks) > 1 else first.rstrip())
+        lines.extend(f"{level + 1} CONC {chunk}" for chunk in chunks[1:])
+    return lines
@@ -0,0 +1,193 @@
+"""Diacritic-insensitive name search.
+
+Names and queries are folded (lower case, Vietnamese diacritics stripped, đ -> d, whitespace
+collapsed) so "nguyen van" matches "Nguyễn Văn". `NameIndex` keeps a trigram -> personIds posting
+map over the folded names (plus one- and two-letter word prefixes, for short query words): a
+query's candidates are the intersection of its postings, then verified and ranked. `PrefixIndex`
+serves typeahead from sorted arrays of folded name keys.
+"""
+import bisect
+import heapq
+import re
+import sys
+import unicodedata
+from typing import Callable, Iterable, Optional
+
+_SPACES = re.compile(r"\s+")
+
+
+def fold(text: Optional[str]) -> str:
+    """Lower-case `text`, strip diacritics (đ -> d) and collapse whitespace."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _SPACES.sub(" ", stripped).strip()
+
+
+def _trigrams(folded: str) -> set[str]:
+    return {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+
+# Rank tiers, best first
+_EXACT, _PREFIX, _WORD_PREFIX, _INFIX, _TOKENS = range(5)
+
+# Query words shorter than a trigram are matched as word prefixes through this many leading chars
+_SHORT = 2
+
+
+class NameIndex:
+    def __init__(self):
+        self.names: dict[int, str] = {}       # personId -> original name
+        self.folded: dict[int, str] = {}      # personId -> " " + folded name
+        self.postings: dict[str, set[int]] = {}   # trigram or short word prefix -> personIds
+        self.nbytes = 0
+
+    @staticmethod
+    def _keys(folded: str) -> set[str]:
+        keys = _trigrams(folded)
+        for word in folded.split(" "):
+            keys.update(word[:n] for n in range(1, _SHORT + 1))
+        keys.discard("")
+        return keys
+
+    def add(self, pid: int, name: Optional[str]) -> None:
+        self.remove(pid)
+        folded = fold(name)
+        self.names[pid] = name or ""
+        self.folded[pid] = " " + folded
+        keys = self._keys(folded)
+        for key in keys:
+            self.postings.setdefault(key, set()).add(pid)
+        self.nbytes += sys.getsizeof(folded) + 64 * len(keys)
+
+    def remove(self, pid: int) -> None:
+        padded = self.folded.pop(pid, None)
+        if padded is None:
+            return
+        self.names.pop(pid, None)
+        folded = padded[1:]
+        keys = self._keys(folded)
+        for key in keys:
+            posting = self.postings.get(key)
+            if posting is not None:
+                posting.discard(pid)
+                if not posting:
+                    del self.postings[key]
+        self.nbytes -= sys.getsizeof(folded) + 64 * len(keys)
+
+    def _candidates(self, tokens: list[str]) -> set[int]:
+        keys = set()
+        for token in tokens:
+            keys.update(_trigrams(token) if len(token) > _SHORT else (token,))
+        postings = sorted((self.postings.get(k, set()) for k in keys), key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            if not found:
+                break
+            found &= posting
+        return found
+
+    def search(self, q: str, limit: Optional[int] = None) -> list[int]:
+        """personIds whose name matches `q`, best match first: whole name, name prefix, word
+        prefix, infix, then every query word as a word prefix in any order. Query words of one or
+        two letters only match at the start of a word."""
+        query = fold(q)
+        if not query:
+            return []
+        tokens = query.split(" ")
+        padded_query = " " + query
+        # Only worth telling accented matches apart when the query carries diacritics itself
+        raw = _SPACES.sub(" ", q.lower()).strip()
+        raw = raw if raw != query else None
+        folded, names = self.folded, self.names
+        ranked = []
+        for pid in self._candidates(tokens):
+            name = folded[pid]
+            if name == padded_query:
+                tier = _EXACT
+            elif name.startswith(padded_query):
+                tier = _PREFIX
+            elif padded_query in name:
+                tier = _WORD_PREFIX
+            elif query in name:
+                tier = _INFIX
+            elif len(tokens) > 1 and all(f" {t}" in name for t in tokens):
+                tier = _TOKENS
+            else:
+                continue
+            # Among equals, prefer names that also match the query's diacritics, then shorter names
+            accents = 0 if raw is None or raw in names[pid].lower() else 1
+            ranked.append((tier, accents, len(name), name, pid))
+        ranked = heapq.nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+        return [key[-1] for key in ranked]
+
+
+class PrefixIndex:
+    """Sorted arrays of (folded key, personId) for typeahead: every name is filed under its whole
+    folded form in `whole` and under each later word onwards in `tails`, so "van" finds
+    "Nguyễn Văn An". Lookups are a bisect plus a short scan per array; adds and removes are patched
+    in place."""
+
+    def __init__(self):
+        self.whole: list[tuple[str, int]] = []
+        self.tails: list[tuple[str, int]] = []
+        self.folded: dict[int, str] = {}
+        self.nbytes = 0
+
+    @staticmethod
+    def _tails(folded: str) -> list[str]:
+        words = folded.split(" ")
+        return [" ".join(words[i:]) for i in range(1, len(words)) if words[i]]
+
+    def _entries(self, folded: str) -> list[tuple[list, str]]:
+        return ([(self.whole, folded)] if folded else []) + [(self.tails, key) for key in self._tails(folded)]
+
+    def build(self, names: Iterable[tuple[int, Optional[str]]]) -> None:
+        for pid, name in names:
+            folded = fold(name)
+            self.folded[pid] = folded
+            for keys, key in self._entries(folded):
+                keys.append((key, pid))
+        self.whole.sort()
+        self.tails.sort()
+        self.nbytes = sum(sys.getsizeof(keys) + sum(72 + len(k) for k, _ in keys)
+                          for keys in (self.whole, self.tails))
+
+    def add(self, pid: int, name: Optional[str]) -> None:
+        self.remove(pid)
+        folded = fold(name)
+        self.folded[pid] = folded
+        for keys, key in self._entries(folded):
+            bisect.insort(keys, (key, pid))
+            self.nbytes += 80 + len(key)
+
+    def remove(self, pid: int) -> None:
+        folded = self.folded.pop(pid, None)
+        if folded is None:
+            return
+        for keys, key in self._entries(folded):
+            i = bisect.bisect_left(keys, (key, pid))
+            if i < len(keys) and keys[i] == (key, pid):
+                del keys[i]
+                self.nbytes -= 80 + len(key)
+
+    def lookup(self, prefix: str, limit: int, accept: Optional[Callable[[int], bool]] = None) -> list[int]:
+        """Up to `limit` personIds with a name or name tail starting with `prefix`: whole-name
+        matches first, then tail matches, each in key order."""
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        found, seen = [], set()
+        for keys in (self.whole, self.tails):
+            i = bisect.bisect_left(keys, (prefix,))
+            while i < len(keys) and len(found) < limit:
+                key, pid = keys[i]
+                if not key.startswith(prefix):
+                    break
+                i += 1
+                if pid in seen or (accept is not None and not accept(pid)):
+                    continue
+                seen.add(pid)
+                found.append(pid)
+        return found
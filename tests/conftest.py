@@ -0,0 +1,12 @@
+import os
+
+# app.core.config requires these at import time; the tests never connect to either database
+for _name, _value in {
+    "JWT_SECRET": "test",
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "MONGODB_DB": "test",
+    "NEO4J_URI": "bolt://localhost:7687",
+    "NEO4J_USER": "neo4j",
+    "NEO4J_PASSWORD": "test",
+}.items():
+    os.environ.setdefault(_name, _value)
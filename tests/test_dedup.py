@@ -0,0 +1,56 @@
+from app.services.dedup_service import _snapshot, find_duplicates
+from app.services.projection_service import ChartGraph
+
+
+def _graph() -> ChartGraph:
+    g = ChartGraph("chart", 1)
+    persons = [
+        # personId, name, gender, level, dob
+        (1, "Nguyễn Văn An", "M", 0, None),
+        (2, "Trần Thị Bình", "F", 0, None),
+        (3, "Nguyễn Văn Cường", "M", 1, "1950-03-01"),
+        (4, "Nguyen Van Cuong", "M", 1, "1950-03-01"),   # same person, entered twice
+        (5, "nguyễn văn cường", "M", 1, "1980-01-01"),   # namesake, decades apart
+        (6, "Nguyễn Văn Cường", "F", 1, None),           # different gender
+        (7, "Nguyễn Văn Cường", "M", 2, "1950-03-01"),   # different generation
+        (8, "Lê Thị Dung", "F", 1, None),
+    ]
+    for pid, name, gender, level, dob in persons:
+        g.upsert_person({"personId": pid, "name": name, "gender": gender, "level": level, "dob": dob})
+    g.add_spouse(1, 2, None)
+    for child in (3, 4):
+        g.add_parent("FATHER_OF", 1, child, None)
+        g.add_parent("MOTHER_OF", 2, child, None)
+    g.add_spouse(3, 8, None)
+    return g
+
+
+def test_find_duplicates_ranks_the_real_pair():
+    pairs, stats = find_duplicates(_snapshot(_graph()), 1.0, 10)
+    assert [(a, b) for _, a, b, _ in pairs] == [(3, 4)]
+    score, _, _, reasons = pairs[0]
+    assert score == 9.0
+    assert reasons == ["same dob", "same father", "same mother"]
+    # Blocked by (folded name, level): 3, 4, 5, 6 are compared, 7 is not
+    assert stats["pairsCompared"] == 6
+    assert stats["candidates"] == 1
+
+
+def test_conflicting_dates_score_negative():
+    pairs, _ = find_duplicates(_snapshot(_graph()), -100, 10)
+    scores = {(a, b): score for score, a, b, _ in pairs}
+    assert scores[(3, 5)] < 0
+    assert (3, 6) not in scores
+
+
+def test_limit_and_spouses():
+    g = _graph()
+    g.upsert_person({"personId": 9, "name": "Lê Thị Dung", "gender": "F", "level": 1})
+    g.add_spouse(4, 9, None)
+    pairs, _ = find_duplicates(_snapshot(g), 0, 1)
+    assert len(pairs) == 1
+    # 8 and 9 are married to the duplicated pair: spouses with the same name
+    pairs, _ = find_duplicates(_snapshot(g), 0, 10)
+    reasons = {(a, b): r for _, a, b, r in pairs}
+    assert "spouse with the same name" in reasons[(3, 4)]
+    assert "spouse with the same name" in reasons[(8, 9)]
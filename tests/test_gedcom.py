@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+from app.utils.gedcom import format_date, parse_date, parse_name, read_records, text_lines
+
+
+def _round_trip(text: str) -> str:
+    lines = ["0 @I1@ INDI", *text_lines(1, "NOTE", text), "0 TRLR"]
+    return next(read_records(lines)).first("NOTE").value
+
+
+@pytest.mark.parametrize("text", [
+    "word " * 100,
+    "a" * 450,
+    " " * 450 + "x",
+    "x @y@ " * 80 + "\nsecond line\n\n" + "z" * 401,
+    "@" * 300,
+    "x" + "@" * 300,
+    "",
+])
+def test_text_lines_round_trip(text):
+    assert _round_trip(text) == text
+
+
+def test_text_lines_cuts_between_words():
+    lines = text_lines(1, "NOTE", "word " * 200)
+    assert len(lines) > 1
+    # Only the value's own trailing space is left at a line end
+    assert all(not line.endswith(" ") for line in lines[:-1])
+    assert all(not line.startswith("2 CONC  ") for line in lines)
+
+
+def test_text_lines_respects_line_limit():
+    lines = text_lines(1, "NOTE", "@ " * 500 + "@" * 500)
+    assert max(len(line) for line in lines) < 255
+
+
+def test_read_records_groups_levels():
+    records = list(read_records([
+        "0 HEAD",
+        "0 @I1@ INDI",
+        "1 NAME John /Smith/",
+        "1 BIRT",
+        "2 DATE 3 MAR 1901",
+        "1 NOTE first",
+        "2 CONC  half",
+        "2 CONT second",
+        "garbage",
+        "3 DATE skipped level",
+        "0 TRLR",
+    ]))
+    assert [r.tag for r in records] == ["HEAD", "INDI", "TRLR"]
+    indi = records[1]
+    assert indi.xref == "@I1@"
+    assert parse_name(indi.value_of("NAME")) == "John Smith"
+    assert parse_date(indi.value_of("BIRT", "DATE")) == date(1901, 3, 3)
+    assert indi.value_of("NOTE") == "first half\nsecond"
+    assert indi.value_of("DEAT", "DATE") is None
+
+
+def test_dates():
+    assert parse_date("ABT 1900") is None
+    assert parse_date("31 FEB 1900") is None
+    assert format_date(date(901, 1, 2)) == "2 JAN 0901"
+    assert format_date("1999-12-31") == "31 DEC 1999"
+    assert format_date(None) is None
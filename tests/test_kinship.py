@@ -0,0 +1,77 @@
+import pytest
+
+from app.services.kinship_service import KinshipIndex, kinship
+from app.services.projection_service import ChartGraph
+
+# personId, gender, level
+_PERSONS = {
+    "grandpa": (1, "M", 1), "grandma": (2, "F", 1), "dad": (3, "M", 2), "mom": (4, "F", 2),
+    "uncle": (5, "M", 2), "aunt": (6, "F", 2), "me": (7, "M", 3), "sister": (8, "F", 3),
+    "cousin": (9, "M", 3), "uncle_wife": (10, "F", 2), "mom_dad": (11, "M", 1), "mom_brother": (12, "M", 2),
+    "wife": (13, "F", 3), "wife_dad": (14, "M", 2), "son": (15, "M", 4), "grandchild": (16, "F", 5),
+    "stranger": (17, "M", 3),
+}
+_ID = {name: pid for name, (pid, _, _) in _PERSONS.items()}
+
+
+@pytest.fixture(scope="module")
+def index():
+    g = ChartGraph("chart", 1)
+    for name, (pid, gender, level) in _PERSONS.items():
+        g.upsert_person({"personId": pid, "name": name, "gender": gender, "level": level})
+    for father, child, order in [("grandpa", "dad", 1), ("grandpa", "uncle", 2), ("grandpa", "aunt", 3),
+                                 ("dad", "me", 1), ("dad", "sister", 2), ("uncle", "cousin", 1),
+                                 ("mom_dad", "mom", 1), ("mom_dad", "mom_brother", 2),
+                                 ("wife_dad", "wife", 1), ("me", "son", None), ("son", "grandchild", None)]:
+        g.add_parent("FATHER_OF", _ID[father], _ID[child], order)
+    for mother, child in [("grandma", "dad"), ("mom", "me"), ("mom", "sister")]:
+        g.add_parent("MOTHER_OF", _ID[mother], _ID[child], 1 if child != "sister" else 2)
+    for husband, wife in [("grandpa", "grandma"), ("dad", "mom"), ("uncle", "uncle_wife"), ("me", "wife")]:
+        g.add_spouse(_ID[husband], _ID[wife], 1)
+    return KinshipIndex(g)
+
+
+@pytest.mark.parametrize("a, b, term", [
+    ("dad", "me", "bố"),
+    ("grandpa", "me", "ông nội"),
+    ("mom_dad", "me", "ông ngoại"),
+    ("uncle", "me", "chú"),
+    ("aunt", "me", "cô"),
+    ("mom_brother", "me", "cậu"),
+    ("sister", "me", "em gái"),
+    ("me", "sister", "anh"),
+    ("cousin", "me", "em họ"),
+    ("me", "cousin", "anh họ"),
+    ("me", "uncle", "cháu"),
+    ("son", "me", "con trai"),
+    ("grandchild", "me", "cháu nội"),
+    ("grandchild", "grandpa", "chút"),
+    ("grandma", "grandchild", "kỵ nội"),
+    ("wife", "me", "vợ"),
+    ("uncle_wife", "me", "thím"),
+    ("wife_dad", "me", "bố vợ"),
+    ("me", "wife_dad", "con rể"),
+    ("wife", "dad", "con dâu"),
+    ("dad", "wife", "bố chồng"),
+    ("wife_dad", "dad", "thông gia"),
+])
+def test_terms(index, a, b, term):
+    assert kinship(index, _ID[a], _ID[b])["term"] == term
+
+
+def test_common_ancestor_and_path(index):
+    r = kinship(index, _ID["cousin"], _ID["me"])
+    assert r["commonAncestor"] == _ID["grandpa"]
+    assert (r["generationsFromA"], r["generationsFromB"]) == (2, 2)
+    assert r["path"] == [_ID["cousin"], _ID["uncle"], _ID["grandpa"], _ID["dad"], _ID["me"]]
+
+
+def test_closest_common_ancestor_prefers_father(index):
+    # me and sister share both parents at the same distance: the father is reported
+    assert index.blood(_ID["me"], _ID["sister"]) == ([_ID["me"], _ID["dad"]], [_ID["sister"], _ID["dad"]])
+
+
+def test_unrelated(index):
+    r = kinship(index, _ID["stranger"], _ID["me"])
+    assert r["related"] is False and r["path"] == []
+    assert kinship(index, _ID["me"], _ID["me"])["term"] == "bản thân"
@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+
+from app.services.level_service import check_levels, derive_levels, shift_levels
+from app.services.projection_service import ChartGraph
+
+
+def _graph(levels: dict[int, int], fathers=(), mothers=(), spouses=()) -> ChartGraph:
+    g = ChartGraph("chart", 1)
+    for pid, level in levels.items():
+        g.upsert_person({"personId": pid, "name": str(pid), "gender": "M", "level": level})
+    for parent, child in fathers:
+        g.add_parent("FATHER_OF", parent, child, None)
+    for parent, child in mothers:
+        g.add_parent("MOTHER_OF", parent, child, None)
+    for husband, wife in spouses:
+        g.add_spouse(husband, wife, None)
+    return g
+
+
+def test_derive_levels_whole_chart():
+    # 1 + 2 -> 3 -> 4; 5 married into 3's generation; 6 is a child of 5 only
+    g = _graph({1: 0, 2: 0, 3: 7, 4: 2, 5: 9, 6: 0},
+               fathers=[(1, 3), (3, 4)], mothers=[(2, 3), (5, 6)], spouses=[(3, 5)])
+    assert derive_levels(g) == {1: 0, 2: 0, 3: 1, 4: 2, 5: 1, 6: 2}
+
+
+def test_derive_levels_waits_for_the_lower_parent():
+    # 3's mother (4) sits a generation below its father (1)
+    g = _graph({1: 0, 2: 0, 4: 1, 3: 0}, fathers=[(1, 3), (2, 4)], mothers=[(4, 3)])
+    assert derive_levels(g)[3] == 2
+
+
+def test_derive_levels_subtree_keeps_the_root():
+    g = _graph({1: 0, 2: 5, 3: 9, 4: 1}, fathers=[(1, 2), (2, 3)], spouses=[(2, 4)])
+    # Only 2 and below move: 2 keeps its level, the married-in spouse follows it
+    assert derive_levels(g, root=2) == {2: 5, 3: 6, 4: 5}
+
+
+def test_shift_levels_moves_descendants_and_spouses():
+    g = _graph({1: 0, 2: 1, 3: 2, 4: 1, 5: 1}, fathers=[(1, 2), (2, 3)], spouses=[(2, 4)])
+    assert shift_levels(g, 2, 4) == {2: 4, 3: 5, 4: 4}
+
+
+def test_check_levels():
+    g = _graph({1: 0, 2: 1, 3: 2}, fathers=[(1, 2), (2, 3)])
+    check_levels(g, {2: 1})
+    with pytest.raises(HTTPException) as err:
+        check_levels(g, {2: 2})
+    assert err.value.status_code == 409
+    # The moved person's own parent edges are about to be replaced
+    check_levels(g, {2: 0, 3: 1}, moved=2)
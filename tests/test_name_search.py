@@ -0,0 +1,87 @@
+from app.utils.name_search import NameIndex, PrefixIndex, fold
+
+
+def _index(names: dict[int, str]) -> NameIndex:
+    index = NameIndex()
+    for pid, name in names.items():
+        index.add(pid, name)
+    return index
+
+
+def test_fold():
+    assert fold("  Nguyễn   Đức  ") == "nguyen duc"
+    assert fold(None) == ""
+
+
+def test_search_tiers():
+    index = _index({
+        1: "Hoàng Thị Lan",   # infix
+        2: "Trần Văn Lan",    # word prefix, longer
+        3: "Lê Lan",          # word prefix
+        4: "Lan Anh",         # name prefix
+        5: "Lan",             # whole name
+        6: "Nguyễn Văn Minh",
+    })
+    assert index.search("lan") == [5, 4, 3, 2, 1]
+    assert index.search("an") == [4]      # two letters: word starts only, not "lan"
+    assert index.search("lan", limit=2) == [5, 4]
+    assert index.search("  ") == []
+
+
+def test_search_words_in_any_order():
+    index = _index({1: "Nguyễn Văn Minh", 2: "Minh Nguyễn", 3: "Nguyễn Minh", 4: "Nguyễn Văn"})
+    assert index.search("nguyen minh") == [3, 2, 1]
+
+
+def test_search_ignores_diacritics_but_prefers_matching_ones():
+    index = _index({1: "Lê Văn Đức", 2: "Lê Văn Dực", 3: "Lê Văn Dục"})
+    assert sorted(index.search("duc")) == [1, 2, 3]
+    assert index.search("Đức")[0] == 1
+    assert index.search("dục")[0] == 3
+
+
+def test_add_and_remove_patch_the_index():
+    index = _index({1: "Trần An", 2: "Trần Bình"})
+    index.add(1, "Lê An")           # rename
+    index.remove(2)
+    assert index.search("tran") == []
+    assert index.search("le an") == [1]
+    assert index.postings.keys() == _index({1: "Lê An"}).postings.keys()
+
+
+def _prefix_index(names: dict[int, str]) -> PrefixIndex:
+    index = PrefixIndex()
+    index.build(names.items())
+    return index
+
+
+def test_prefix_lookup_whole_names_first():
+    # Tail keys "an ..." sort before "anh ..." whole names; whole names must still win the limit.
+    names = {i: f"Lê An {i}" for i in range(1, 6)}
+    names.update({10: "Anh Tú", 11: "An Bình"})
+    index = _prefix_index(names)
+    assert index.lookup("an", 2) == [11, 10]
+    assert index.lookup("an", 4) == [11, 10, 1, 2]
+    assert index.lookup("an", 4, accept=lambda pid: pid != 11) == [10, 1, 2, 3]
+    assert index.lookup("", 4) == []
+
+
+def test_prefix_lookup_lists_each_person_once():
+    index = _prefix_index({1: "An An", 2: "Bình An"})
+    assert index.lookup("an", 5) == [1, 2]
+
+
+def test_prefix_add_and_remove():
+    names = {1: "Nguyễn Văn An", 2: "Trần Bình"}
+    index = _prefix_index(names)
+    index.add(3, "Văn Cao")
+    index.add(1, "Lê Văn")          # rename
+    index.remove(2)
+    assert index.lookup("van", 5) == [3, 1]
+    assert index.lookup("nguyen", 5) == []
+    assert index.lookup("binh", 5) == []
+    expected = _prefix_index({1: "Lê Văn", 3: "Văn Cao"})
+    assert (index.whole, index.tails) == (expected.whole, expected.tails)
+    index.remove(1)
+    index.remove(3)
+    assert index.whole == index.tails == [] and index.folded == {}
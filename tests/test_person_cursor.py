@@ -0,0 +1,33 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.person_service import _decode_cursor, _encode_cursor
+
+
+def _raw(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("row", [
+    {"level": 1, "name": "Nguyễn Văn An", "personId": 7},
+    {"level": 0, "name": "", "personId": 1},
+    {"level": 12, "name": "a\"b,c]", "personId": 123456},
+])
+def test_cursor_round_trip(row):
+    cursor = _encode_cursor(row)
+    assert "=" not in cursor
+    assert _decode_cursor(cursor) == (row["level"], row["name"], row["personId"])
+
+
+@pytest.mark.parametrize("cursor", [
+    "", "!!!", "abc", "__4=",
+    _raw(5), _raw([1, "a"]), _raw([1, "a", 2, 3]), _raw([None, "a", 1]), _raw([1, "a", "x"]),
+    _raw("123"), _raw({"a": 1, "b": 2, "c": 3}),
+])
+def test_garbage_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        _decode_cursor(cursor)
+    assert exc.value.status_code == 400
@@ -0,0 +1,58 @@
+from app.services.projection_service import ChartGraph
+from app.services.relationship_service import _validate_batch
+
+
+def _graph() -> ChartGraph:
+    g = ChartGraph("chart", 1)
+    for pid, gender, level in ((1, "M", 1), (2, "F", 1), (3, "M", 2), (4, "F", 2), (5, "M", 3)):
+        g.upsert_person({"personId": pid, "name": str(pid), "gender": gender, "level": level})
+    return g
+
+
+def _edge(rel_type: str, source: int, target: int) -> dict:
+    return {"type": rel_type, "sourceId": source, "targetId": target, "order": None}
+
+
+def test_second_parent_for_the_same_child():
+    accepted, errors = _validate_batch(_graph(), [
+        _edge("FATHER_OF", 1, 5),
+        _edge("FATHER_OF", 3, 5),
+        _edge("MOTHER_OF", 2, 5),
+        _edge("MOTHER_OF", 4, 5),
+    ])
+    assert [(e["type"], e["source"]) for e in accepted] == [("FATHER_OF", 1), ("MOTHER_OF", 2)]
+    assert errors == [
+        {"index": 1, "detail": "Child already has a father"},
+        {"index": 3, "detail": "Child already has a mother"},
+    ]
+
+
+def test_parent_already_in_the_graph():
+    g = _graph()
+    g.add_parent("FATHER_OF", 1, 3, None)
+    accepted, errors = _validate_batch(g, [_edge("FATHER_OF", 5, 3)])
+    assert accepted == []
+    assert errors[0]["index"] == 0
+
+
+def test_cycle_through_earlier_batch_edges():
+    # Levels rule most cycles out; stale levels must not let one through. 5 is already 1's father
+    # in the graph, so 3 -> 5 closes a loop only once the batch's own 1 -> 3 is counted.
+    g = _graph()
+    g.add_parent("FATHER_OF", 5, 1, None)
+    accepted, errors = _validate_batch(g, [
+        _edge("FATHER_OF", 1, 3),
+        _edge("FATHER_OF", 3, 5),
+    ])
+    assert [(e["source"], e["target"]) for e in accepted] == [(1, 3)]
+    assert errors == [{"index": 1, "detail": "Cycle detected"}]
+
+
+def test_one_spouse_per_wife():
+    accepted, errors = _validate_batch(_graph(), [
+        _edge("SPOUSE_OF", 2, 1),
+        _edge("SPOUSE_OF", 3, 2),
+        _edge("SPOUSE_OF", 1, 3),
+    ])
+    assert [(e["source"], e["target"]) for e in accepted] == [(1, 2)]
+    assert [e["index"] for e in errors] == [1, 2]
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import HTTPException
+
+from app.services.projection_service import ChartGraph
+from app.services.sheet_import_service import _edges, _parse
+
+_HEADER = ("Ref", "Name", "Gender", "Level", "Father", "Mother", "Spouse")
+
+
+def _chart() -> ChartGraph:
+    g = ChartGraph("chart", 1)
+    g.upsert_person({"personId": 1, "name": "P", "gender": "M", "level": 1})
+    g.upsert_person({"personId": 2, "name": "Q", "gender": "F", "level": 1})
+    g.add_spouse(1, 2, None)
+    return g
+
+
+def _import(*rows, header=_HEADER):
+    parsed = _parse([header, *rows])
+    edges = _edges(parsed, _chart())
+    return parsed, [(e["type"], e["source"], e["target"]) for e in edges]
+
+
+def test_edges_between_rows_and_chart_persons():
+    parsed, edges = _import(
+        ("a", "A", "M", 1, None, None, "b"),
+        ("c", "C", "M", 2, "a", "b", None),
+        ("b", "B", "F", 1, None, None, None),     # the marriage is given before this row
+        ("d", "D", "F", 2, "#1", "#2", None),
+    )
+    assert parsed.errors == []
+    assert edges == [
+        ("SPOUSE_OF", ("row", 0), ("row", 2)),
+        ("FATHER_OF", ("row", 0), ("row", 1)),
+        ("MOTHER_OF", ("row", 2), ("row", 1)),
+        ("FATHER_OF", ("person", 1), ("row", 3)),
+        ("MOTHER_OF", ("person", 2), ("row", 3)),
+    ]
+
+
+def test_row_numbers_without_ref_column():
+    parsed, edges = _import(
+        ("A", "M", 1, None),
+        ("B", "F", 2, "2"),
+        header=("name", "gender", "level", "father"),
+    )
+    assert parsed.errors == []
+    assert edges == [("FATHER_OF", ("row", 0), ("row", 1))]
+
+
+@pytest.mark.parametrize("rows, field, msg", [
+    ([("a", "A", "M", 1, None, None, None), ("e", "E", "F", 1, None, None, None),
+      ("d", "D", "M", 2, "a", "e", None)], "mother", "Father and mother must be a married couple"),
+    ([("a", "A", "F", 1, None, None, None), ("d", "D", "M", 2, "a", None, None)], "father", "Father must be male"),
+    ([("a", "A", "M", 2, None, None, None), ("d", "D", "M", 2, "a", None, None)], "father", "Invalid relationship"),
+    ([("d", "D", "M", 2, "x", None, None)], "father", "Unknown row reference 'x'"),
+    ([("d", "D", "M", 2, "#99", None, None)], "father", "Person #99 not found"),
+    ([("a", "A", "M", 1, None, None, "#2")], "spouse", "The female person already has a spouse."),
+    ([("a", "A", "M", 1, None, None, "a")], "spouse", "A person cannot be their own spouse"),
+])
+def test_edge_errors(rows, field, msg):
+    parsed, _ = _import(*rows)
+    assert [(e["field"], e["msg"][:len(msg)]) for e in parsed.errors] == [(field, msg)]
+
+
+def test_parse_errors():
+    parsed = _parse([_HEADER, ("a", "A", "X", 1), ("a", "B", "M", 1), (None, None, None, None)])
+    assert [(e["row"], e["field"]) for e in parsed.errors] == [(2, "gender"), (3, "ref")]
+    with pytest.raises(HTTPException) as err:
+        _parse([("name", "gender")])
+    assert err.value.detail == "Missing column(s): level"
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.services import tree_service
+from app.services.version_service import link_change, link_removed, node_change, node_removed
+
+
+def _changes(monkeypatch, changes: list[dict]) -> dict:
+    async def list_changes(chart_id, since, until):
+        return changes
+
+    monkeypatch.setattr(tree_service, "list_changes", list_changes)
+    return asyncio.run(tree_service.get_tree_changes("chart", 1, 5))
+
+
+def _node(pid: int) -> dict:
+    return node_change({"personId": pid, "name": str(pid), "gender": "M", "level": 1})
+
+
+def _pairs(links: list[dict]) -> list[tuple]:
+    return [(link["source"], link["target"]) for link in links]
+
+
+def test_removed_node_drops_pending_links(monkeypatch):
+    out = _changes(monkeypatch, [
+        _node(3),
+        link_change(1, 3, "PARENT_OF"),
+        link_change(3, 4, "SPOUSE_OF"),
+        link_removed(3, 5, "SPOUSE_OF"),
+        link_change(1, 2, "PARENT_OF"),
+        node_removed(3),
+    ])
+    assert not out["full"]
+    assert out["nodes"] == []
+    assert out["removedNodes"] == [3]
+    assert out["links"] == [{"source": 1, "target": 2, "type": "PARENT_OF"}]
+    assert out["removedLinks"] == []
+
+
+def test_link_added_back_after_removal(monkeypatch):
+    out = _changes(monkeypatch, [
+        link_removed(1, 2, "SPOUSE_OF"),
+        link_change(1, 2, "SPOUSE_OF"),
+    ])
+    assert out["links"] == [{"source": 1, "target": 2, "type": "SPOUSE_OF"}]
+    assert out["removedLinks"] == []
+
+
+def test_node_added_back_after_removal(monkeypatch):
+    out = _changes(monkeypatch, [node_removed(2), _node(2)])
+    assert [n["id"] for n in out["nodes"]] == [2]
+    assert out["removedNodes"] == []
+
+
+@pytest.mark.parametrize("first,second,expected", [
+    # A child has one PARENT_OF link: a new parent replaces the old one...
+    (link_change(1, 3, "PARENT_OF"), link_change(2, 3, "PARENT_OF"), ([(2, 3)], [])),
+    # ...and removing the child's link after adding it leaves only the removal.
+    (link_change(1, 3, "PARENT_OF"), link_removed(2, 3, "PARENT_OF"), ([], [(2, 3)])),
+])
+def test_parent_links_fold_per_child(monkeypatch, first, second, expected):
+    out = _changes(monkeypatch, [first, second])
+    assert (_pairs(out["links"]), _pairs(out["removedLinks"])) == expected
+
+
+def test_log_gap_returns_full_tree(monkeypatch):
+    async def list_changes(chart_id, since, until):
+        return None
+
+    async def get_tree_cached(chart_id, version):
+        return {"version": version, "data": {"nodes": [{"id": 1}], "links": []}}
+
+    monkeypatch.setattr(tree_service, "list_changes", list_changes)
+    monkeypatch.setattr(tree_service, "get_tree_cached", get_tree_cached)
+    out = asyncio.run(tree_service.get_tree_changes("chart", 1, 5))
+    assert out["full"] and out["nodes"] == [{"id": 1}]